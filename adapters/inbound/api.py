@@ -1,27 +1,49 @@
 import base64
+import csv
+import hmac
 import html
+import io
 import json
-import os
-from datetime import datetime, timedelta, timezone
-from typing import List
+import math
+import secrets
+from datetime import date, datetime, time, timedelta, timezone
+from typing import AsyncIterator, List, Literal, Optional
 
+import httpx
 import jwt
-import requests
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from google_auth_oauthlib.flow import Flow
-
-from config import (ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, AUTH_URI,
-                    GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, REDIRECT_URI,
-                    SCOPES, SECRET_KEY, TOKEN_URI)
+import orjson
+from fastapi import (APIRouter, BackgroundTasks, Cookie, Depends, Header,
+                     HTTPException, Query, Request, status)
+from fastapi.responses import (FileResponse, HTMLResponse, ORJSONResponse,
+                               PlainTextResponse, RedirectResponse,
+                               StreamingResponse)
+
+from adapters.inbound.shard_pool import ShardUnavailable
+from adapters.outbound.google_oauth import OAuthError, new_pkce_pair
+from config import (ACCESS_TOKEN_EXPIRE_MINUTES, ADMIN_TOKEN, ALGORITHM,
+                    BACKFILL_DAYS, BACKFILL_ENABLED, EVENT_STREAM_BACKLOG_LIMIT,
+                    EVENT_STREAM_HEARTBEAT_SECONDS, EXPORT_BATCH_SIZE,
+                    EXPORT_CHUNK_BYTES, REDIRECT_URI, SECRET_KEY, TOKEN_URI)
+from core.application.events import EMAIL_EVENTS
+from core.application.metrics import REGISTRY
 from core.application.ports.inbound import IEmailServicePort, IUserServicePort
-from core.application.schema import EmailHistoryRequest
+from core.application.profiling import PROFILER
+from core.application.quota import QuotaDeferred
+from core.application.scheduling import SchedulerStopped
+from core.application.tracing import TRACER
+from core.application.watchdog import LOOP_WATCHDOG
+from core.application.schema import (BackfillProgress, EmailHistoryRequest,
+                                     ReadStateRequest)
 from core.domain.entity import Email, Profile, Token, User, UserInfo
-from dependencies import get_email_service, get_user_service
+from dependencies import (create_backfill_service, email_service_scope,
+                          get_email_service, get_user_service, google_oauth)
 
-os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 router = APIRouter()
 
+EXPORT_ROWS_TOTAL = REGISTRY.counter(
+    "taskpilot_export_rows_total", "Email rows written by history exports, by format.", ["format"])
+EXPORT_FIELDS = tuple(Email.model_fields)
+
 
 def create_access_token(user: User, expires_delta: timedelta = None):
     to_encode = {"sub": user.email}
@@ -101,68 +123,104 @@ def get_current_user(request: Request):
         )
 
 
-flow = Flow.from_client_config(
-    {
-        "web": {
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "redirect_uris": [REDIRECT_URI[0], REDIRECT_URI[1]],
-            "auth_uri": AUTH_URI,
-            "token_uri": TOKEN_URI,
-        }
-    },
-    scopes=SCOPES,
-    redirect_uri=REDIRECT_URI[0]
-)
+def get_stream_user(request: Request, token: Optional[str] = Query(None, description="JWT, for clients that cannot send headers")):
+    """Like get_current_user, but also accepts the token as a query parameter (EventSource cannot set headers)."""
+    if token:
+        return UserInfo(email=verify_access_token(token)["sub"])
+    return get_current_user(request)
+
+
+def require_admin(request: Request):
+    """
+    Guards operational endpoints with the static ADMIN_TOKEN, sent in the
+    X-Admin-Token header. Admin endpoints are disabled when it is not set.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Not Found")
+    provided = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(provided, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Invalid admin token")
+
+
+OAUTH_STATE_COOKIE = "taskpilot_oauth_state"
+OAUTH_STATE_MAX_AGE_SECONDS = 600
+
+
+async def register_new_user(user: User) -> None:
+    """Starts Gmail push notifications and the inbox backfill for a user who just signed in."""
+    async with email_service_scope() as email_service:
+        try:
+            await email_service.watch_user(user)
+        except Exception as e:
+            # The watch renewal job retries every user, so sign-in still succeeds.
+            print(f"Error watching Gmail for {user.email}: {e}")
+    if BACKFILL_ENABLED:
+        # Queued only; the leader's backfill job does the import.
+        await create_backfill_service().start(user.email, BACKFILL_DAYS)
 
 
 @router.get("/auth/login")
 async def login():
     """
-    Redirects the user to the Google OAuth2 authorization URL.
+    Redirects the user to the Google OAuth2 authorization URL. The state and
+    PKCE verifier of this login travel in a signed, short-lived cookie, so
+    the callback can be served by any worker.
     """
-    auth_url, _ = flow.authorization_url(prompt="consent")
-    return RedirectResponse(auth_url)
+    state = secrets.token_urlsafe(32)
+    verifier, challenge = new_pkce_pair()
+    response = RedirectResponse(google_oauth.authorization_url(state, challenge))
+    cookie = jwt.encode({"state": state, "verifier": verifier,
+                         "exp": datetime.now(timezone.utc) + timedelta(seconds=OAUTH_STATE_MAX_AGE_SECONDS)},
+                        SECRET_KEY, algorithm=ALGORITHM)
+    response.set_cookie(OAUTH_STATE_COOKIE, cookie, max_age=OAUTH_STATE_MAX_AGE_SECONDS, path="/auth",
+                        httponly=True, samesite="lax", secure=REDIRECT_URI[0].startswith("https://"))
+    return response
 
 
 @router.get("/auth/callback", response_model=Token)
-async def callback(request: Request, auth_service: IUserServicePort = Depends(get_user_service), email_service: IEmailServicePort = Depends(get_email_service)):
+async def callback(background_tasks: BackgroundTasks, code: str = Query(None), state: str = Query(None),
+                   oauth_state: Optional[str] = Cookie(None, alias=OAUTH_STATE_COOKIE),
+                   auth_service: IUserServicePort = Depends(get_user_service)):
     """
-    Handles the OAuth2 callback after the user authorizes the app.
+    Handles the OAuth2 callback after the user authorizes the app. The Gmail
+    watch and the backfill are started after the response is sent.
     """
-    flow.fetch_token(authorization_response=str(request.url))
-    credentials = flow.credentials
-
-    access_token = credentials.token
-    refresh_token = credentials.refresh_token
-    token_uri = credentials.token_uri
-    id_token = credentials.id_token
-
-    headers = {"Authorization": f"Bearer {access_token}"}
-    user_info_response = requests.get(
-        "https://www.googleapis.com/oauth2/v3/userinfo", headers=headers)
-
-    if user_info_response.status_code == 200:
-        user_info = user_info_response.json()
-        user = User(
-            email=user_info.get("email"),
-            access_token=access_token,
-            refresh_token=refresh_token,
-            token_uri=token_uri,
-            id_token=id_token,
-            name=user_info.get("name"),
-            given_name=user_info.get("given_name"),
-            family_name=user_info.get("family_name"),
-            picture=user_info.get("picture"),
-        )
-        await auth_service.create_user(user)
-        await email_service.watch_user(user)
-        access_token = create_access_token(user)
-        chrome_extension_url = "chrome-extension://nnklciemhdhkoeieljphgcffbcfbikmm/callback.html"
-        url = f"{chrome_extension_url}?token={access_token}"
-        redirect_url = f"http://127.0.0.1:8000/redirect?token={access_token}"
-        return RedirectResponse(url=redirect_url)
-    return {"error": "Error getting user info"}
+    try:
+        stored = jwt.decode(oauth_state or "", SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Login expired, please sign in again")
+    if not code or not state or not hmac.compare_digest(state, stored.get("state", "")):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid OAuth state")
+
+    try:
+        tokens = await google_oauth.exchange_code(code, stored["verifier"])
+        user_info = await google_oauth.userinfo(tokens["access_token"])
+    except (OAuthError, httpx.HTTPError) as e:
+        print(f"OAuth callback failed: {e}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error getting user info")
+
+    user = User(
+        email=user_info.get("email"),
+        access_token=tokens["access_token"],
+        refresh_token=tokens.get("refresh_token"),
+        token_uri=TOKEN_URI,
+        id_token=tokens.get("id_token"),
+        name=user_info.get("name"),
+        given_name=user_info.get("given_name"),
+        family_name=user_info.get("family_name"),
+        picture=user_info.get("picture"),
+    )
+    await auth_service.create_user(user)
+    background_tasks.add_task(register_new_user, user)
+    access_token = create_access_token(user)
+    chrome_extension_url = "chrome-extension://nnklciemhdhkoeieljphgcffbcfbikmm/callback.html"
+    url = f"{chrome_extension_url}?token={access_token}"
+    redirect_url = f"http://127.0.0.1:8000/redirect?token={access_token}"
+    response = RedirectResponse(url=redirect_url)
+    response.delete_cookie(OAUTH_STATE_COOKIE, path="/auth")
+    return response
 
 
 @router.get("/redirect", response_class=HTMLResponse)
@@ -220,9 +278,22 @@ async def email_notification(request: Request,  auth_service: IUserServicePort =
         data = json.loads(base64.b64decode(body["message"]["data"]))
         history_id = str(data.get("historyId"))
         user_email = data.get("emailAddress")
+        shard_pool = getattr(request.app.state, "shard_pool", None)
+        if shard_pool:
+            # Answered only once the shard is done, so Pub/Sub keeps the notification until then.
+            await shard_pool.process(user_email, history_id)
+            return {"message": "Notification received"}
         user = await email_service.get_user_credentials(user_email)
         await email_service.process_emails(user, history_id, history_id)
         return {"message": "Notification received"}
+    except (ShardUnavailable, SchedulerStopped) as e:
+        print(f"Redelivering notification: {e}")
+        return ORJSONResponse({"error": str(e)}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except QuotaDeferred as e:
+        # A non-2xx response makes Pub/Sub redeliver the notification later.
+        print(f"Deferring notification: {e}")
+        return ORJSONResponse({"error": str(e)}, status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                              headers={"Retry-After": str(math.ceil(e.retry_after))})
     except Exception as e:
         print(f"Error: {e}")
         return {"error": str(e)}
@@ -241,9 +312,111 @@ async def email_notification(request: EmailHistoryRequest, email_service: IEmail
         return {"error": str(e)}
 
 
-@router.get("/emails", response_model=List[Email])
-async def read_users_email(current_user: UserInfo = Depends(get_current_user), email_service: IEmailServicePort = Depends(get_email_service)):
-    return await email_service.get_emails(current_user.email, 0, 10)
+@router.get("/emails", response_model=List[Email], response_class=ORJSONResponse)
+async def read_users_email(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=500),
+                           current_user: UserInfo = Depends(get_current_user), email_service: IEmailServicePort = Depends(get_email_service)):
+    """
+    Newest first. Rows come straight from the database as dicts and are
+    encoded by orjson; returning the response directly skips re-validating
+    them against response_model, which stays for the OpenAPI schema.
+    """
+    rows = await email_service.get_email_rows(current_user.email, skip, limit)
+    return ORJSONResponse(rows)
+
+
+@router.get("/emails/search", response_model=List[Email])
+async def search_emails(q: str = Query(..., min_length=2, max_length=200),
+                        limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0),
+                        current_user: UserInfo = Depends(get_current_user), email_service: IEmailServicePort = Depends(get_email_service)):
+    """
+    Searches the user's email titles and summaries; every term must match,
+    best matches first. Archived emails are searched too, after the hot ones.
+    """
+    return await email_service.search_emails(current_user.email, q, limit, offset)
+
+
+@router.get("/emails/unread-count")
+async def unread_count(current_user: UserInfo = Depends(get_current_user), email_service: IEmailServicePort = Depends(get_email_service)):
+    """Unread badge count, read from the per-user counter rather than the email rows."""
+    return {"unread": await email_service.get_unread_count(current_user.email)}
+
+
+@router.post("/emails/read")
+async def mark_emails_read(request: ReadStateRequest, current_user: UserInfo = Depends(get_current_user), email_service: IEmailServicePort = Depends(get_email_service)):
+    """Marks emails read (or unread with "read": false) by id list or up to a cursor id."""
+    updated = await email_service.set_read_state(current_user.email, request.read, request.ids, request.up_to_id)
+    return {"updated": updated, "unread": await email_service.get_unread_count(current_user.email)}
+
+
+@router.get("/backfill", response_model=BackfillProgress)
+async def backfill_progress(current_user: UserInfo = Depends(get_current_user)):
+    """Progress of the import of the user's recent inbox."""
+    job = await create_backfill_service().progress(current_user.email)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No backfill for this user")
+    return job
+
+
+@router.post("/backfill", response_model=BackfillProgress, status_code=status.HTTP_202_ACCEPTED)
+async def start_backfill(days: int = Query(BACKFILL_DAYS, ge=1, le=365),
+                         current_user: UserInfo = Depends(get_current_user)):
+    """Queues an import of the last `days` of the user's inbox; a running import is left to finish."""
+    return await create_backfill_service().start(current_user.email, days)
+
+
+def _sse_event(email: Email) -> str:
+    return f"id: {email.id}\nevent: email\ndata: {email.model_dump_json()}\n\n"
+
+
+async def email_event_stream(user_email: str, last_event_id: Optional[int]) -> AsyncIterator[str]:
+    # Subscribe before replaying so nothing stored in between is missed;
+    # anything seen twice is skipped by id.
+    subscription = EMAIL_EVENTS.subscribe(user_email)
+    try:
+        yield "retry: 5000\n\n"
+        last_sent = last_event_id
+        if last_event_id is not None:
+            async with email_service_scope() as email_service:
+                while True:
+                    missed = await email_service.get_emails_after(user_email, last_sent, EVENT_STREAM_BACKLOG_LIMIT)
+                    for email in missed:
+                        yield _sse_event(email)
+                        last_sent = email.id
+                    if len(missed) < EVENT_STREAM_BACKLOG_LIMIT:
+                        break
+
+        while True:
+            email = await subscription.next(EVENT_STREAM_HEARTBEAT_SECONDS)
+            if email is None:
+                if subscription.overflowed:
+                    # The client reconnects with Last-Event-ID and catches up from the database.
+                    return
+                yield ": ping\n\n"
+                continue
+            if last_sent is not None and email.id <= last_sent:
+                continue
+            yield _sse_event(email)
+            last_sent = email.id
+    finally:
+        EMAIL_EVENTS.unsubscribe(subscription)
+
+
+@router.get("/emails/stream")
+async def stream_emails(current_user: UserInfo = Depends(get_stream_user),
+                        last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+                        after: Optional[int] = Query(None, description="Replay emails with a greater id first")):
+    """
+    Server-Sent Events stream of the user's newly processed emails. Each
+    event carries the Email record with its id as the event id, so a
+    reconnecting client resumes where it left off. Emails reach streams open
+    in the HTTP worker that stored them (or whose shard workers did);
+    clients on another worker pick them up on their next reconnect.
+    """
+    return StreamingResponse(
+        email_event_stream(current_user.email, last_event_id if last_event_id is not None else after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/me", response_model=Profile)
@@ -257,3 +430,105 @@ async def read_users_email(current_user: UserInfo = Depends(get_current_user), a
         family_name=result.family_name,
         picture=result.picture
     )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Exposes internal metrics in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/admin/traces", dependencies=[Depends(require_admin)])
+async def recent_traces(limit: int = Query(50, ge=1, le=1000)):
+    """
+    Returns the most recent email pipeline traces, newest first.
+    """
+    return {"enabled": TRACER.enabled, "traces": TRACER.recent(limit)}
+
+
+@router.get("/admin/loop-stalls", dependencies=[Depends(require_admin)])
+async def recent_loop_stalls(limit: int = Query(50, ge=1, le=1000)):
+    """
+    Returns the most recent callbacks that blocked the event loop, newest
+    first, each with the stack captured while it was blocking.
+    """
+    return {"enabled": LOOP_WATCHDOG.running, "stalls": LOOP_WATCHDOG.recent(limit)}
+
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def recent_profiles(limit: int = Query(50, ge=1, le=1000)):
+    """
+    Lists stored request and job profiles, newest first. Each is a folded
+    stack file for flamegraph.pl, speedscope or inferno.
+    """
+    return {"enabled": PROFILER.enabled, "profiles": PROFILER.recent(limit)}
+
+
+@router.get("/admin/profiles/{name}", response_class=FileResponse, dependencies=[Depends(require_admin)])
+async def download_profile(name: str):
+    path = PROFILER.path_of(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+
+async def email_export_stream(user_email: str, export_format: str, since: Optional[date],
+                              until: Optional[date]) -> AsyncIterator[bytes]:
+    """NDJSON or CSV of the user's emails, sent in chunks so memory stays flat however many rows there are."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    chunk = bytearray()
+    if export_format == "csv":
+        writer.writeheader()
+    rows = 0
+    async with email_service_scope() as email_service:
+        async for row in email_service.export_email_rows(
+                user_email,
+                datetime.combine(since, time.min) if since else None,
+                datetime.combine(until + timedelta(days=1), time.min) if until else None,
+                EXPORT_BATCH_SIZE):
+            if export_format == "csv":
+                writer.writerow(row)
+            else:
+                chunk += orjson.dumps(row)
+                chunk += b"\n"
+            rows += 1
+            if buffer.tell() + len(chunk) >= EXPORT_CHUNK_BYTES:
+                yield bytes(chunk) + buffer.getvalue().encode("utf-8")
+                chunk.clear()
+                buffer.seek(0)
+                buffer.truncate()
+    yield bytes(chunk) + buffer.getvalue().encode("utf-8")
+    EXPORT_ROWS_TOTAL.inc(rows, format=export_format)
+
+
+def _export_response(user_email: str, export_format: str, since: Optional[date],
+                     until: Optional[date]) -> StreamingResponse:
+    if since and until and since > until:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="since is after until")
+    media_type = "text/csv; charset=utf-8" if export_format == "csv" else "application/x-ndjson"
+    filename = f"emails-{user_email}-{datetime.now(timezone.utc):%Y%m%d}.{export_format}"
+    return StreamingResponse(email_export_stream(user_email, export_format, since, until), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.get("/emails/export")
+async def export_emails(format: Literal["ndjson", "csv"] = Query("ndjson"),
+                        since: Optional[date] = Query(None, description="First day to include"),
+                        until: Optional[date] = Query(None, description="Last day to include"),
+                        current_user: UserInfo = Depends(get_current_user)):
+    """
+    Streams the user's full email history, archived emails included, newest
+    first, as NDJSON (one Email object per line) or CSV.
+    """
+    return _export_response(current_user.email, format, since, until)
+
+
+@router.get("/admin/emails/export", dependencies=[Depends(require_admin)])
+async def export_user_emails(user: str = Query(..., description="Email address of the user to export"),
+                             format: Literal["ndjson", "csv"] = Query("ndjson"),
+                             since: Optional[date] = Query(None), until: Optional[date] = Query(None)):
+    """The same export as /emails/export, for any user."""
+    return _export_response(user, format, since, until)
@@ -0,0 +1,63 @@
+"""
+Maintenance commands, run against the configured DATABASE_URL:
+
+    python -m adapters.inbound.commands rebuild-search-index
+    python -m adapters.inbound.commands archive-emails
+    python -m adapters.inbound.commands compact-storage
+"""
+import argparse
+import asyncio
+
+from adapters.outbound.search import get_search_index
+from config import SEARCH_BACKEND
+from adapters.outbound.repository import SQLAlchemyUserRepository
+from dependencies import AsyncSessionLocal, engine, init_db, retention_job_scope
+
+
+async def rebuild_search_index() -> None:
+    """Re-indexes every stored email, for data written before search existed or after a backend switch."""
+    await init_db()
+    index = get_search_index(engine.dialect.name, SEARCH_BACKEND)
+    async with engine.begin() as conn:
+        await index.rebuild(conn)
+    print(f"Rebuilt the {index.name} search index")
+
+
+async def archive_emails() -> None:
+    """Runs the retention job once, whether or not RETENTION_ENABLED is set."""
+    await init_db()
+    async with retention_job_scope() as retention_job:
+        retention_job.compact_min_rows = float("inf")
+        await retention_job.run_once()
+
+
+async def compact_storage() -> None:
+    """VACUUM on SQLite, OPTIMIZE TABLE on MySQL; best run off-peak."""
+    async with AsyncSessionLocal() as session:
+        await SQLAlchemyUserRepository(session).compact_storage()
+    print("Compacted email storage")
+
+
+COMMANDS = {
+    "rebuild-search-index": rebuild_search_index,
+    "archive-emails": archive_emails,
+    "compact-storage": compact_storage,
+}
+
+
+async def run(command: str) -> None:
+    try:
+        await COMMANDS[command]()
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+    asyncio.run(run(args.command))
+
+
+if __name__ == "__main__":
+    main()
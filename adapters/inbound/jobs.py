@@ -0,0 +1,64 @@
+from typing import Optional
+
+from adapters.inbound.shard_pool import ShardedNotificationPool
+from core.application.profiling import PROFILER
+from core.application.scheduling import ScheduledEmail
+from core.domain.entity import OutboxMessage
+from dependencies import (create_backfill_service, create_outbox_sender,
+                          email_service_scope, retention_job_scope)
+
+
+async def renew_gmail_watches() -> None:
+    """Registers, or renews before it expires, the Gmail push watch of every user."""
+    async with email_service_scope() as email_service:
+        await email_service.watch_gmail()
+
+
+async def deliver_outbox_message(message: OutboxMessage) -> str:
+    async with email_service_scope() as email_service:
+        return await email_service.deliver_outbox_message(message)
+
+
+async def run_outbox_sender() -> None:
+    """Delivers queued replies until leadership is lost."""
+    await create_outbox_sender(deliver_outbox_message).run()
+
+
+@PROFILER.profiled("retention")
+async def run_retention() -> None:
+    """Moves email past its hot window into the archive."""
+    async with retention_job_scope() as retention_job:
+        await retention_job.run_once()
+
+
+@PROFILER.profiled("backfill")
+async def run_backfills() -> None:
+    """Imports the recent inbox of newly onboarded users, resuming interrupted imports."""
+    await create_backfill_service().run_pending()
+
+
+async def process_scheduled_email(item: ScheduledEmail) -> None:
+    """Runs the model and actions for an email the priority scheduler dispatched."""
+    async with email_service_scope() as email_service:
+        await email_service.process_single_email(item.user, item.email_data, item.history_id)
+
+
+async def ingest_notification(user_email: str, history_id: str,
+                              shard_pool: Optional[ShardedNotificationPool] = None) -> None:
+    """
+    Hands a pulled Gmail notification to the path a push to
+    /email-notification takes. Returns once its email has been processed,
+    on a shard or here, including the wait for a priority scheduler worker;
+    only then is the notification acked. Raises QuotaDeferred to have it
+    redelivered later, and SchedulerStopped or ShardUnavailable when
+    shutdown cut the work short.
+    """
+    if shard_pool:
+        await shard_pool.process(user_email, history_id)
+        return
+    async with email_service_scope() as email_service:
+        user = await email_service.get_user_credentials(user_email)
+        if not user:
+            print(f"Ignoring notification for unknown user {user_email}")
+            return
+        await email_service.process_emails(user, history_id, history_id)
@@ -0,0 +1,42 @@
+import hmac
+
+from config import ADMIN_TOKEN
+from core.application.profiling import PROFILER, Profiler
+
+
+class ProfilingMiddleware:
+    """
+    Profiles selected HTTP requests: any request sending "X-Profile: 1" with
+    a valid X-Admin-Token, and a random sample of the rest. A plain ASGI
+    middleware, so the handler runs in the task being profiled.
+    """
+
+    def __init__(self, app, profiler: Profiler = PROFILER):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        forced = headers.get(b"x-profile") == b"1" and bool(ADMIN_TOKEN) and hmac.compare_digest(
+            headers.get(b"x-admin-token", b""), ADMIN_TOKEN.encode())
+        profile = self.profiler.start("request", scope["path"]) \
+            if self.profiler.selects(scope["path"], forced) else None
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            await self.profiler.finish(profile, method=scope["method"], status=status_code)
@@ -0,0 +1,221 @@
+import asyncio
+import base64
+import json
+import math
+from typing import Awaitable, Callable, Dict, List, Set
+
+from adapters.outbound.pubsub import PubSubError, PubSubSubscriberClient
+from core.application.metrics import REGISTRY
+from core.application.quota import QuotaDeferred
+
+PULL_MESSAGES_TOTAL = REGISTRY.counter(
+    "taskpilot_pull_messages_total", "Pulled Pub/Sub notifications, by outcome.", ["outcome"])
+PULL_ACK_REQUESTS_TOTAL = REGISTRY.counter(
+    "taskpilot_pull_ack_requests_total", "Batched acknowledge calls sent to Pub/Sub, by outcome.", ["outcome"])
+PULL_OUTSTANDING_MESSAGES = REGISTRY.gauge(
+    "taskpilot_pull_outstanding_messages", "Pulled notifications leased and not yet acked or nacked.")
+PULL_OUTSTANDING_BYTES = REGISTRY.gauge(
+    "taskpilot_pull_outstanding_bytes", "Payload bytes of the outstanding pulled notifications.")
+
+# Called with (user_email, history_id); returns once the notification's email is processed.
+NotificationHandler = Callable[[str, str], Awaitable[None]]
+
+
+class PullIngestor:
+    """
+    Pulls Gmail notifications from a Pub/Sub subscription instead of
+    waiting for pushes, so the app decides how fast they arrive.
+
+    At most `max_outstanding_messages` notifications, and roughly
+    `max_outstanding_bytes` of payload, are leased at once. Pulls only ask
+    for the free slots, and pulling pauses while either limit is reached.
+    One pull can overshoot the byte limit, since Pub/Sub cannot cap a pull
+    by size. Leases are extended to `ack_deadline_seconds` on receipt and
+    then periodically, so they outlast slow processing. A message is acked
+    only after the handler has returned, which it does once the email has
+    been processed; any error nacks it instead. Acks are sent in batches of
+    up to `ack_batch_size`, at least every `ack_flush_seconds`.
+
+    Failed notifications are nacked and redelivered after
+    `nack_delay_seconds`. Deferred notifications are nacked and redelivered
+    once quota is expected back.
+    """
+
+    def __init__(self, subscriber: PubSubSubscriberClient, handler: NotificationHandler,
+                 max_outstanding_messages: int = 100, max_outstanding_bytes: int = 10 * 1024 * 1024,
+                 streams: int = 1, max_messages_per_pull: int = 100, ack_batch_size: int = 100,
+                 ack_flush_seconds: float = 0.1, ack_deadline_seconds: int = 60, nack_delay_seconds: int = 10):
+        self.subscriber = subscriber
+        self.handler = handler
+        self.max_outstanding_messages = max(1, max_outstanding_messages)
+        self.max_outstanding_bytes = max_outstanding_bytes
+        self.streams = max(1, streams)
+        self.max_messages_per_pull = max(1, max_messages_per_pull)
+        self.ack_batch_size = max(1, ack_batch_size)
+        self.ack_flush_seconds = ack_flush_seconds
+        self.ack_deadline_seconds = ack_deadline_seconds
+        self.nack_delay_seconds = nack_delay_seconds
+        self._outstanding: Dict[str, int] = {}
+        self._outstanding_bytes = 0
+        self._reserved = 0
+        self._capacity = asyncio.Condition()
+        self._acks: List[str] = []
+        self._acks_pending = asyncio.Event()
+        self._acks_full = asyncio.Event()
+        self._pullers: List[asyncio.Task] = []
+        self._background: List[asyncio.Task] = []
+        self._handlers: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._pullers)
+
+    def start(self) -> None:
+        self._pullers = [asyncio.create_task(self._pull_loop(), name=f"pubsub-pull-{stream}")
+                         for stream in range(self.streams)]
+        self._background = [asyncio.create_task(self._ack_loop(), name="pubsub-ack"),
+                            asyncio.create_task(self._lease_loop(), name="pubsub-lease")]
+        print(f"Pulling notifications from {self.subscriber.subscription_path} "
+              f"({self.streams} streams, {self.max_outstanding_messages} outstanding)")
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Stops pulling, lets in-flight notifications finish, acks them and hands the rest back."""
+        for task in self._pullers:
+            task.cancel()
+        await asyncio.gather(*self._pullers, return_exceptions=True)
+        self._pullers = []
+        if self._handlers:
+            _, unfinished = await asyncio.wait(set(self._handlers), timeout=timeout)
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+        await self._flush_acks()
+        if self._outstanding:
+            await self._nack(list(self._outstanding), 0)
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self._background = []
+        await self.subscriber.aclose()
+
+    def _free_slots(self) -> int:
+        if self._outstanding_bytes >= self.max_outstanding_bytes:
+            return 0
+        return self.max_outstanding_messages - len(self._outstanding) - self._reserved
+
+    async def _pull_loop(self) -> None:
+        failures = 0
+        while True:
+            async with self._capacity:
+                await self._capacity.wait_for(lambda: self._free_slots() > 0)
+                count = min(self.max_messages_per_pull, self._free_slots())
+                self._reserved += count
+            try:
+                received = await self.subscriber.pull(count)
+            except PubSubError as e:
+                failures += 1
+                print(f"Error pulling notifications: {e}")
+                await asyncio.sleep(min(30.0, 2 ** failures))
+                continue
+            finally:
+                self._reserved -= count
+            failures = 0
+            if not received:
+                continue
+            for item in received:
+                self._admit(item["ackId"], len(item.get("message", {}).get("data", "")))
+            await self._extend([item["ackId"] for item in received])
+            for item in received:
+                task = asyncio.create_task(self._handle(item))
+                self._handlers.add(task)
+                task.add_done_callback(self._handlers.discard)
+
+    def _admit(self, ack_id: str, size: int) -> None:
+        self._outstanding[ack_id] = size
+        self._outstanding_bytes += size
+        PULL_OUTSTANDING_MESSAGES.set(len(self._outstanding))
+        PULL_OUTSTANDING_BYTES.set(self._outstanding_bytes)
+
+    async def _release(self, ack_id: str) -> None:
+        self._outstanding_bytes -= self._outstanding.pop(ack_id, 0)
+        PULL_OUTSTANDING_MESSAGES.set(len(self._outstanding))
+        PULL_OUTSTANDING_BYTES.set(self._outstanding_bytes)
+        async with self._capacity:
+            self._capacity.notify_all()
+
+    async def _handle(self, item: dict) -> None:
+        ack_id = item["ackId"]
+        message = item.get("message", {})
+        try:
+            data = json.loads(base64.b64decode(message["data"]))
+            user_email, history_id = data["emailAddress"], str(data["historyId"])
+        except (KeyError, TypeError, ValueError) as e:
+            # Redelivering cannot fix it; acked so it does not come back forever.
+            print(f"Dropping malformed notification {message.get('messageId')}: {e!r}")
+            await self._release(ack_id)
+            self._ack(ack_id)
+            PULL_MESSAGES_TOTAL.inc(outcome="malformed")
+            return
+        try:
+            await self.handler(user_email, history_id)
+        except QuotaDeferred as e:
+            print(f"Deferring notification for {user_email} by {e.retry_after:.0f}s")
+            await self._release(ack_id)
+            await self._nack([ack_id], math.ceil(e.retry_after))
+            PULL_MESSAGES_TOTAL.inc(outcome="deferred")
+        except Exception as e:
+            print(f"Error handling notification for {user_email}: {e!r}")
+            await self._release(ack_id)
+            await self._nack([ack_id], self.nack_delay_seconds)
+            PULL_MESSAGES_TOTAL.inc(outcome="failed")
+        else:
+            await self._release(ack_id)
+            self._ack(ack_id)
+            PULL_MESSAGES_TOTAL.inc(outcome="acked")
+
+    def _ack(self, ack_id: str) -> None:
+        self._acks.append(ack_id)
+        self._acks_pending.set()
+        if len(self._acks) >= self.ack_batch_size:
+            self._acks_full.set()
+
+    async def _ack_loop(self) -> None:
+        while True:
+            await self._acks_pending.wait()
+            try:
+                await asyncio.wait_for(self._acks_full.wait(), self.ack_flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush_acks()
+
+    async def _flush_acks(self) -> None:
+        ack_ids, self._acks = self._acks, []
+        self._acks_pending.clear()
+        self._acks_full.clear()
+        if not ack_ids:
+            return
+        try:
+            await self.subscriber.acknowledge(ack_ids)
+            PULL_ACK_REQUESTS_TOTAL.inc(outcome="ok")
+        except PubSubError as e:
+            # The notifications are redelivered once their leases run out.
+            print(f"Error acknowledging {len(ack_ids)} notifications: {e}")
+            PULL_ACK_REQUESTS_TOTAL.inc(outcome="error")
+
+    async def _lease_loop(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.ack_deadline_seconds / 2))
+            if self._outstanding:
+                await self._extend(list(self._outstanding))
+
+    async def _extend(self, ack_ids: List[str]) -> None:
+        try:
+            await self.subscriber.modify_ack_deadline(ack_ids, self.ack_deadline_seconds)
+        except PubSubError as e:
+            print(f"Error extending leases of {len(ack_ids)} notifications: {e}")
+
+    async def _nack(self, ack_ids: List[str], delay_seconds: int) -> None:
+        try:
+            await self.subscriber.modify_ack_deadline(ack_ids, max(0, min(600, delay_seconds)))
+        except PubSubError as e:
+            print(f"Error returning {len(ack_ids)} notifications: {e}")
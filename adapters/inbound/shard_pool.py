@@ -0,0 +1,247 @@
+import asyncio
+import itertools
+import multiprocessing
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from core.application.events import EMAIL_EVENTS
+from core.application.metrics import QUEUE_DEPTH, REGISTRY
+from core.application.quota import QuotaDeferred
+from core.application.sharding import ConsistentHashRing
+from core.domain.entity import Email
+
+SHARD_IN_FLIGHT = REGISTRY.gauge(
+    "taskpilot_shard_in_flight", "Notifications being processed by a shard worker.", ["shard"])
+SHARD_PROCESSED = REGISTRY.gauge(
+    "taskpilot_shard_processed", "Notifications processed by a shard worker since it started.", ["shard"])
+SHARD_RESTARTS_TOTAL = REGISTRY.counter(
+    "taskpilot_shard_restarts_total", "Shard worker processes respawned after dying.", ["shard"])
+
+
+class ShardUnavailable(Exception):
+    """The shard died, or the pool stopped, before processing a notification; have it redelivered."""
+
+
+def _shard_main(shard: int, inbox, outbox, completed, in_flight) -> None:
+    """
+    Entry point of a shard process: drains its inbox strictly in order.
+    Results and stored emails go back over `outbox`, a pipe only this
+    process writes to, so dying mid-write cannot leave a lock held.
+    """
+    # Stored emails go back to the HTTP process, which holds the event streams.
+    EMAIL_EVENTS.forward = lambda email: outbox.send(("event", email.model_dump()))
+    asyncio.run(_consume(shard, inbox, outbox, completed, in_flight))
+
+
+async def _consume(shard: int, inbox, outbox, completed, in_flight) -> None:
+    # Imported here so the spawned process builds its own engine and clients.
+    from config import BACKFILL_ENABLED, LOOP_WATCHDOG_ENABLED
+    from core.application.watchdog import LOOP_WATCHDOG
+    from dependencies import email_service_scope, engine, live_work_signal
+
+    loop = asyncio.get_running_loop()
+    if LOOP_WATCHDOG_ENABLED:
+        # Stalls are logged from the shard; its metrics stay in this process.
+        LOOP_WATCHDOG.start()
+    if BACKFILL_ENABLED:
+        # The leader's backfill runs elsewhere; it learns of this shard's work through the lease.
+        live_work_signal.start()
+    # No priority scheduler here: with it unstarted, process_emails runs each
+    # email inline, so results mean done and one user's emails stay in order.
+    print(f"------ Shard {shard} worker started ------")
+    try:
+        while True:
+            item = await loop.run_in_executor(None, inbox.get)
+            if item is None:
+                break
+            request_id, user_email, history_id = item
+            in_flight.value = 1
+            outcome, detail = "done", None
+            try:
+                async with email_service_scope() as email_service:
+                    user = await email_service.get_user_credentials(user_email)
+                    if user:
+                        await email_service.process_emails(user, history_id, history_id)
+                    else:
+                        print(f"Shard {shard}: unknown user {user_email}")
+            except QuotaDeferred as e:
+                # Handed back to the caller, which has Pub/Sub redeliver it once quota is free.
+                print(f"Shard {shard}: deferring notification for {user_email} by {e.retry_after:.0f}s")
+                outcome, detail = "deferred", e.retry_after
+            except Exception as e:
+                print(f"Shard {shard}: error processing notification for {user_email}: {e}")
+                outcome, detail = "error", str(e)
+            finally:
+                with completed.get_lock():
+                    completed.value += 1
+                in_flight.value = 0
+            outbox.send(("result", (request_id, outcome, detail)))
+    finally:
+        await live_work_signal.stop()
+        await LOOP_WATCHDOG.stop()
+        await engine.dispose()
+
+
+class ShardedNotificationPool:
+    """
+    Runs notification processing in `shard_count` worker processes. Every
+    user email hashes to a fixed shard and each shard fetches for its inbox
+    and processes one notification at a time, so one user's notifications
+    stay strictly ordered while different users run in parallel across
+    cores. Shards do not run the priority scheduler; it only reorders work
+    in the HTTP process when there is no pool.
+
+    `process` returns only once the shard is done with the notification, so
+    callers acknowledge Pub/Sub after the work and not on queueing. A shard
+    that dies is respawned, and the notifications it held fail with
+    ShardUnavailable so that they are redelivered.
+
+    Ordering holds within one HTTP process; run a single HTTP worker in
+    front of the pool.
+    """
+
+    def __init__(self, shard_count: int, metrics_interval: float = 1.0):
+        self.shard_count = shard_count
+        self.ring = ConsistentHashRing(shard_count)
+        self.metrics_interval = metrics_interval
+        self._context = multiprocessing.get_context("spawn")
+        self._inboxes: List = [None] * shard_count
+        self._completed: List = [None] * shard_count
+        self._in_flight: List = [None] * shard_count
+        self._submitted: List[int] = [0] * shard_count
+        self._processes: List = [None] * shard_count
+        self._readers: List[Optional[threading.Thread]] = [None] * shard_count
+        self._request_ids = itertools.count(1)
+        self._pending: Dict[int, Tuple[int, asyncio.Future]] = {}
+        self._stopping = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._metrics_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        for shard in range(self.shard_count):
+            self._spawn(shard)
+        self._metrics_task = asyncio.create_task(self._publish_metrics())
+
+    def _spawn(self, shard: int) -> None:
+        # A fresh inbox each time: a process killed mid-get can leave the old one locked.
+        inbox = self._context.Queue()
+        completed = self._context.Value("q", 0)
+        in_flight = self._context.Value("b", 0, lock=False)
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_shard_main, args=(shard, inbox, sender, completed, in_flight),
+            name=f"taskpilot-shard-{shard}", daemon=True)
+        process.start()
+        # Only the shard holds the sending end now, so the pipe reports EOF when it exits.
+        sender.close()
+        self._inboxes[shard] = inbox
+        self._completed[shard] = completed
+        self._in_flight[shard] = in_flight
+        self._submitted[shard] = 0
+        self._processes[shard] = process
+        self._readers[shard] = threading.Thread(
+            target=self._read_shard, args=(shard, process, receiver),
+            name=f"taskpilot-shard-{shard}-reader", daemon=True)
+        self._readers[shard].start()
+
+    async def process(self, user_email: str, history_id: str) -> int:
+        """
+        Queues the notification on its user's shard and waits until the shard
+        has processed it; returns the shard. Raises QuotaDeferred when the
+        shard deferred it and ShardUnavailable when the shard died or the pool
+        stopped first.
+        """
+        if self._stopping:
+            raise ShardUnavailable("The shard pool is stopping")
+        shard = self.ring.shard_for(user_email)
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (shard, future)
+        self._inboxes[shard].put((request_id, user_email, history_id))
+        self._submitted[shard] += 1
+        QUEUE_DEPTH.set(self.backlog(shard), queue=f"shard-{shard}")
+        try:
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    def backlog(self, shard: int) -> int:
+        pending = self._submitted[shard] - self._completed[shard].value - self._in_flight[shard].value
+        return max(0, pending)
+
+    def _read_shard(self, shard: int, process, receiver) -> None:
+        """Runs in a thread per shard process; hands everything it sends to the event loop."""
+        while True:
+            try:
+                kind, data = receiver.recv()
+            except (EOFError, OSError):
+                break
+            handle = self._resolve if kind == "result" else self._publish_event
+            self._loop.call_soon_threadsafe(handle, data)
+        receiver.close()
+        self._loop.call_soon_threadsafe(self._shard_exited, shard, process)
+
+    def _resolve(self, result: tuple) -> None:
+        request_id, outcome, detail = result
+        shard, future = self._pending.pop(request_id, (None, None))
+        if future is None or future.done():
+            return
+        if outcome == "deferred":
+            future.set_exception(QuotaDeferred(f"Shard {shard} deferred the notification", detail))
+        elif outcome == "error":
+            future.set_exception(RuntimeError(f"Shard {shard}: {detail}"))
+        else:
+            future.set_result(shard)
+
+    def _publish_event(self, data: dict) -> None:
+        EMAIL_EVENTS.publish(Email(**data))
+
+    def _shard_exited(self, shard: int, process) -> None:
+        # Whatever it still held is lost with its inbox; the callers get the notifications redelivered.
+        self._fail_pending(ShardUnavailable(f"Shard {shard} worker exited"), shard)
+        if self._stopping or self._processes[shard] is not process:
+            return
+        print(f"Shard {shard} worker exited unexpectedly; restarting it")
+        SHARD_RESTARTS_TOTAL.inc(shard=str(shard))
+        self._spawn(shard)
+
+    def _fail_pending(self, error: Exception, shard: Optional[int] = None) -> None:
+        for request_id, (owner, future) in list(self._pending.items()):
+            if shard is None or owner == shard:
+                del self._pending[request_id]
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _publish_metrics(self) -> None:
+        while True:
+            for shard in range(self.shard_count):
+                QUEUE_DEPTH.set(self.backlog(shard), queue=f"shard-{shard}")
+                SHARD_IN_FLIGHT.set(self._in_flight[shard].value, shard=str(shard))
+                SHARD_PROCESSED.set(self._completed[shard].value, shard=str(shard))
+            await asyncio.sleep(self.metrics_interval)
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """
+        Lets each shard finish its backlog, then stops the processes.
+        Notifications still waiting after `timeout` fail with ShardUnavailable.
+        """
+        self._stopping = True
+        if self._metrics_task:
+            self._metrics_task.cancel()
+        for inbox in self._inboxes:
+            try:
+                inbox.put_nowait(None)
+            except queue.Full:
+                pass
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        for reader in self._readers:
+            await loop.run_in_executor(None, reader.join)
+        # Lets the results the readers handed over resolve first.
+        await asyncio.sleep(0)
+        self._fail_pending(ShardUnavailable("The shard pool stopped"))
@@ -0,0 +1,32 @@
+import zlib
+from typing import Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+
+def available_codecs() -> Tuple[str, ...]:
+    return ("zstd", "zlib") if zstandard else ("zlib",)
+
+
+def resolve_codec(name: str) -> str:
+    """Maps "auto" to the best installed codec and rejects unknown names."""
+    if name == "auto":
+        return available_codecs()[0]
+    if name not in available_codecs():
+        raise ValueError(f"Archive codec {name!r} is not available; install zstandard or use zlib")
+    return name
+
+
+def compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
@@ -0,0 +1,83 @@
+import base64
+import hashlib
+import secrets
+import urllib.parse
+from typing import List, Optional, Tuple
+
+import httpx
+
+
+class OAuthError(Exception):
+    """The token exchange or the userinfo request failed."""
+
+
+def new_pkce_pair() -> Tuple[str, str]:
+    """A random PKCE code verifier and its S256 challenge."""
+    verifier = secrets.token_urlsafe(64)
+    digest = hashlib.sha256(verifier.encode("ascii")).digest()
+    return verifier, base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+class GoogleOAuthClient:
+    """
+    Authorization-code flow against Google with PKCE, over one shared
+    httpx.AsyncClient. Holds no per-login state, so concurrent logins
+    cannot see each other's codes or verifiers.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, redirect_uri: str, scopes: List[str],
+                 auth_uri: str, token_uri: str, userinfo_uri: str, timeout: float = 10.0):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.scopes = scopes
+        self.auth_uri = auth_uri
+        self.token_uri = token_uri
+        self.userinfo_uri = userinfo_uri
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def authorization_url(self, state: str, code_challenge: str) -> str:
+        query = urllib.parse.urlencode({
+            "response_type": "code",
+            "client_id": self.client_id,
+            "redirect_uri": self.redirect_uri,
+            "scope": " ".join(self.scopes),
+            "state": state,
+            "code_challenge": code_challenge,
+            "code_challenge_method": "S256",
+            "access_type": "offline",
+            "prompt": "consent",
+        })
+        return f"{self.auth_uri}?{query}"
+
+    async def exchange_code(self, code: str, code_verifier: str) -> dict:
+        """Token response for an authorization code: access_token, refresh_token, id_token, ..."""
+        response = await self.client.post(self.token_uri, data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "code_verifier": code_verifier,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "redirect_uri": self.redirect_uri,
+        })
+        if response.status_code != 200:
+            raise OAuthError(f"Token exchange failed with {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    async def userinfo(self, access_token: str) -> dict:
+        response = await self.client.get(self.userinfo_uri, headers={"Authorization": f"Bearer {access_token}"})
+        if response.status_code != 200:
+            raise OAuthError(f"Userinfo request failed with {response.status_code}")
+        return response.json()
@@ -0,0 +1,241 @@
+import bisect
+import datetime
+import itertools
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from adapters.outbound.search import MAX_QUERY_TERMS, TITLE_WEIGHT, tokenize
+from core.application.ports.outbound import (IBackfillRepositoryPort,
+                                             IOutboxRepositoryPort,
+                                             IUserRepositoryPort)
+from core.domain.entity import BackfillJob, Email, OutboxMessage, User
+
+
+def _sort_key(email: Email) -> Tuple[datetime.datetime, int]:
+    date = email.date
+    if not isinstance(date, datetime.datetime):
+        date = datetime.datetime.combine(date, datetime.time.min)
+    return date, email.id
+
+
+class InMemoryUserRepository(IUserRepositoryPort):
+    """
+    Dict-backed reference implementation of IUserRepositoryPort for tests
+    and benchmarks. Emails are kept per receiver, sorted by (date, id).
+    """
+
+    def __init__(self):
+        self._users: Dict[int, User] = {}
+        self._user_ids_by_email: Dict[str, int] = {}
+        self._emails: Dict[str, List[Tuple[Tuple[datetime.datetime, int], Email]]] = defaultdict(list)
+        self._archive: Dict[str, List[Tuple[Tuple[datetime.datetime, int], Email]]] = defaultdict(list)
+        self._unread: Dict[str, int] = defaultdict(int)
+        self._imported: Dict[str, Set[str]] = defaultdict(set)
+        self._user_ids = itertools.count(1)
+        self._email_ids = itertools.count(1)
+
+    async def add_user(self, user: User) -> User:
+        if user.email in self._user_ids_by_email:
+            raise ValueError(f"User {user.email} already exists")
+        stored = user.model_copy(update={"id": next(self._user_ids)})
+        self._users[stored.id] = stored
+        self._user_ids_by_email[stored.email] = stored.id
+        return stored.model_copy()
+
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        user_id = self._user_ids_by_email.get(email)
+        return self._users[user_id].model_copy() if user_id is not None else None
+
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
+        user = self._users.get(user_id)
+        return user.model_copy() if user else None
+
+    async def update_user(self, user_id: int, user: User) -> User:
+        existing = self._users.get(user_id)
+        if not existing:
+            raise ValueError(f"User {user_id} not found")
+
+        updated = existing.model_copy(update=user.model_dump(exclude_unset=True))
+        if updated.email != existing.email:
+            del self._user_ids_by_email[existing.email]
+            self._user_ids_by_email[updated.email] = user_id
+        self._users[user_id] = updated
+        return updated.model_copy()
+
+    async def get_users(self) -> List[User]:
+        return [user.model_copy() for user in self._users.values()]
+
+    async def set_email_history(self, email: Email, gmail_message_id: Optional[str] = None) -> Optional[Email]:
+        if gmail_message_id is not None:
+            imported = self._imported[email.receiver_email]
+            if gmail_message_id in imported:
+                return None
+            imported.add(gmail_message_id)
+        stored = email.model_copy(update={"id": next(self._email_ids)})
+        bisect.insort(self._emails[stored.receiver_email], (_sort_key(stored), stored),
+                      key=lambda entry: entry[0])
+        if not stored.read:
+            self._unread[stored.receiver_email] += 1
+        return stored.model_copy()
+
+    async def filter_imported(self, receiver_email: str, gmail_message_ids: List[str]) -> List[str]:
+        imported = self._imported.get(receiver_email, set())
+        return [message_id for message_id in gmail_message_ids if message_id not in imported]
+
+    async def get_emails(self, receiver_email: str, skip: int, limit: int) -> List[Email]:
+        entries = self._archive.get(receiver_email, []) + self._emails.get(receiver_email, [])
+        end = len(entries) - skip
+        start = max(0, end - limit)
+        return [email.model_copy() for _, email in reversed(entries[start:max(0, end)])]
+
+    async def get_email_rows(self, receiver_email: str, skip: int, limit: int) -> List[dict]:
+        return [email.model_dump() for email in await self.get_emails(receiver_email, skip, limit)]
+
+    async def stream_email_rows(self, receiver_email: str, since: Optional[datetime.datetime] = None,
+                                until: Optional[datetime.datetime] = None,
+                                batch_size: int = 1000) -> AsyncIterator[dict]:
+        entries = self._archive.get(receiver_email, []) + self._emails.get(receiver_email, [])
+        for (date, _), email in reversed(entries):
+            if (since is None or date >= since) and (until is None or date < until):
+                yield email.model_dump()
+
+    async def get_latest_email_by_date(self, receiver_email: str) -> Optional[Email]:
+        entries = self._emails.get(receiver_email)
+        return entries[-1][1].model_copy() if entries else None
+
+    async def get_emails_after(self, receiver_email: str, after_id: int, limit: int) -> List[Email]:
+        newer = sorted((email for _, email in self._emails.get(receiver_email, []) if email.id > after_id),
+                       key=lambda email: email.id)
+        return [email.model_copy() for email in newer[:limit]]
+
+    async def search_emails(self, receiver_email: str, query: str, limit: int, offset: int) -> List[Email]:
+        terms = set(tokenize(query, MAX_QUERY_TERMS))
+        if not terms:
+            return []
+        # Archived matches follow the hot ones, as in the SQL repository.
+        matches = self._rank(self._emails.get(receiver_email, []), terms) + \
+            self._rank(self._archive.get(receiver_email, []), terms)
+        return [email.model_copy() for email in matches[offset:offset + limit]]
+
+    @staticmethod
+    def _rank(entries, terms) -> List[Email]:
+        ranked = []
+        for _, email in entries:
+            title, summary = set(tokenize(email.title)), set(tokenize(email.summary))
+            if terms <= title | summary:
+                score = sum(TITLE_WEIGHT * (term in title) + (term in summary) for term in terms)
+                ranked.append((-score, -email.id, email))
+        ranked.sort(key=lambda entry: entry[:2])
+        return [email for _, _, email in ranked]
+
+    async def get_unread_count(self, receiver_email: str) -> int:
+        return self._unread.get(receiver_email, 0)
+
+    async def set_read_state(self, receiver_email: str, read: bool, ids: Optional[List[int]] = None,
+                             up_to_id: Optional[int] = None) -> int:
+        if not ids and up_to_id is None:
+            return 0
+        wanted = set(ids) if ids else None
+        changed = 0
+        for _, email in self._emails.get(receiver_email, []):
+            selected = email.id in wanted if wanted is not None else email.id <= up_to_id
+            if selected and email.read != read:
+                email.read = read
+                changed += 1
+        self._unread[receiver_email] += -changed if read else changed
+        return changed
+
+    async def archive_emails_before(self, receiver_email: str, cutoff: datetime.datetime, limit: int) -> int:
+        entries = self._emails.get(receiver_email, [])
+        moved = sorted((entry for entry in entries if entry[0][0] < cutoff), key=lambda entry: entry[1].id)[:limit]
+        if not moved:
+            return 0
+        moved_ids = {email.id for _, email in moved}
+        entries[:] = [entry for entry in entries if entry[1].id not in moved_ids]
+        archive = self._archive[receiver_email]
+        for entry in moved:
+            bisect.insort(archive, entry, key=lambda item: item[0])
+        self._unread[receiver_email] -= sum(1 for _, email in moved if not email.read)
+        return len(moved)
+
+    async def compact_storage(self) -> None:
+        pass
+
+
+class InMemoryOutboxRepository(IOutboxRepositoryPort):
+    """Dict-backed IOutboxRepositoryPort for tests, benchmarks and single-process runs."""
+
+    def __init__(self):
+        self._messages: Dict[int, OutboxMessage] = {}
+        self._ids = itertools.count(1)
+
+    async def enqueue(self, message: OutboxMessage) -> OutboxMessage:
+        now = datetime.datetime.utcnow()
+        stored = message.model_copy(update={
+            "id": next(self._ids),
+            "created_at": message.created_at or now,
+            "next_attempt_at": message.next_attempt_at or now,
+        })
+        self._messages[stored.id] = stored
+        return stored.model_copy()
+
+    async def claim_due(self, limit: int, lease_seconds: float) -> List[OutboxMessage]:
+        now = datetime.datetime.utcnow()
+        due = sorted((m for m in self._messages.values()
+                      if m.status == "pending" and m.next_attempt_at <= now),
+                     key=lambda m: (m.next_attempt_at, m.id))[:limit]
+        for message in due:
+            message.attempts += 1
+            message.next_attempt_at = now + datetime.timedelta(seconds=lease_seconds)
+        return [message.model_copy() for message in due]
+
+    async def mark_sent(self, message_id: int, gmail_message_id: str) -> None:
+        message = self._messages[message_id]
+        message.status = "sent"
+        message.gmail_message_id = gmail_message_id
+        message.sent_at = datetime.datetime.utcnow()
+        message.last_error = None
+
+    async def reschedule(self, message_id: int, next_attempt_at: datetime.datetime,
+                         error: Optional[str] = None, count_attempt: bool = True) -> None:
+        message = self._messages[message_id]
+        message.next_attempt_at = next_attempt_at
+        message.last_error = error
+        if not count_attempt:
+            message.attempts -= 1
+
+    async def mark_failed(self, message_id: int, error: str) -> None:
+        message = self._messages[message_id]
+        message.status = "failed"
+        message.last_error = error
+
+    async def count_by_status(self) -> Dict[str, int]:
+        counts: Dict[str, int] = defaultdict(int)
+        for message in self._messages.values():
+            counts[message.status] += 1
+        return dict(counts)
+
+
+class InMemoryBackfillRepository(IBackfillRepositoryPort):
+    """Dict-backed IBackfillRepositoryPort for tests and benchmarks."""
+
+    def __init__(self):
+        self._jobs: Dict[str, BackfillJob] = {}
+
+    async def create(self, job: BackfillJob) -> BackfillJob:
+        if job.user_email not in self._jobs:
+            now = datetime.datetime.utcnow()
+            self._jobs[job.user_email] = job.model_copy(update={"created_at": now, "updated_at": now})
+        return self._jobs[job.user_email].model_copy()
+
+    async def get(self, user_email: str) -> Optional[BackfillJob]:
+        job = self._jobs.get(user_email)
+        return job.model_copy() if job else None
+
+    async def next_unfinished(self) -> Optional[BackfillJob]:
+        unfinished = [job for job in self._jobs.values() if job.status in ("pending", "running")]
+        return min(unfinished, key=lambda job: job.created_at).model_copy() if unfinished else None
+
+    async def save(self, job: BackfillJob) -> None:
+        self._jobs[job.user_email] = job.model_copy(
+            update={"updated_at": datetime.datetime.utcnow(), "page_done_ids": list(job.page_done_ids)})
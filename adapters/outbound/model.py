@@ -1,14 +1,41 @@
+import json
 from datetime import datetime
 from typing import Optional
 
 from pydantic import BaseModel
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Index, Integer,
+                        LargeBinary, String, Text, TypeDecorator)
 from sqlalchemy.ext.declarative import declarative_base
 
-from core.domain.entity import Email, User
+from adapters.outbound import archive_codec
+from core.domain.entity import BackfillJob, Email, OutboxMessage, User
 
 Base = declarative_base()
 
+# Email's fields in declaration order, so lean rows serialize like the model.
+EMAIL_FIELDS = tuple(Email.model_fields)
+
+
+def _to_bool(value) -> Optional[bool]:
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "t", "yes")
+    return bool(value)
+
+
+class TextTolerantBoolean(TypeDecorator):
+    """
+    Boolean that also reads the '0'/'1' strings stored while `emails.read`
+    was a VARCHAR, for rows written by an older worker until init_db has
+    migrated the column.
+    """
+    impl = Boolean
+    cache_ok = True
+
+    def result_processor(self, dialect, coltype):
+        return _to_bool
+
 
 class UserModel(Base):
     __tablename__ = "users"
@@ -56,7 +83,10 @@ class EmailModel(Base):
     title = Column(String(500), nullable=False)           # Added length
     summary = Column(String(2000), nullable=False)        # Added length
     priority = Column(String(50), nullable=False)         # Added length
-    read = Column(String(10), nullable=False)             # Added length
+    read = Column(TextTolerantBoolean, nullable=False, default=False)
+
+    __table_args__ = (Index("ix_emails_receiver_read", "receiver_email", "read"),
+                      Index("ix_emails_receiver_date", "receiver_email", "date"))
 
     def to_domain(self) -> Email:
         return Email(
@@ -72,3 +102,160 @@ class EmailModel(Base):
             priority=self.priority,
             read=self.read
         )
+
+
+class EmailArchiveModel(Base):
+    """Emails moved out of `emails` by the retention job, stored as compressed JSON."""
+    __tablename__ = "email_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    receiver_email = Column(String(255), nullable=False)
+    date = Column(DateTime, nullable=False)
+    codec = Column(String(10), nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (Index("ix_email_archive_receiver_date", "receiver_email", "date", "id"),)
+
+    ARCHIVED_COLUMNS = ("user_id", "sender_email", "sender_name", "history_id",
+                        "title", "summary", "priority", "read")
+
+    @classmethod
+    def from_email(cls, email: EmailModel, codec: str, archived_at: datetime) -> "EmailArchiveModel":
+        fields = {column: getattr(email, column) for column in cls.ARCHIVED_COLUMNS}
+        payload = json.dumps(fields, separators=(",", ":")).encode()
+        return cls(id=email.id, receiver_email=email.receiver_email, date=email.date, codec=codec,
+                   payload=archive_codec.compress(codec, payload), archived_at=archived_at)
+
+    def to_row(self) -> dict:
+        fields = json.loads(archive_codec.decompress(self.codec, self.payload))
+        fields.update(id=self.id, receiver_email=self.receiver_email, date=self.date.date())
+        return {name: fields[name] for name in EMAIL_FIELDS}
+
+    def to_domain(self) -> Email:
+        return Email(**self.to_row())
+
+
+class MailboxCounterModel(Base):
+    """Per-user unread count, kept in step with `emails.read` in the same transaction."""
+    __tablename__ = "mailbox_counters"
+
+    receiver_email = Column(String(255), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+
+
+class ImportedMessageModel(Base):
+    """Gmail messages already stored by a backfill, so an import never stores one twice."""
+    __tablename__ = "imported_messages"
+
+    receiver_email = Column(String(255), primary_key=True)
+    gmail_message_id = Column(String(64), primary_key=True)
+
+
+class EmailTermModel(Base):
+    """Inverted index used for search on databases without native full-text support."""
+    __tablename__ = "email_terms"
+
+    email_id = Column(Integer, primary_key=True)
+    term = Column(String(64), primary_key=True)
+    receiver_email = Column(String(255), nullable=False)
+    weight = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_email_terms_receiver_term", "receiver_email", "term"),)
+
+
+class EmailArchiveTermModel(Base):
+    """Inverted index over `email_archive`, filled as the retention job archives emails."""
+    __tablename__ = "email_archive_terms"
+
+    email_id = Column(Integer, primary_key=True)
+    term = Column(String(64), primary_key=True)
+    receiver_email = Column(String(255), nullable=False)
+    weight = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_email_archive_terms_receiver_term", "receiver_email", "term"),)
+
+
+class LeaseModel(Base):
+    __tablename__ = "leases"
+
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    renewed_at = Column(DateTime, nullable=False)
+
+
+class OutboxModel(Base):
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_email = Column(String(255), nullable=False)
+    to = Column(String(255), nullable=False)
+    subject = Column(String(998), nullable=False)
+    body = Column(Text, nullable=False)
+    thread_id = Column(String(255), nullable=True)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    claimed_by = Column(String(64), nullable=True)
+    last_error = Column(String(1000), nullable=True)
+    gmail_message_id = Column(String(255), nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),)
+
+    def to_domain(self) -> OutboxMessage:
+        return OutboxMessage(
+            id=self.id,
+            user_email=self.user_email,
+            to=self.to,
+            subject=self.subject,
+            body=self.body,
+            thread_id=self.thread_id,
+            status=self.status,
+            attempts=self.attempts,
+            next_attempt_at=self.next_attempt_at,
+            last_error=self.last_error,
+            gmail_message_id=self.gmail_message_id,
+            created_at=self.created_at,
+            sent_at=self.sent_at
+        )
+
+
+class BackfillJobModel(Base):
+    """One row per user; the checkpoint the backfill resumes from after a restart."""
+    __tablename__ = "backfill_jobs"
+
+    user_email = Column(String(255), primary_key=True)
+    status = Column(String(20), nullable=False, default="pending")
+    since = Column(DateTime, nullable=False)
+    page_token = Column(String(255), nullable=True)
+    page_done_ids = Column(Text, nullable=False, default="[]")
+    pages = Column(Integer, nullable=False, default=0)
+    imported = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    estimated_total = Column(Integer, nullable=True)
+    error = Column(String(1000), nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_backfill_jobs_status_created", "status", "created_at"),)
+
+    def to_domain(self) -> BackfillJob:
+        return BackfillJob(
+            user_email=self.user_email,
+            status=self.status,
+            since=self.since,
+            page_token=self.page_token,
+            page_done_ids=json.loads(self.page_done_ids),
+            pages=self.pages,
+            imported=self.imported,
+            failed=self.failed,
+            estimated_total=self.estimated_total,
+            error=self.error,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            finished_at=self.finished_at
+        )
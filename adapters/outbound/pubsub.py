@@ -0,0 +1,82 @@
+import asyncio
+from typing import List, Optional
+
+import httpx
+
+PUBSUB_SCOPE = "https://www.googleapis.com/auth/pubsub"
+PUBSUB_ENDPOINT = "https://pubsub.googleapis.com"
+# Pub/Sub accepts at most this many ack IDs in one acknowledge or modifyAckDeadline call.
+MAX_ACK_IDS_PER_REQUEST = 2500
+
+
+class PubSubError(Exception):
+    """A Pub/Sub REST call failed."""
+
+
+class PubSubSubscriberClient:
+    """
+    Subscriber side of the Pub/Sub REST API over one shared
+    httpx.AsyncClient. With `emulator_host` set (as in
+    PUBSUB_EMULATOR_HOST) it talks plain HTTP to the emulator, or a
+    stand-in such as benchmarks.fakes, without credentials; otherwise it
+    uses the application default credentials.
+    """
+
+    def __init__(self, project_id: str, subscription: str, emulator_host: Optional[str] = None,
+                 timeout: float = 90.0):
+        self.subscription_path = f"projects/{project_id}/subscriptions/{subscription}"
+        self.emulator_host = emulator_host
+        endpoint = f"http://{emulator_host}" if emulator_host else PUBSUB_ENDPOINT
+        self.base_url = f"{endpoint}/v1/{self.subscription_path}"
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._credentials = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _headers(self) -> dict:
+        if self.emulator_host:
+            return {}
+        if self._credentials is None:
+            import google.auth
+            self._credentials, _ = await asyncio.to_thread(google.auth.default, scopes=[PUBSUB_SCOPE])
+        if not self._credentials.valid:
+            import google.auth.transport.requests
+            await asyncio.to_thread(self._credentials.refresh, google.auth.transport.requests.Request())
+        return {"Authorization": f"Bearer {self._credentials.token}"}
+
+    async def _post(self, action: str, body: dict) -> dict:
+        try:
+            response = await self.client.post(f"{self.base_url}:{action}", json=body, headers=await self._headers())
+        except httpx.HTTPError as e:
+            raise PubSubError(f"{action} failed: {e!r}") from e
+        if response.status_code != 200:
+            raise PubSubError(f"{action} failed with {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    async def pull(self, max_messages: int) -> List[dict]:
+        """
+        Long-polls for up to `max_messages`; returns the received messages
+        ({"ackId", "message": {"data", "messageId", ...}}), or [] when the
+        server ends the poll empty.
+        """
+        return (await self._post("pull", {"maxMessages": max_messages})).get("receivedMessages", [])
+
+    async def acknowledge(self, ack_ids: List[str]) -> None:
+        for start in range(0, len(ack_ids), MAX_ACK_IDS_PER_REQUEST):
+            await self._post("acknowledge", {"ackIds": ack_ids[start:start + MAX_ACK_IDS_PER_REQUEST]})
+
+    async def modify_ack_deadline(self, ack_ids: List[str], seconds: int) -> None:
+        """Extends the lease on the messages, or with 0 seconds hands them back for redelivery."""
+        for start in range(0, len(ack_ids), MAX_ACK_IDS_PER_REQUEST):
+            await self._post("modifyAckDeadline", {"ackIds": ack_ids[start:start + MAX_ACK_IDS_PER_REQUEST],
+                                                   "ackDeadlineSeconds": seconds})
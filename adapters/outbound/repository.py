@@ -1,18 +1,74 @@
-from typing import List, Optional
+import datetime
+import json
+import uuid
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 
-from sqlalchemy import desc
+from sqlalchemy import and_, delete, desc, func, or_, text, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from adapters.outbound.model import EmailModel, UserModel
-from core.application.ports.outbound import IUserRepositoryPort
-from core.domain.entity import Email, User
+from adapters.outbound.archive_codec import resolve_codec
+from adapters.outbound.model import (EMAIL_FIELDS, BackfillJobModel,
+                                     EmailArchiveModel, EmailModel,
+                                     ImportedMessageModel, LeaseModel,
+                                     MailboxCounterModel, OutboxModel,
+                                     UserModel)
+from adapters.outbound.search import (ARCHIVE_SEARCH_INDEX, MAX_QUERY_TERMS,
+                                      EmailSearchIndex, get_search_index,
+                                      tokenize)
+from config import ARCHIVE_CODEC, SEARCH_BACKEND
+from core.application.metrics import REPOSITORY_QUERY_SECONDS, timed
+from core.application.ports.outbound import (IBackfillRepositoryPort,
+                                             ILeaseRepositoryPort,
+                                             IOutboxRepositoryPort,
+                                             IUserRepositoryPort)
+from core.domain.entity import BackfillJob, Email, OutboxMessage, User
+
+
+def _clip(value: Optional[str], column) -> Optional[str]:
+    """Shortens `value` to fit the String `column`; error texts can be arbitrarily long."""
+    length = column.type.length
+    return value if value is None or len(value) <= length else value[:length - 3] + "..."
 
 
 class SQLAlchemyUserRepository(IUserRepositoryPort):
+    # Receivers whose mailbox_counters row is known to exist, shared per process.
+    _counters_ready = set()
+
     def __init__(self, db_session: AsyncSession):
         self.db_session = db_session
 
+    async def _ensure_mailbox_counter(self, receiver_email: str) -> None:
+        """
+        Creates the receiver's counter row on first use, seeded from the
+        unread rows already stored. It is committed on its own so the insert
+        race between workers cannot roll back an email write.
+        """
+        if receiver_email in self._counters_ready:
+            return
+        try:
+            async with self.db_session.begin():
+                if await self.db_session.get(MailboxCounterModel, receiver_email) is None:
+                    unread = await self.db_session.scalar(
+                        select(func.count()).select_from(EmailModel)
+                        .filter(EmailModel.receiver_email == receiver_email, EmailModel.read == False))  # noqa: E712
+                    self.db_session.add(MailboxCounterModel(receiver_email=receiver_email, unread_count=unread))
+        except IntegrityError:
+            pass
+        self._counters_ready.add(receiver_email)
+
+    def _search_index(self) -> EmailSearchIndex:
+        return get_search_index(self.db_session.bind.dialect.name, SEARCH_BACKEND)
+
+    async def _adjust_unread(self, receiver_email: str, delta: int) -> None:
+        await self.db_session.execute(
+            update(MailboxCounterModel)
+            .where(MailboxCounterModel.receiver_email == receiver_email)
+            .values(unread_count=MailboxCounterModel.unread_count + delta)
+        )
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="add_user")
     async def add_user(self, user: User) -> User:
         async with self.db_session.begin():
             user_db = UserModel(**user.model_dump())
@@ -20,18 +76,21 @@ class SQLAlchemyUserRepository(IUserRepositoryPort):
             await self.db_session.commit()
             return user_db.to_domain()
 
+    @timed(REPOSITORY_QUERY_SECONDS, operation="get_user_by_email")
     async def get_user_by_email(self, email: str) -> Optional[User]:
         async with self.db_session.begin():
             result = await self.db_session.execute(select(UserModel).filter_by(email=email))
             user_db = result.scalars().first()
             return user_db.to_domain() if user_db else None
 
+    @timed(REPOSITORY_QUERY_SECONDS, operation="get_user_by_id")
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         async with self.db_session.begin():
             result = await self.db_session.execute(select(UserModel).filter_by(id=user_id))
             user_db = result.scalars().first()
             return user_db.to_domain() if user_db else None
 
+    @timed(REPOSITORY_QUERY_SECONDS, operation="update_user")
     async def update_user(self, user_id: int, user: User) -> User:
         async with self.db_session.begin():
             result = await self.db_session.execute(select(UserModel).filter_by(id=user_id))
@@ -45,18 +104,68 @@ class SQLAlchemyUserRepository(IUserRepositoryPort):
             await self.db_session.commit()
             return user_db.to_domain()
 
+    @timed(REPOSITORY_QUERY_SECONDS, operation="get_users")
     async def get_users(self) -> List[User]:
         async with self.db_session.begin():
             result = await self.db_session.execute(select(UserModel))
             return [user.to_domain() for user in result.scalars()]
 
-    async def set_email_history(self, email: Email) -> None:
+    @timed(REPOSITORY_QUERY_SECONDS, operation="set_email_history")
+    async def set_email_history(self, email: Email, gmail_message_id: Optional[str] = None) -> Optional[Email]:
+        await self._ensure_mailbox_counter(email.receiver_email)
+        try:
+            async with self.db_session.begin():
+                if gmail_message_id is not None:
+                    # Claimed first, so a second import of the message fails before the email is added.
+                    self.db_session.add(ImportedMessageModel(receiver_email=email.receiver_email,
+                                                             gmail_message_id=gmail_message_id))
+                    await self.db_session.flush()
+                email_db = EmailModel(**email.model_dump())
+                self.db_session.add(email_db)
+                await self.db_session.flush()
+                await self._search_index().index(self.db_session, email_db)
+                if not email.read:
+                    await self._adjust_unread(email.receiver_email, 1)
+                await self.db_session.commit()
+                return email_db.to_domain()
+        except IntegrityError:
+            if gmail_message_id is None:
+                raise
+            return None
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="filter_imported")
+    async def filter_imported(self, receiver_email: str, gmail_message_ids: List[str]) -> List[str]:
+        if not gmail_message_ids:
+            return []
         async with self.db_session.begin():
-            email_db = EmailModel(**email.model_dump())
-            self.db_session.add(email_db)
-            await self.db_session.commit()
-            return email_db.to_domain()
+            result = await self.db_session.execute(
+                select(ImportedMessageModel.gmail_message_id)
+                .filter(ImportedMessageModel.receiver_email == receiver_email,
+                        ImportedMessageModel.gmail_message_id.in_(gmail_message_ids))
+            )
+            imported = set(result.scalars())
+        return [message_id for message_id in gmail_message_ids if message_id not in imported]
+
+    async def _archive_page(self, receiver_email: str, skip: int, limit: int, hot_returned: int):
+        """
+        The archived rows that continue a page which ran past the hot rows;
+        the archive only holds emails older than anything left in `emails`.
+        """
+        if hot_returned or skip == 0:
+            hot_count = skip + hot_returned
+        else:
+            hot_count = await self.db_session.scalar(
+                select(func.count()).select_from(EmailModel).filter_by(receiver_email=receiver_email))
+        result = await self.db_session.execute(
+            select(EmailArchiveModel)
+            .filter_by(receiver_email=receiver_email)
+            .order_by(desc(EmailArchiveModel.date), desc(EmailArchiveModel.id))
+            .offset(max(0, skip - hot_count))
+            .limit(limit - hot_returned)
+        )
+        return list(result.scalars())
 
+    @timed(REPOSITORY_QUERY_SECONDS, operation="get_emails")
     async def get_emails(self, receiver_email: str, skip: int, limit: int) -> List[Email]:
         async with self.db_session.begin():
             result = await self.db_session.execute(
@@ -66,8 +175,74 @@ class SQLAlchemyUserRepository(IUserRepositoryPort):
                 .offset(skip)
                 .limit(limit)
             )
-            return [email.to_domain() for email in result.scalars()]
+            emails = [email.to_domain() for email in result.scalars()]
+            if len(emails) < limit:
+                archived = await self._archive_page(receiver_email, skip, limit, len(emails))
+                emails += [email.to_domain() for email in archived]
+            return emails
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="get_email_rows")
+    async def get_email_rows(self, receiver_email: str, skip: int, limit: int) -> List[dict]:
+        # Plain column tuples skip ORM identity-map bookkeeping; DATE() yields
+        # the same YYYY-MM-DD value the Email model serializes to.
+        columns = [getattr(EmailModel, name) for name in EMAIL_FIELDS if name != "date"]
+        async with self.db_session.begin():
+            result = await self.db_session.execute(
+                select(*columns, func.date(EmailModel.date).label("date"))
+                .filter_by(receiver_email=receiver_email)
+                .order_by(desc(EmailModel.date))
+                .offset(skip)
+                .limit(limit)
+            )
+            rows = [{name: row[name] for name in EMAIL_FIELDS} for row in result.mappings()]
+            if len(rows) < limit:
+                archived = await self._archive_page(receiver_email, skip, limit, len(rows))
+                rows += [email.to_row() for email in archived]
+            return rows
+
+    async def stream_email_rows(self, receiver_email: str, since: Optional[datetime.datetime] = None,
+                                until: Optional[datetime.datetime] = None,
+                                batch_size: int = 1000) -> AsyncIterator[dict]:
+        # Keyset pages on (date, id), each in its own short transaction, so no
+        # cursor or read lock is held while the client drains the response.
+        # The archive is read from the same position the hot rows stopped
+        # at: the retention job moves the oldest rows and keeps their ids, so
+        # a row moved mid-export is read from exactly one of the two tables.
+        columns = [getattr(EmailModel, name) for name in EMAIL_FIELDS if name != "date"]
+        position: Optional[tuple] = None
+        for model in (EmailModel, EmailArchiveModel):
+            while True:
+                query = select(model).filter_by(receiver_email=receiver_email) if model is EmailArchiveModel \
+                    else select(*columns, EmailModel.date.label("sort_date"),
+                                func.date(EmailModel.date).label("date")).filter_by(receiver_email=receiver_email)
+                if since is not None:
+                    query = query.filter(model.date >= since)
+                if until is not None:
+                    query = query.filter(model.date < until)
+                if position is not None:
+                    query = query.filter(or_(model.date < position[0],
+                                             and_(model.date == position[0], model.id < position[1])))
+                async with self.db_session.begin():
+                    result = await self.db_session.execute(
+                        query.order_by(desc(model.date), desc(model.id)).limit(batch_size))
+                    if model is EmailArchiveModel:
+                        archived = list(result.scalars())
+                        page = [email.to_row() for email in archived]
+                        if archived:
+                            position = (archived[-1].date, archived[-1].id)
+                    else:
+                        rows = list(result.mappings())
+                        page = [{name: row[name] for name in EMAIL_FIELDS} for row in rows]
+                        if rows:
+                            position = (rows[-1]["sort_date"], rows[-1]["id"])
+                # Archived rows are not tracked by the session after the page.
+                self.db_session.expunge_all()
+                for row in page:
+                    yield row
+                if len(page) < batch_size:
+                    break
 
+    @timed(REPOSITORY_QUERY_SECONDS, operation="get_latest_email_by_date")
     async def get_latest_email_by_date(self, receiver_email: str) -> Optional[Email]:
         async with self.db_session.begin():
             result = await self.db_session.execute(
@@ -78,3 +253,304 @@ class SQLAlchemyUserRepository(IUserRepositoryPort):
             )
             email = result.scalar_one_or_none()
             return email.to_domain() if email else None
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="get_emails_after")
+    async def get_emails_after(self, receiver_email: str, after_id: int, limit: int) -> List[Email]:
+        async with self.db_session.begin():
+            result = await self.db_session.execute(
+                select(EmailModel)
+                .filter(EmailModel.receiver_email == receiver_email, EmailModel.id > after_id)
+                .order_by(EmailModel.id)
+                .limit(limit)
+            )
+            return [email.to_domain() for email in result.scalars()]
+
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="search_emails")
+    async def search_emails(self, receiver_email: str, query: str, limit: int, offset: int) -> List[Email]:
+        terms = tokenize(query, MAX_QUERY_TERMS)
+        if not terms:
+            return []
+        async with self.db_session.begin():
+            index = self._search_index()
+            ranked = await index.search(self.db_session, receiver_email, terms, limit, offset)
+            found = await self._load_ranked(EmailModel, ranked)
+            if len(ranked) < limit:
+                # Archived emails are older than the hot ones, so their matches follow all hot matches.
+                if ranked or not offset:
+                    hot_total = offset + len(ranked)
+                else:
+                    hot_total = len(await index.search(self.db_session, receiver_email, terms, offset, 0))
+                archived = await ARCHIVE_SEARCH_INDEX.search(
+                    self.db_session, receiver_email, terms, limit - len(ranked), max(0, offset - hot_total))
+                found += await self._load_ranked(EmailArchiveModel, archived)
+            return found
+
+    async def _load_ranked(self, model, ranked: List[Tuple[int, float]]) -> List[Email]:
+        if not ranked:
+            return []
+        result = await self.db_session.execute(select(model).filter(model.id.in_([email_id for email_id, _ in ranked])))
+        emails = {email.id: email for email in result.scalars()}
+        return [emails[email_id].to_domain() for email_id, _ in ranked if email_id in emails]
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="get_unread_count")
+    async def get_unread_count(self, receiver_email: str) -> int:
+        await self._ensure_mailbox_counter(receiver_email)
+        async with self.db_session.begin():
+            counter = await self.db_session.get(MailboxCounterModel, receiver_email, populate_existing=True)
+            return counter.unread_count if counter else 0
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="set_read_state")
+    async def set_read_state(self, receiver_email: str, read: bool, ids: Optional[List[int]] = None,
+                             up_to_id: Optional[int] = None) -> int:
+        if not ids and up_to_id is None:
+            return 0
+        await self._ensure_mailbox_counter(receiver_email)
+        async with self.db_session.begin():
+            selector = EmailModel.id.in_(ids) if ids else EmailModel.id <= up_to_id
+            result = await self.db_session.execute(
+                update(EmailModel)
+                .where(EmailModel.receiver_email == receiver_email, EmailModel.read == (not read), selector)
+                .values(read=read)
+                .execution_options(synchronize_session=False)
+            )
+            changed = result.rowcount
+            if changed:
+                await self._adjust_unread(receiver_email, -changed if read else changed)
+            await self.db_session.commit()
+            return changed
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="archive_emails_before")
+    async def archive_emails_before(self, receiver_email: str, cutoff: datetime.datetime, limit: int) -> int:
+        codec = resolve_codec(ARCHIVE_CODEC)
+        await self._ensure_mailbox_counter(receiver_email)
+        async with self.db_session.begin():
+            result = await self.db_session.execute(
+                select(EmailModel)
+                .filter(EmailModel.receiver_email == receiver_email, EmailModel.date < cutoff)
+                .order_by(EmailModel.id)
+                .limit(limit)
+            )
+            emails = list(result.scalars())
+            if not emails:
+                return 0
+            archived_at = datetime.datetime.utcnow()
+            self.db_session.add_all(EmailArchiveModel.from_email(email, codec, archived_at) for email in emails)
+            await self._search_index().remove(self.db_session, emails)
+            await ARCHIVE_SEARCH_INDEX.index_all(self.db_session, emails)
+            await self.db_session.execute(
+                delete(EmailModel)
+                .where(EmailModel.id.in_([email.id for email in emails]))
+                .execution_options(synchronize_session=False)
+            )
+            unread = sum(1 for email in emails if not email.read)
+            if unread:
+                await self._adjust_unread(receiver_email, -unread)
+            await self.db_session.commit()
+            return len(emails)
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="compact_storage")
+    async def compact_storage(self) -> None:
+        engine = self.db_session.bind
+        # VACUUM and OPTIMIZE TABLE cannot run inside a transaction.
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if engine.dialect.name == "sqlite":
+                await self._search_index().optimize(conn)
+                await conn.execute(text("VACUUM"))
+            elif engine.dialect.name in ("mysql", "mariadb"):
+                await conn.execute(text("OPTIMIZE TABLE emails, email_terms"))
+
+
+class SQLAlchemyLeaseRepository(ILeaseRepositoryPort):
+    """
+    Leases stored as rows in `leases`. Each acquire or renew is a single
+    conditional UPDATE, so two processes cannot both take an expired lease.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession]):
+        self.session_factory = session_factory
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="try_acquire_lease")
+    async def try_acquire(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        now = datetime.datetime.utcnow()
+        expires_at = now + datetime.timedelta(seconds=ttl_seconds)
+        async with self.session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(LeaseModel)
+                    .where(LeaseModel.name == name)
+                    .where(or_(LeaseModel.holder == holder, LeaseModel.expires_at < now))
+                    .values(holder=holder, expires_at=expires_at, renewed_at=now)
+                )
+                if result.rowcount == 1:
+                    return True
+            try:
+                async with session.begin():
+                    session.add(LeaseModel(name=name, holder=holder,
+                                           expires_at=expires_at, renewed_at=now))
+                return True
+            except IntegrityError:
+                return False
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="release_lease")
+    async def release(self, name: str, holder: str) -> None:
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    update(LeaseModel)
+                    .where(LeaseModel.name == name, LeaseModel.holder == holder)
+                    .values(expires_at=datetime.datetime.utcnow())
+                )
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="any_lease_held")
+    async def any_held(self, prefix: str) -> bool:
+        async with self.session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(LeaseModel.name)
+                    .where(LeaseModel.name.startswith(prefix, autoescape=True))
+                    .where(LeaseModel.expires_at > datetime.datetime.utcnow())
+                    .limit(1)
+                )
+                return result.first() is not None
+
+
+class SQLAlchemyOutboxRepository(IOutboxRepositoryPort):
+    """
+    Outbound mail queue. Like the lease repository it opens a session per
+    call, because the sender runs outside any request.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession]):
+        self.session_factory = session_factory
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="outbox_enqueue")
+    async def enqueue(self, message: OutboxMessage) -> OutboxMessage:
+        now = datetime.datetime.utcnow()
+        async with self.session_factory() as session:
+            async with session.begin():
+                row = OutboxModel(**message.model_dump(exclude={"id"}))
+                row.created_at = row.created_at or now
+                row.next_attempt_at = row.next_attempt_at or now
+                session.add(row)
+            return row.to_domain()
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="outbox_claim_due")
+    async def claim_due(self, limit: int, lease_seconds: float) -> List[OutboxMessage]:
+        now = datetime.datetime.utcnow()
+        token = uuid.uuid4().hex
+        async with self.session_factory() as session:
+            async with session.begin():
+                due = await session.execute(
+                    select(OutboxModel.id)
+                    .where(OutboxModel.status == "pending", OutboxModel.next_attempt_at <= now)
+                    .order_by(OutboxModel.next_attempt_at)
+                    .limit(limit)
+                )
+                ids = list(due.scalars())
+                if not ids:
+                    return []
+                # The due check is repeated so two senders never claim the same row.
+                await session.execute(
+                    update(OutboxModel)
+                    .where(OutboxModel.id.in_(ids), OutboxModel.status == "pending",
+                           OutboxModel.next_attempt_at <= now)
+                    .values(claimed_by=token, attempts=OutboxModel.attempts + 1,
+                            next_attempt_at=now + datetime.timedelta(seconds=lease_seconds))
+                )
+                claimed = await session.execute(
+                    select(OutboxModel).where(OutboxModel.id.in_(ids), OutboxModel.claimed_by == token)
+                    .order_by(OutboxModel.id)
+                )
+                return [row.to_domain() for row in claimed.scalars()]
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="outbox_mark_sent")
+    async def mark_sent(self, message_id: int, gmail_message_id: str) -> None:
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    update(OutboxModel).where(OutboxModel.id == message_id)
+                    .values(status="sent", gmail_message_id=gmail_message_id,
+                            sent_at=datetime.datetime.utcnow(), last_error=None)
+                )
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="outbox_reschedule")
+    async def reschedule(self, message_id: int, next_attempt_at: datetime.datetime,
+                         error: Optional[str] = None, count_attempt: bool = True) -> None:
+        values = {"next_attempt_at": next_attempt_at, "last_error": _clip(error, OutboxModel.last_error)}
+        if not count_attempt:
+            values["attempts"] = OutboxModel.attempts - 1
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(update(OutboxModel).where(OutboxModel.id == message_id).values(**values))
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="outbox_mark_failed")
+    async def mark_failed(self, message_id: int, error: str) -> None:
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    update(OutboxModel).where(OutboxModel.id == message_id)
+                    .values(status="failed", last_error=_clip(error, OutboxModel.last_error))
+                )
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="outbox_count_by_status")
+    async def count_by_status(self) -> Dict[str, int]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(OutboxModel.status, func.count()).group_by(OutboxModel.status))
+            return {status: count for status, count in result.all()}
+
+
+class SQLAlchemyBackfillRepository(IBackfillRepositoryPort):
+    """Backfill checkpoints in `backfill_jobs`, one short transaction per call."""
+
+    def __init__(self, session_factory: Callable[[], AsyncSession]):
+        self.session_factory = session_factory
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="create_backfill")
+    async def create(self, job: BackfillJob) -> BackfillJob:
+        now = datetime.datetime.utcnow()
+        async with self.session_factory() as session:
+            try:
+                async with session.begin():
+                    row = BackfillJobModel(
+                        user_email=job.user_email, status=job.status, since=job.since,
+                        page_done_ids="[]", pages=0, imported=0, failed=0, created_at=now, updated_at=now)
+                    session.add(row)
+                return row.to_domain()
+            except IntegrityError:
+                pass
+        return await self.get(job.user_email)
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="get_backfill")
+    async def get(self, user_email: str) -> Optional[BackfillJob]:
+        async with self.session_factory() as session:
+            row = await session.get(BackfillJobModel, user_email)
+            return row.to_domain() if row else None
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="next_unfinished_backfill")
+    async def next_unfinished(self) -> Optional[BackfillJob]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(BackfillJobModel)
+                .filter(BackfillJobModel.status.in_(("pending", "running")))
+                .order_by(BackfillJobModel.created_at)
+                .limit(1)
+            )
+            row = result.scalar_one_or_none()
+            return row.to_domain() if row else None
+
+    @timed(REPOSITORY_QUERY_SECONDS, operation="save_backfill")
+    async def save(self, job: BackfillJob) -> None:
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    update(BackfillJobModel)
+                    .where(BackfillJobModel.user_email == job.user_email)
+                    .values(status=job.status, since=job.since, created_at=job.created_at, page_token=job.page_token,
+                            page_done_ids=json.dumps(job.page_done_ids), pages=job.pages,
+                            imported=job.imported, failed=job.failed, estimated_total=job.estimated_total,
+                            error=_clip(job.error, BackfillJobModel.error), updated_at=datetime.datetime.utcnow(),
+                            finished_at=job.finished_at)
+                )
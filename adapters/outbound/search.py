@@ -0,0 +1,230 @@
+import functools
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from adapters.outbound.model import (EmailArchiveModel, EmailArchiveTermModel,
+                                    EmailModel, EmailTermModel)
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+MAX_QUERY_TERMS = 16
+TITLE_WEIGHT = 2
+
+
+def tokenize(value: Optional[str], limit: Optional[int] = None) -> List[str]:
+    """Lower-cased word tokens of two or more characters, in order, without repeats."""
+    seen = {}
+    for token in TOKEN_PATTERN.findall((value or "").lower()):
+        if len(token) > 1 and token not in seen:
+            seen[token] = None
+            if limit and len(seen) >= limit:
+                break
+    return list(seen)
+
+
+class EmailSearchIndex:
+    """
+    Full-text index over email titles and summaries. `index` runs inside the
+    transaction that stores the email; `search` returns (email id, score)
+    pairs, best match first.
+    """
+    name = "base"
+
+    async def setup(self, conn: AsyncConnection) -> None:
+        pass
+
+    async def index(self, session: AsyncSession, email: EmailModel) -> None:
+        pass
+
+    async def remove(self, session: AsyncSession, emails: List[EmailModel]) -> None:
+        """Drops emails that are about to be deleted from `emails`."""
+        pass
+
+    async def search(self, session: AsyncSession, receiver_email: str, terms: List[str],
+                     limit: int, offset: int) -> List[Tuple[int, float]]:
+        raise NotImplementedError
+
+    async def rebuild(self, conn: AsyncConnection) -> None:
+        pass
+
+    async def optimize(self, conn: AsyncConnection) -> None:
+        """Merges or compacts index structures after large deletes."""
+        pass
+
+
+class SQLiteFTS5Index(EmailSearchIndex):
+    """FTS5 table using `emails` as external content, ranked by bm25."""
+    name = "fts5"
+
+    async def setup(self, conn: AsyncConnection) -> None:
+        exists = await conn.scalar(text(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'emails_fts'"))
+        if exists:
+            return
+        await conn.execute(text(
+            "CREATE VIRTUAL TABLE emails_fts USING fts5("
+            "title, summary, receiver_email UNINDEXED, content='emails', content_rowid='id')"))
+        # Index whatever was stored before search existed.
+        await self.rebuild(conn)
+
+    async def index(self, session: AsyncSession, email: EmailModel) -> None:
+        await session.execute(
+            text("INSERT INTO emails_fts(rowid, title, summary, receiver_email) "
+                 "VALUES (:id, :title, :summary, :receiver_email)"),
+            {"id": email.id, "title": email.title, "summary": email.summary,
+             "receiver_email": email.receiver_email})
+
+    async def remove(self, session: AsyncSession, emails: List[EmailModel]) -> None:
+        # External-content tables need the old values to remove their tokens.
+        await session.execute(
+            text("INSERT INTO emails_fts(emails_fts, rowid, title, summary, receiver_email) "
+                 "VALUES ('delete', :id, :title, :summary, :receiver_email)"),
+            [{"id": email.id, "title": email.title, "summary": email.summary,
+              "receiver_email": email.receiver_email} for email in emails])
+
+    async def search(self, session: AsyncSession, receiver_email: str, terms: List[str],
+                     limit: int, offset: int) -> List[Tuple[int, float]]:
+        # Every term must match, as a prefix; tokens are \w+ so they need no escaping.
+        match = " ".join(f'"{term}"*' for term in terms)
+        result = await session.execute(
+            text("SELECT rowid, bm25(emails_fts, 2.0, 1.0) AS score FROM emails_fts "
+                 "WHERE emails_fts MATCH :match AND receiver_email = :receiver_email "
+                 "ORDER BY score LIMIT :limit OFFSET :offset"),
+            {"match": match, "receiver_email": receiver_email, "limit": limit, "offset": offset})
+        # bm25 is lower-is-better; flip it so every backend ranks higher-is-better.
+        return [(row_id, -score) for row_id, score in result.all()]
+
+    async def rebuild(self, conn: AsyncConnection) -> None:
+        await conn.execute(text("INSERT INTO emails_fts(emails_fts) VALUES ('rebuild')"))
+
+    async def optimize(self, conn: AsyncConnection) -> None:
+        await conn.execute(text("INSERT INTO emails_fts(emails_fts) VALUES ('optimize')"))
+
+
+class MySQLFulltextIndex(EmailSearchIndex):
+    """InnoDB FULLTEXT index on (title, summary); MySQL maintains it on insert."""
+    name = "mysql"
+    INDEX_NAME = "ft_emails_title_summary"
+
+    async def setup(self, conn: AsyncConnection) -> None:
+        exists = await conn.scalar(
+            text("SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                 "AND table_name = 'emails' AND index_name = :name"),
+            {"name": self.INDEX_NAME})
+        if not exists:
+            await conn.execute(text(f"ALTER TABLE emails ADD FULLTEXT INDEX {self.INDEX_NAME} (title, summary)"))
+
+    async def search(self, session: AsyncSession, receiver_email: str, terms: List[str],
+                     limit: int, offset: int) -> List[Tuple[int, float]]:
+        match = " ".join(f"+{term}*" for term in terms)
+        result = await session.execute(
+            text("SELECT id, MATCH(title, summary) AGAINST (:match IN BOOLEAN MODE) AS score FROM emails "
+                 "WHERE receiver_email = :receiver_email AND MATCH(title, summary) AGAINST (:match IN BOOLEAN MODE) "
+                 "ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset"),
+            {"match": match, "receiver_email": receiver_email, "limit": limit, "offset": offset})
+        return [(row_id, float(score)) for row_id, score in result.all()]
+
+    async def rebuild(self, conn: AsyncConnection) -> None:
+        await conn.execute(text(f"ALTER TABLE emails DROP INDEX {self.INDEX_NAME}"))
+        await self.setup(conn)
+
+
+class TermTableIndex(EmailSearchIndex):
+    """
+    Portable inverted index in the `email_terms` table: one row per distinct
+    term of an email, weighted higher for title terms. Exact-term matching,
+    every query term required, ranked by summed weight.
+    """
+    name = "portable"
+    model = EmailTermModel
+
+    @staticmethod
+    def _rows(email: EmailModel) -> List[dict]:
+        weights = {term: 1 for term in tokenize(email.summary)}
+        for term in tokenize(email.title):
+            weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+        return [{"term": term[:64], "email_id": email.id, "receiver_email": email.receiver_email, "weight": weight}
+                for term, weight in weights.items()]
+
+    async def index(self, session: AsyncSession, email: EmailModel) -> None:
+        rows = self._rows(email)
+        if rows:
+            await session.execute(insert(self.model), rows)
+
+    async def remove(self, session: AsyncSession, emails: List[EmailModel]) -> None:
+        await session.execute(delete(self.model).where(self.model.email_id.in_([email.id for email in emails])))
+
+    async def search(self, session: AsyncSession, receiver_email: str, terms: List[str],
+                     limit: int, offset: int) -> List[Tuple[int, float]]:
+        terms = [term[:64] for term in terms]
+        score = func.sum(self.model.weight).label("score")
+        result = await session.execute(
+            select(self.model.email_id, score)
+            .where(self.model.receiver_email == receiver_email, self.model.term.in_(terms))
+            .group_by(self.model.email_id)
+            .having(func.count() == len(terms))
+            .order_by(score.desc(), self.model.email_id.desc())
+            .limit(limit).offset(offset))
+        return [(row_id, float(row_score)) for row_id, row_score in result.all()]
+
+    async def rebuild(self, conn: AsyncConnection) -> None:
+        await conn.execute(delete(EmailTermModel))
+        result = await conn.execute(select(EmailModel.id, EmailModel.receiver_email,
+                                           EmailModel.title, EmailModel.summary))
+        batch = []
+        for row in result:
+            batch.extend(self._rows(row))
+            if len(batch) >= 5000:
+                await conn.execute(insert(EmailTermModel), batch)
+                batch = []
+        if batch:
+            await conn.execute(insert(EmailTermModel), batch)
+
+
+class ArchiveTermIndex(TermTableIndex):
+    """
+    The term table index over archived emails, used whatever the hot
+    backend is: FTS5 and FULLTEXT read their rows from `emails`, so they
+    cannot keep emails that leave it. Filled in the transaction that
+    archives the emails.
+    """
+    name = "archive"
+    model = EmailArchiveTermModel
+
+    async def setup(self, conn: AsyncConnection) -> None:
+        # Index whatever was archived before the archive was searchable.
+        indexed = await conn.scalar(select(func.count()).select_from(self.model))
+        if not indexed:
+            await self.rebuild(conn)
+
+    async def index_all(self, session: AsyncSession, emails: List[EmailModel]) -> None:
+        rows = [row for email in emails for row in self._rows(email)]
+        if rows:
+            await session.execute(insert(self.model), rows)
+
+    async def rebuild(self, conn: AsyncConnection) -> None:
+        await conn.execute(delete(self.model))
+        result = await conn.execute(select(EmailArchiveModel))
+        batch = []
+        for row in result:
+            batch.extend(self._rows(EmailArchiveModel(**row._mapping).to_domain()))
+            if len(batch) >= 5000:
+                await conn.execute(insert(self.model), batch)
+                batch = []
+        if batch:
+            await conn.execute(insert(self.model), batch)
+
+
+ARCHIVE_SEARCH_INDEX = ArchiveTermIndex()
+
+BACKENDS = {"fts5": SQLiteFTS5Index, "mysql": MySQLFulltextIndex, "portable": TermTableIndex}
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_index(dialect_name: str, backend: str = "auto") -> EmailSearchIndex:
+    """Picks the index for a database dialect, or the backend named explicitly."""
+    if backend == "auto":
+        backend = {"sqlite": "fts5", "mysql": "mysql", "mariadb": "mysql"}.get(dialect_name, "portable")
+    return BACKENDS[backend]()
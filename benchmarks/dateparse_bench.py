@@ -0,0 +1,77 @@
+"""
+Micro-benchmark for meeting date/time parsing.
+
+Compares the strict fast path and the cached, language-restricted
+dateparser fallback in core.application.dateparsing with a plain
+`dateparser.parse` call, the way meeting times used to be parsed. Each
+input is parsed --iterations times; the first dateparser call (locale
+loading) is reported separately as the cold cost.
+
+    python -m benchmarks.dateparse_bench
+    python -m benchmarks.dateparse_bench --iterations 2000 --timezone Europe/Berlin
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import zoneinfo
+from typing import Callable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.application.dateparsing import parse_meeting_datetime  # noqa: E402
+
+# (date, time) pairs as the model returns them, plus a few looser ones that
+# have to go through the fallback.
+INPUTS = [
+    ("2026-10-20", "14:00"),
+    ("2026-10-20", "09:30:00"),
+    ("2026-10-20", "2:30 PM"),
+    ("tomorrow", "3pm"),
+    ("October 21", "10:00"),
+]
+
+
+def time_calls(func: Callable[[], object], iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def describe(samples: List[float]) -> str:
+    ordered = sorted(samples)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    return f"p50 {statistics.median(ordered) * 1e6:9.1f} us   p95 {p95 * 1e6:9.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--timezone", default="Africa/Addis_Ababa")
+    args = parser.parse_args()
+    tz = zoneinfo.ZoneInfo(args.timezone)
+
+    import dateparser
+
+    start = time.perf_counter()
+    dateparser.parse("2026-10-20 14:00")
+    print(f"dateparser.parse cold call: {(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    parse_meeting_datetime("tomorrow", "3pm", tz)
+    print(f"fallback parser cold call:  {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    for date_str, time_str in INPUTS:
+        print(f"{date_str} {time_str!r}")
+        ours = time_calls(lambda: parse_meeting_datetime(date_str, time_str, tz), args.iterations)
+        baseline = time_calls(lambda: dateparser.parse(f"{date_str} {time_str}"), args.iterations)
+        print(f"  parse_meeting_datetime  {describe(ours)}   -> {parse_meeting_datetime(date_str, time_str, tz)}")
+        print(f"  dateparser.parse        {describe(baseline)}   -> {dateparser.parse(f'{date_str} {time_str}')}")
+
+
+if __name__ == "__main__":
+    main()
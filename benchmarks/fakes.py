@@ -0,0 +1,479 @@
+"""
+Local stand-ins for the Google services TaskPilot talks to: Gmail, Calendar,
+the OAuth token endpoint, Gemini `generateContent` and the Pub/Sub REST API.
+
+Each service can be given a fixed latency, random jitter and an error rate
+so the pipeline can be load-tested offline:
+
+    python -m benchmarks.fakes --port 8100 --latency gmail=20,gemini=400 --error-rate gemini=0.02
+
+Point the app at it with GMAIL_API_ENDPOINT and GEMINI_BASE_URL set to
+http://127.0.0.1:8100 and CALENDAR_API_ENDPOINT set to
+http://127.0.0.1:8100/calendar/v3/ (the override replaces the Calendar
+service path). Seeded users need the access token `fake-token-<email>`
+and the token_uri http://127.0.0.1:8100/token. For pull ingestion set
+PUBSUB_EMULATOR_HOST=127.0.0.1:8100; a message published to topic T is
+delivered to subscription T.
+"""
+import argparse
+import asyncio
+import base64
+import datetime
+import email
+import itertools
+import json
+import random
+import re
+import time
+import urllib.parse
+import uuid
+import zoneinfo
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+SERVICES = ("gmail", "calendar", "oauth", "gemini", "pubsub")
+TOKEN_PREFIX = "fake-token-"
+
+
+class FaultConfig:
+    def __init__(self, latency_ms: Optional[Dict[str, float]] = None, jitter_ms: Optional[Dict[str, float]] = None,
+                 error_rate: Optional[Dict[str, float]] = None, seed: Optional[int] = None,
+                 malformed_rate: Optional[Dict[str, float]] = None):
+        self.latency_ms = latency_ms or {}
+        self.jitter_ms = jitter_ms or {}
+        self.error_rate = error_rate or {}
+        # By Gemini model: the share of answers that are text instead of a function call.
+        self.malformed_rate = malformed_rate or {}
+        self.random = random.Random(seed)
+
+    async def apply(self, service: str) -> Optional[JSONResponse]:
+        delay = self.latency_ms.get(service, 0) + \
+            self.random.uniform(0, self.jitter_ms.get(service, 0))
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if self.random.random() < self.error_rate.get(service, 0):
+            if self.random.random() < 0.5:
+                return _google_error(429, "Rate limit exceeded", "RESOURCE_EXHAUSTED", "rateLimitExceeded")
+            return _google_error(500, "Backend error", "INTERNAL", "backendError")
+        return None
+
+
+def _google_error(code: int, message: str, status: str, reason: str) -> JSONResponse:
+    return JSONResponse(status_code=code, content={"error": {
+        "code": code, "message": message, "status": status,
+        "errors": [{"reason": reason, "message": message}],
+    }})
+
+
+class FakeMailbox:
+    def __init__(self):
+        self.messages: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        self.sent: List[dict] = []
+        self.events: List[dict] = []
+        self._ids = itertools.count(1)
+
+    def inject(self, user_email: str, sender: str, subject: str, body: str, priority: Optional[str] = None,
+               age_seconds: float = 0, unread: bool = True) -> dict:
+        message_id = f"m{next(self._ids):08x}"
+        headers = [{"name": "From", "value": sender},
+                   {"name": "To", "value": user_email},
+                   {"name": "Subject", "value": subject}]
+        if priority:
+            headers.append({"name": "Priority", "value": priority})
+        message = {
+            "id": message_id,
+            "threadId": message_id,
+            "labelIds": ["UNREAD", "INBOX"] if unread else ["INBOX"],
+            "historyId": str(next(self._ids)),
+            "internalDate": str(int((time.time() - age_seconds) * 1000)),
+            "snippet": body[:100],
+            "payload": {
+                "mimeType": "text/plain",
+                "headers": headers,
+                "body": {"data": base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii")},
+            },
+        }
+        self.messages[user_email][message_id] = message
+        return message
+
+
+class FakeSubscription:
+    """At-least-once delivery with leases: unacked messages come back once their ack deadline passes."""
+
+    def __init__(self, ack_deadline_seconds: float = 10.0):
+        self.ack_deadline_seconds = ack_deadline_seconds
+        self.ready: deque = deque()
+        self.leased: Dict[str, tuple] = {}
+        self._ack_ids = itertools.count(1)
+        self.stats = {"published": 0, "delivered": 0, "redelivered": 0, "acked": 0, "nacked": 0,
+                      "pull_requests": 0, "ack_requests": 0, "modack_requests": 0}
+
+    def publish(self, message: dict) -> None:
+        self.ready.append((message, 0))
+        self.stats["published"] += 1
+
+    def _expire_leases(self) -> None:
+        now = time.monotonic()
+        for ack_id, (message, attempts, deadline) in list(self.leased.items()):
+            if deadline <= now:
+                del self.leased[ack_id]
+                self.ready.append((message, attempts))
+                self.stats["redelivered"] += 1
+
+    def take(self, max_messages: int) -> List[dict]:
+        self._expire_leases()
+        received = []
+        while self.ready and len(received) < max_messages:
+            message, attempts = self.ready.popleft()
+            ack_id = f"ack-{next(self._ack_ids)}"
+            self.leased[ack_id] = (message, attempts + 1, time.monotonic() + self.ack_deadline_seconds)
+            received.append({"ackId": ack_id, "message": message, "deliveryAttempt": attempts + 1})
+        self.stats["delivered"] += len(received)
+        return received
+
+    def acknowledge(self, ack_ids: List[str]) -> None:
+        for ack_id in ack_ids:
+            if self.leased.pop(ack_id, None) is not None:
+                self.stats["acked"] += 1
+
+    def modify_ack_deadline(self, ack_ids: List[str], seconds: float) -> None:
+        for ack_id in ack_ids:
+            if ack_id in self.leased:
+                message, attempts, _ = self.leased[ack_id]
+                self.leased[ack_id] = (message, attempts, time.monotonic() + seconds)
+                if seconds == 0:
+                    self.stats["nacked"] += 1
+
+
+def _user_from_request(request: Request) -> str:
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    return token.removeprefix(TOKEN_PREFIX)
+
+
+def _event_time(value: dict) -> datetime.datetime:
+    moment = datetime.datetime.fromisoformat(value["dateTime"])
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=zoneinfo.ZoneInfo(value.get("timeZone", "UTC")))
+    return moment
+
+
+def _choose_action(prompt: str) -> dict:
+    """Picks the function call a real model would plausibly return for `prompt`."""
+    lowered = prompt.lower()
+    common = {"title": "Load test email", "summary": "Synthetic email generated by the load test.",
+              "priority": "Medium"}
+    if "newsletter" in lowered:
+        return {"name": "no_action_required", "args": {**common, "priority": "Low", "confirmation": True}}
+    if "meeting" in lowered:
+        return {"name": "schedule_meeting", "args": {
+            **common, "date": time.strftime("%Y-%m-%d", time.localtime(time.time() + 86400)),
+            "time": "14:00", "duration_minutes": 30, "attendees": ["sender@example.com"],
+            "confirmation_title": "Meeting confirmed",
+            "confirmation_body": "The meeting is booked. Join here: [MEETING_LINK]"}}
+    return {"name": "generate_reply", "args": {**common, "reply_body": "Thanks, noted."}}
+
+
+def create_app(faults: Optional[FaultConfig] = None) -> FastAPI:
+    faults = faults or FaultConfig()
+    mailbox = FakeMailbox()
+    app = FastAPI(title="TaskPilot fake Google services")
+    app.state.mailbox = mailbox
+    subscriptions: Dict[str, FakeSubscription] = defaultdict(FakeSubscription)
+    app.state.subscriptions = subscriptions
+    message_ids = itertools.count(1)
+
+    @app.post("/_fake/messages")
+    async def inject_message(request: Request):
+        data = await request.json()
+        message = mailbox.inject(data["user"], data.get("sender", "Sender <sender@example.com>"),
+                                 data.get("subject", "Hello"), data.get("body", ""), data.get("priority"),
+                                 data.get("age_seconds", 0), data.get("unread", True))
+        return {"id": message["id"]}
+
+    @app.get("/_fake/stats")
+    async def stats():
+        return {
+            "unread": sum(1 for box in mailbox.messages.values()
+                          for message in box.values() if "UNREAD" in message["labelIds"]),
+            "sent": len(mailbox.sent),
+            "events": len(mailbox.events),
+            **{f"pubsub_{key}": sum(subscription.stats[key] for subscription in subscriptions.values())
+               for key in FakeSubscription().stats},
+        }
+
+    # --- OAuth -------------------------------------------------------------
+
+    @app.post("/token")
+    async def token(request: Request):
+        if error := await faults.apply("oauth"):
+            return error
+        # Parsed by hand: request.form() needs python-multipart, which the app does not use.
+        form = {key: values[0] for key, values in urllib.parse.parse_qs((await request.body()).decode()).items()}
+        subject = form.get("code") or form.get("refresh_token") or uuid.uuid4().hex
+        return {"access_token": f"{TOKEN_PREFIX}{subject}", "expires_in": 3600,
+                "token_type": "Bearer", "refresh_token": form.get("refresh_token") or "fake-refresh",
+                "id_token": "fake-id-token", "scope": form.get("scope", "")}
+
+    @app.get("/oauth2/v3/userinfo")
+    async def userinfo(request: Request):
+        if error := await faults.apply("oauth"):
+            return error
+        email = _user_from_request(request)
+        return {"email": email, "name": email.split("@")[0], "given_name": email.split("@")[0],
+                "family_name": "Load", "picture": None}
+
+    # --- Gmail -------------------------------------------------------------
+
+    @app.post("/gmail/v1/users/{user_id}/watch")
+    async def watch(user_id: str, request: Request):
+        if error := await faults.apply("gmail"):
+            return error
+        return {"historyId": str(int(time.time())), "expiration": str(int((time.time() + 7 * 86400) * 1000))}
+
+    @app.get("/gmail/v1/users/{user_id}/messages")
+    async def list_messages(user_id: str, request: Request, q: str = "", maxResults: int = 100,
+                            pageToken: str = ""):
+        if error := await faults.apply("gmail"):
+            return error
+        box = mailbox.messages[_user_from_request(request)]
+        after, before = re.search(r"after:(\d+)", q), re.search(r"before:(\d+)", q)
+        messages = [m for m in box.values()
+                    if ("is:unread" not in q or "UNREAD" in m["labelIds"])
+                    and (not after or int(m["internalDate"]) >= int(after.group(1)) * 1000)
+                    and (not before or int(m["internalDate"]) < int(before.group(1)) * 1000)]
+        messages.sort(key=lambda m: int(m["internalDate"]), reverse=True)
+        start = int(pageToken or 0)
+        page = {"messages": [{"id": m["id"], "threadId": m["threadId"]} for m in messages[start:start + maxResults]],
+                "resultSizeEstimate": len(messages)}
+        if start + maxResults < len(messages):
+            page["nextPageToken"] = str(start + maxResults)
+        return page
+
+    @app.get("/gmail/v1/users/{user_id}/messages/{message_id}")
+    async def get_message(user_id: str, message_id: str, request: Request):
+        if error := await faults.apply("gmail"):
+            return error
+        message = mailbox.messages[_user_from_request(request)].get(message_id)
+        if not message:
+            return _google_error(404, "Requested entity was not found.", "NOT_FOUND", "notFound")
+        return message
+
+    @app.post("/batch/gmail/v1")
+    async def batch(request: Request):
+        """Answers a multipart/mixed batch of message GETs, applying faults to each part."""
+        body = await request.body()
+        parsed = email.message_from_bytes(
+            b"Content-Type: " + request.headers["content-type"].encode() + b"\r\n\r\n" + body)
+        user = _user_from_request(request)
+        boundary = uuid.uuid4().hex
+        parts = []
+        for part in parsed.get_payload():
+            inner = part.get_payload()
+            request_line, _, rest = inner.partition("\n")
+            authorization = re.search(r"(?im)^authorization:\s*(.+?)\s*$", rest)
+            if authorization:
+                user = authorization.group(1).removeprefix("Bearer ").strip().removeprefix(TOKEN_PREFIX)
+            path = request_line.split()[1].split("?")[0]
+            error = await faults.apply("gmail")
+            message = mailbox.messages[user].get(path.rsplit("/", 1)[-1])
+            if error:
+                status, content = error.status_code, error.body.decode()
+            elif message is None:
+                status, content = 404, _google_error(404, "Requested entity was not found.", "NOT_FOUND",
+                                                     "notFound").body.decode()
+            else:
+                status, content = 200, json.dumps(message)
+            content_id = part["Content-ID"].strip("<>")
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                         f"Content-ID: <response-{content_id}>\r\n\r\n"
+                         f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                         f"Content-Type: application/json; charset=UTF-8\r\n\r\n{content}\r\n")
+        return Response("".join(parts) + f"--{boundary}--\r\n", media_type=f"multipart/mixed; boundary={boundary}")
+
+    @app.post("/gmail/v1/users/{user_id}/messages/{message_id}/modify")
+    async def modify_message(user_id: str, message_id: str, request: Request):
+        if error := await faults.apply("gmail"):
+            return error
+        body = await request.json()
+        message = mailbox.messages[_user_from_request(request)].get(message_id)
+        if not message:
+            return _google_error(404, "Requested entity was not found.", "NOT_FOUND", "notFound")
+        message["labelIds"] = [label for label in message["labelIds"]
+                               if label not in body.get("removeLabelIds", [])]
+        return message
+
+    @app.post("/gmail/v1/users/{user_id}/messages/send")
+    async def send_message(user_id: str, request: Request):
+        if error := await faults.apply("gmail"):
+            return error
+        body = await request.json()
+        sent = {"id": f"s{len(mailbox.sent):08x}", "threadId": body.get("threadId"),
+                "from": _user_from_request(request), "raw_bytes": len(body.get("raw", ""))}
+        mailbox.sent.append(sent)
+        return {"id": sent["id"], "threadId": sent["threadId"], "labelIds": ["SENT"]}
+
+    # --- Calendar ----------------------------------------------------------
+
+    @app.post("/calendar/v3/calendars/{calendar_id}/events")
+    async def insert_event(calendar_id: str, request: Request):
+        if error := await faults.apply("calendar"):
+            return error
+        event = await request.json()
+        event["id"] = uuid.uuid4().hex
+        event["hangoutLink"] = f"https://meet.google.com/fake-{event['id'][:10]}"
+        event["owner"] = _user_from_request(request)
+        mailbox.events.append(event)
+        return event
+
+    @app.get("/calendar/v3/users/me/settings/{setting}")
+    async def get_setting(setting: str):
+        if error := await faults.apply("calendar"):
+            return error
+        values = {"timezone": "Africa/Addis_Ababa"}
+        if setting not in values:
+            return _google_error(404, "Not Found", "NOT_FOUND", "notFound")
+        return {"kind": "calendar#setting", "id": setting, "value": values[setting]}
+
+    @app.post("/calendar/v3/freeBusy")
+    async def free_busy(request: Request):
+        if error := await faults.apply("calendar"):
+            return error
+        body = await request.json()
+        user = _user_from_request(request)
+        time_min = datetime.datetime.fromisoformat(body["timeMin"])
+        time_max = datetime.datetime.fromisoformat(body["timeMax"])
+        busy = []
+        for event in mailbox.events:
+            if event.get("owner") != user:
+                continue
+            start, end = (_event_time(event[key]) for key in ("start", "end"))
+            if start < time_max and end > time_min:
+                busy.append({"start": start.isoformat(), "end": end.isoformat()})
+        return {"kind": "calendar#freeBusy", "timeMin": body["timeMin"], "timeMax": body["timeMax"],
+                "calendars": {item["id"]: {"busy": busy} for item in body.get("items", [])}}
+
+    # --- Gemini ------------------------------------------------------------
+
+    @app.post("/{api_version}/models/{model}:generateContent")
+    async def generate_content(api_version: str, model: str, request: Request):
+        if error := await faults.apply("gemini"):
+            return error
+        body = await request.json()
+        prompt = " ".join(part.get("text", "") for content in body.get("contents", [])
+                          for part in content.get("parts", []))
+        prompt_tokens = max(1, len(prompt) // 4)
+        if body.get("generationConfig", {}).get("responseMimeType") == "application/json":
+            # The batch summary call: one object per "### Email N" section.
+            items = [{"index": int(index), "title": "Backfilled email", "summary": "Synthetic summary.",
+                      "priority": "Low"} for index in re.findall(r"### Email (\d+)", prompt)]
+            part = {"text": json.dumps(items)}
+        elif faults.random.random() < faults.malformed_rate.get(model, 0):
+            part = {"text": "This email looks like it needs a reply."}
+        else:
+            part = {"functionCall": _choose_action(prompt)}
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [part]},
+                "finishReason": "STOP",
+            }],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": 40,
+                              "totalTokenCount": prompt_tokens + 40},
+            "modelVersion": model,
+        }
+
+    # --- Pub/Sub -----------------------------------------------------------
+
+    @app.post("/v1/projects/{project}/topics/{topic}:publish")
+    async def publish(project: str, topic: str, request: Request):
+        if error := await faults.apply("pubsub"):
+            return error
+        ids = []
+        for message in (await request.json()).get("messages", []):
+            message_id = str(next(message_ids))
+            subscriptions[topic].publish({**message, "messageId": message_id, "publishTime": time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime())})
+            ids.append(message_id)
+        return {"messageIds": ids}
+
+    @app.post("/v1/projects/{project}/subscriptions/{subscription}:pull")
+    async def pull(project: str, subscription: str, request: Request):
+        """Long-polls for up to 2 seconds like the real endpoint, which holds empty pulls open."""
+        if error := await faults.apply("pubsub"):
+            return error
+        body = await request.json()
+        fake = subscriptions[subscription]
+        fake.stats["pull_requests"] += 1
+        deadline = time.monotonic() + 2.0
+        while True:
+            received = fake.take(int(body.get("maxMessages", 100)))
+            if received or time.monotonic() >= deadline:
+                return {"receivedMessages": received} if received else {}
+            await asyncio.sleep(0.02)
+
+    @app.post("/v1/projects/{project}/subscriptions/{subscription}:acknowledge")
+    async def acknowledge(project: str, subscription: str, request: Request):
+        if error := await faults.apply("pubsub"):
+            return error
+        fake = subscriptions[subscription]
+        fake.stats["ack_requests"] += 1
+        fake.acknowledge((await request.json()).get("ackIds", []))
+        return {}
+
+    @app.post("/v1/projects/{project}/subscriptions/{subscription}:modifyAckDeadline")
+    async def modify_ack_deadline(project: str, subscription: str, request: Request):
+        if error := await faults.apply("pubsub"):
+            return error
+        body = await request.json()
+        fake = subscriptions[subscription]
+        fake.stats["modack_requests"] += 1
+        fake.modify_ack_deadline(body.get("ackIds", []), float(body.get("ackDeadlineSeconds", 0)))
+        return {}
+
+    return app
+
+
+def parse_service_values(value: str) -> Dict[str, float]:
+    """Parses `gmail=20,gemini=300` into {"gmail": 20.0, "gemini": 300.0}; `*=5` applies to all."""
+    result: Dict[str, float] = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, number = item.partition("=")
+        names = SERVICES if name == "*" else (name,)
+        for service in names:
+            if service not in SERVICES:
+                raise argparse.ArgumentTypeError(f"Unknown service {service!r}")
+            result[service] = float(number)
+    return result
+
+
+def parse_model_values(value: str) -> Dict[str, float]:
+    """Parses `gemini-2.0-flash-lite=0.1` into {"gemini-2.0-flash-lite": 0.1}."""
+    return {name.strip(): float(number) for name, _, number in
+            (item.partition("=") for item in value.split(",") if item.strip())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=parse_service_values, default={},
+                        help="Fixed latency per service in ms, e.g. gmail=20,gemini=400")
+    parser.add_argument("--jitter", type=parse_service_values, default={},
+                        help="Uniform random extra latency per service in ms")
+    parser.add_argument("--error-rate", type=parse_service_values, default={},
+                        help="Fraction of requests answered with 429/500 per service")
+    parser.add_argument("--malformed-rate", type=parse_model_values, default={},
+                        help="Share of Gemini answers without a function call, by model, "
+                             "e.g. gemini-2.0-flash-lite=0.1")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    faults = FaultConfig(args.latency, args.jitter, args.error_rate, args.seed, args.malformed_rate)
+    uvicorn.run(create_app(faults), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Import-time profile of the application entry point.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and
+summarises the slowest packages and modules. It can also time a cold
+uvicorn start until the first successful request.
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --runs 5 --top 15 --first-request
+    python -m benchmarks.importtime --forbid google.genai,googleapiclient,dateparser
+
+--forbid exits non-zero if any listed module is imported eagerly by
+`import main`. This keeps the heavy client libraries lazy.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FORBIDDEN = "google.genai,googleapiclient,dateparser,google_auth_oauthlib"
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def scratch_env() -> Dict[str, str]:
+    scratch = tempfile.mkdtemp(prefix="taskpilot-importtime-")
+    return {
+        **os.environ,
+        "DATABASE_URL": os.getenv("DATABASE_URL", f"sqlite+aiosqlite:///{scratch}/importtime.db"),
+        "SECRET_KEY": os.getenv("SECRET_KEY", "importtime-secret-key-importtime-secret"),
+        "PYTHONPATH": ROOT,
+    }
+
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        module_field = parts[2]
+        depth = (len(module_field) - len(module_field.lstrip(" ")) - 1) // 2
+        records.append(ImportRecord(module_field.strip(), depth, int(parts[0]), int(parts[1])))
+    return records
+
+
+def profile_once(env: Dict[str, str], target: str) -> List[ImportRecord]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"import {target} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def eager_imports(env: Dict[str, str], target: str, modules: List[str]) -> List[str]:
+    code = (f"import sys, {target}; "
+            f"print(','.join(m for m in {modules!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    return [module for module in result.stdout.strip().split(",") if module]
+
+
+def time_to_first_request(env: Dict[str, str], port: int, path: str, timeout: float) -> float:
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                "--log-level", "warning"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+        raise RuntimeError(f"No response from {path} within {timeout:.0f}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN,
+                        help="Comma separated modules that must not be imported eagerly ('' to skip)")
+    parser.add_argument("--first-request", action="store_true",
+                        help="Also time a cold uvicorn start until the first 200 response")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--path", default="/metrics")
+    args = parser.parse_args()
+
+    env = scratch_env()
+    runs = [profile_once(env, args.target) for _ in range(args.runs)]
+    totals = [next(r.cumulative_us for r in records if r.module == args.target and r.depth == 0)
+              for records in runs]
+    records = runs[-1]
+
+    print(f"import {args.target}: median {statistics.median(totals) / 1000:.1f} ms "
+          f"over {args.runs} runs (min {min(totals) / 1000:.1f} ms, max {max(totals) / 1000:.1f} ms)")
+
+    packages: Dict[str, int] = {}
+    for record in records:
+        if record.depth <= 1 and record.module != args.target:
+            top_level = record.module.split(".")[0]
+            packages[top_level] = packages.get(top_level, 0) + record.cumulative_us
+    print(f"\nTop {args.top} top-level packages by cumulative time:")
+    for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:9.1f} ms  {name}")
+
+    print(f"\nTop {args.top} modules by self time:")
+    for record in sorted(records, key=lambda r: -r.self_us)[:args.top]:
+        print(f"  {record.self_us / 1000:9.1f} ms  {record.module}")
+
+    exit_code = 0
+    forbidden = [module for module in args.forbid.split(",") if module]
+    if forbidden:
+        eager = eager_imports(env, args.target, forbidden)
+        if eager:
+            print(f"\nFAIL: imported eagerly by {args.target}: {', '.join(eager)}", file=sys.stderr)
+            exit_code = 1
+        else:
+            print(f"\nLazy as expected: {', '.join(forbidden)}")
+
+    if args.first_request:
+        elapsed = time_to_first_request(env, args.port, args.path, timeout=60)
+        print(f"\nTime to first request ({args.path}): {elapsed * 1000:.0f} ms")
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+End-to-end load test for the notification pipeline, runnable offline.
+
+Starts the fake Google services (benchmarks.fakes) and the TaskPilot app in
+subprocesses against a scratch SQLite database, seeds users, then posts
+Pub/Sub-shaped payloads to /email-notification at a fixed rate (or, with
+--ingest pull, publishes them to the fake Pub/Sub the app pulls from). Each
+notification carries a unique historyId, and it counts as complete once the
+matching row shows up in the `emails` table.
+
+    python -m benchmarks.loadtest --rate 20 --duration 30 --users 50 \\
+        --latency gmail=15,calendar=40,gemini=350 --max-p95-ms 5000
+
+Reports throughput, p50/p95/p99 request and end-to-end latency, the app's
+event-loop lag and stalls, database growth and selected gauges scraped from
+/metrics, as text or --json. The exit status is non-zero when a --max-*
+threshold is exceeded.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PULL_TOPIC = "gmail-notifications"
+
+EMAIL_BODIES = {
+    "reply": "Hi, could you send me the latest status report on the project? Thanks.",
+    "meeting": "Can we set up a meeting tomorrow at 14:00 for 30 minutes to review the plan?",
+    "newsletter": "This week's newsletter: product updates, tips and upcoming events.",
+}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": max(values) if values else None,
+    }
+
+
+def database_stats(path: str) -> Dict[str, int]:
+    stats = {"file_bytes": 0}
+    if not os.path.exists(path):
+        return stats
+    stats["file_bytes"] = os.path.getsize(path) + sum(
+        os.path.getsize(path + suffix) for suffix in ("-wal", "-journal") if os.path.exists(path + suffix))
+    with sqlite3.connect(path) as conn:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+        for table in tables:
+            stats[f"rows.{table}"] = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    return stats
+
+
+def pubsub_payload(user_email: str, history_id: str, sequence: int) -> dict:
+    data = json.dumps({"emailAddress": user_email, "historyId": history_id}).encode("utf-8")
+    return {
+        "message": {
+            "data": base64.b64encode(data).decode("ascii"),
+            "messageId": str(sequence),
+            "publishTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "subscription": "projects/loadtest/subscriptions/gmail-notifications",
+    }
+
+
+def pubsub_message(user_email: str, history_id: str) -> dict:
+    data = json.dumps({"emailAddress": user_email, "historyId": history_id}).encode("utf-8")
+    return {"messages": [{"data": base64.b64encode(data).decode("ascii")}]}
+
+
+async def seed_users(database_url: str, count: int, fake_url: str) -> List[str]:
+    from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
+                                        create_async_engine)
+
+    from adapters.outbound.model import Base
+    from adapters.outbound.repository import SQLAlchemyUserRepository
+    from benchmarks.fakes import TOKEN_PREFIX
+    from core.domain.entity import User
+
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    emails = [f"user{index:05d}@loadtest.local" for index in range(count)]
+    async with session_factory() as session:
+        repository = SQLAlchemyUserRepository(session)
+        for email in emails:
+            await repository.add_user(User(
+                email=email, access_token=f"{TOKEN_PREFIX}{email}", refresh_token="fake-refresh",
+                token_uri=f"{fake_url}/token", id_token="fake-id-token", name=email.split("@")[0]))
+    await engine.dispose()
+    return emails
+
+
+async def wait_until_ready(client: httpx.AsyncClient, url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url)).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+async def fetch_metrics(client: httpx.AsyncClient, app_url: str) -> str:
+    try:
+        return (await client.get(f"{app_url}/metrics")).text
+    except httpx.TransportError:
+        return ""
+
+
+def scrape_metrics(text: str, prefixes: List[str]) -> Dict[str, float]:
+    result = {}
+    for line in text.splitlines():
+        if line.startswith("#") or not any(line.startswith(prefix) for prefix in prefixes):
+            continue
+        name, _, value = line.rpartition(" ")
+        result[name] = float(value)
+    return result
+
+
+def histogram_summary(text: str, name: str) -> Dict[str, Optional[float]]:
+    """
+    Count and p50/p99/max in ms of an unlabelled histogram on /metrics. A
+    quantile is the upper bound of the bucket it falls in.
+    """
+    buckets = []
+    for line in text.splitlines():
+        if line.startswith(f"{name}_bucket{{"):
+            labels, _, value = line.rpartition(" ")
+            buckets.append((float(labels.split('le="')[1].split('"')[0]), float(value)))
+    count = buckets[-1][1] if buckets else 0
+
+    def quantile(fraction: float) -> Optional[float]:
+        if not count:
+            return None
+        bound = next(bound for bound, cumulative in buckets if cumulative >= fraction * count)
+        return bound * 1000
+
+    return {"count": int(count), "p50_ms": quantile(0.5), "p99_ms": quantile(0.99), "max_ms": quantile(1.0)}
+
+
+class CompletionWatcher:
+    """Polls the SQLite database for email rows whose history_id is pending."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.pending: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self._last_id = 0
+
+    def poll(self) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT id, history_id FROM emails WHERE id > ? ORDER BY id",
+                                (self._last_id,)).fetchall()
+        now = time.perf_counter()
+        for row_id, history_id in rows:
+            self._last_id = max(self._last_id, row_id)
+            started = self.pending.pop(str(history_id), None)
+            if started is not None:
+                self.latencies.append((now - started) * 1000)
+
+    async def run(self, stop: asyncio.Event, interval: float = 0.05) -> None:
+        while not stop.is_set():
+            self.poll()
+            await asyncio.sleep(interval)
+
+
+async def run_load(args, users: List[str], app_url: str, fake_url: str, db_path: str) -> dict:
+    rng = random.Random(args.seed)
+    weights = {"reply": args.mix_reply, "meeting": args.mix_meeting, "newsletter": args.mix_newsletter}
+    kinds, kind_weights = zip(*weights.items())
+    watcher = CompletionWatcher(db_path)
+    request_latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=args.max_connections)
+
+    async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+        await wait_until_ready(client, f"{fake_url}/_fake/stats")
+        await wait_until_ready(client, f"{app_url}/metrics")
+        fake_before = (await client.get(f"{fake_url}/_fake/stats")).json()
+
+        async def fire(sequence: int) -> None:
+            user = users[sequence % len(users)]
+            history_id = str(10_000_000 + sequence)
+            kind = rng.choices(kinds, kind_weights)[0]
+            await client.post(f"{fake_url}/_fake/messages", json={
+                "user": user, "subject": f"Load test {kind}", "body": EMAIL_BODIES[kind]})
+            started = time.perf_counter()
+            watcher.pending[history_id] = started
+            try:
+                if args.ingest == "pull":
+                    response = await client.post(f"{fake_url}/v1/projects/loadtest/topics/{PULL_TOPIC}:publish",
+                                                 json=pubsub_message(user, history_id))
+                else:
+                    response = await client.post(f"{app_url}/email-notification",
+                                                 json=pubsub_payload(user, history_id, sequence))
+                key = str(response.status_code)
+                if response.status_code == 200 and "error" in response.json():
+                    key = "200-error"
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+            request_latencies.append((time.perf_counter() - started) * 1000)
+            statuses[key] = statuses.get(key, 0) + 1
+
+        stop = asyncio.Event()
+        watcher_task = asyncio.create_task(watcher.run(stop))
+        total = int(args.rate * args.duration)
+        tasks = []
+        load_started = time.perf_counter()
+        for sequence in range(total):
+            delay = load_started + sequence / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(sequence)))
+        send_elapsed = time.perf_counter() - load_started
+        await asyncio.gather(*tasks)
+
+        drain_deadline = time.perf_counter() + args.drain_timeout
+        while watcher.pending and time.perf_counter() < drain_deadline:
+            await asyncio.sleep(0.1)
+        stop.set()
+        await watcher_task
+        watcher.poll()
+        elapsed = time.perf_counter() - load_started
+
+        fake_after = (await client.get(f"{fake_url}/_fake/stats")).json()
+        metrics_text = await fetch_metrics(client, app_url)
+        gauges = scrape_metrics(metrics_text, args.metric_prefix)
+
+    completed = len(watcher.latencies)
+    return {
+        "offered_rate": args.rate,
+        "achieved_send_rate": round(total / send_elapsed, 2) if send_elapsed else None,
+        "sent": total,
+        "completed": completed,
+        "incomplete": len(watcher.pending),
+        "throughput_per_s": round(completed / elapsed, 2) if elapsed else None,
+        "elapsed_s": round(elapsed, 2),
+        "http_status": statuses,
+        "request_latency": summarize(request_latencies),
+        "end_to_end_latency": summarize(watcher.latencies),
+        "fake_google": {key: fake_after[key] - fake_before.get(key, 0) for key in fake_after},
+        "metrics": gauges,
+        "event_loop_lag": histogram_summary(metrics_text, "taskpilot_event_loop_lag_seconds"),
+        "event_loop_stalls": histogram_summary(metrics_text, "taskpilot_event_loop_stall_seconds"),
+    }
+
+
+def start_process(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL if not os.getenv("LOADTEST_VERBOSE") else None,
+                            stderr=subprocess.STDOUT if not os.getenv("LOADTEST_VERBOSE") else None)
+
+
+def print_report(report: dict) -> None:
+    print(f"sent={report['sent']} completed={report['completed']} incomplete={report['incomplete']} "
+          f"elapsed={report['elapsed_s']}s throughput={report['throughput_per_s']}/s")
+    print(f"http status: {report['http_status']}")
+    for key in ("request_latency", "end_to_end_latency", "event_loop_lag", "event_loop_stalls"):
+        stats = report[key]
+        print(f"{key:>20}: " + "  ".join(
+            f"{name}={value:.1f}" if isinstance(value, float) else f"{name}={value}"
+            for name, value in stats.items()))
+    growth = report["database_growth"]
+    print("database growth: " + ", ".join(f"{name}=+{value}" for name, value in growth.items()))
+    print(f"fake google calls: {report['fake_google']}")
+    for name, value in report["metrics"].items():
+        print(f"  {name} {value:g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=10.0, help="Notifications per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mix-reply", type=float, default=0.5)
+    parser.add_argument("--mix-meeting", type=float, default=0.2)
+    parser.add_argument("--mix-newsletter", type=float, default=0.3)
+    parser.add_argument("--latency", default="", help="Fake service latency in ms, e.g. gmail=20,gemini=400")
+    parser.add_argument("--jitter", default="", help="Fake service jitter in ms")
+    parser.add_argument("--error-rate", default="", help="Fake service error rate, e.g. gemini=0.02")
+    parser.add_argument("--app-port", type=int, default=8200)
+    parser.add_argument("--fake-port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--ingest", choices=("push", "pull"), default="push",
+                        help="Post notifications to the app, or publish them for the app to pull")
+    parser.add_argument("--db", default=None, help="SQLite file to use (default: fresh temp file)")
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--max-connections", type=int, default=500)
+    parser.add_argument("--metric-prefix", action="append",
+                        default=["taskpilot_queue_depth", "taskpilot_notifications_in_flight",
+                                 "taskpilot_pull_"])
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Fail if end-to-end p95 exceeds this")
+    parser.add_argument("--min-completion", type=float, default=None,
+                        help="Fail if fewer than this fraction of notifications complete")
+    parser.add_argument("--max-loop-lag-p99-ms", type=float, default=None,
+                        help="Fail if the app's p99 event-loop lag exceeds this")
+    parser.add_argument("--max-loop-stalls", type=int, default=None,
+                        help="Fail if more callbacks than this block the app's event loop past its stall threshold")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="taskpilot-load-"), "load.db")
+    database_url = f"sqlite+aiosqlite:///{db_path}"
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "GMAIL_API_ENDPOINT": fake_url,
+        "CALENDAR_API_ENDPOINT": f"{fake_url}/calendar/v3/",
+        "GEMINI_BASE_URL": fake_url,
+        "GEMINI_API_KEY": "fake-gemini-key",
+        "GOOGLE_CLIENT_ID": os.getenv("GOOGLE_CLIENT_ID", "fake-client-id"),
+        "GOOGLE_CLIENT_SECRET": os.getenv("GOOGLE_CLIENT_SECRET", "fake-client-secret"),
+        "SECRET_KEY": os.getenv("SECRET_KEY", "load-test-secret-key-load-test-secret"),
+        "PYTHONPATH": ROOT,
+    }
+    if args.ingest == "pull":
+        env.update(INGESTION_MODE="pull", PUBSUB_EMULATOR_HOST=f"127.0.0.1:{args.fake_port}",
+                   PUBSUB_SUBSCRIPTION=PULL_TOPIC)
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+
+    users = asyncio.run(seed_users(database_url, args.users, fake_url))
+    db_before = database_stats(db_path)
+
+    fake_args = ["-m", "benchmarks.fakes", "--port", str(args.fake_port), "--seed", str(args.seed)]
+    for flag, value in (("--latency", args.latency), ("--jitter", args.jitter), ("--error-rate", args.error_rate)):
+        if value:
+            fake_args += [flag, value]
+    processes = [
+        start_process(fake_args, env),
+        start_process(["-m", "uvicorn", "main:app", "--port", str(args.app_port),
+                       "--workers", str(args.workers), "--log-level", "warning"], env),
+    ]
+    try:
+        report = asyncio.run(run_load(args, users, app_url, fake_url, db_path))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    db_after = database_stats(db_path)
+    report["database"] = db_after
+    report["database_growth"] = {key: value - db_before.get(key, 0) for key, value in db_after.items()}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    failures = []
+    p95 = report["end_to_end_latency"]["p95_ms"]
+    if args.max_p95_ms is not None and (p95 is None or p95 > args.max_p95_ms):
+        failures.append(f"end-to-end p95 {p95} ms exceeds {args.max_p95_ms} ms")
+    if args.min_completion is not None and report["completed"] < args.min_completion * report["sent"]:
+        failures.append(f"only {report['completed']}/{report['sent']} notifications completed")
+    lag_p99 = report["event_loop_lag"]["p99_ms"]
+    if args.max_loop_lag_p99_ms is not None and (lag_p99 is None or lag_p99 > args.max_loop_lag_p99_ms):
+        failures.append(f"event-loop lag p99 {lag_p99} ms exceeds {args.max_loop_lag_p99_ms} ms")
+    stalls = report["event_loop_stalls"]["count"]
+    if args.max_loop_stalls is not None and stalls > args.max_loop_stalls:
+        failures.append(f"{stalls} event-loop stalls exceed {args.max_loop_stalls}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Micro-benchmarks for IUserRepositoryPort implementations.
+
+Seeds each backend with N email rows spread over --users receivers, then
+times the per-call cost of add_user, get_user_by_email, update_user,
+set_email_history, get_emails and get_latest_email_by_date. The SQLAlchemy
+adapter gets a fresh session per call, the same way get_email_service does
+per request.
+
+    python -m benchmarks.repository_bench                          # memory + sqlite, 1k/100k/1M rows
+    python -m benchmarks.repository_bench --sizes 1000 --check     # compare with the stored baseline
+    python -m benchmarks.repository_bench --mysql-url mysql+asyncmy://root:pw@127.0.0.1/bench
+
+MySQL runs only when --mysql-url (or BENCH_MYSQL_URL) points at a server,
+for example a throwaway MySQL/MariaDB container. --save-baseline records
+p50 timings in benchmarks/baselines/repository.json. --check then exits
+non-zero when an operation's p50 is more than --tolerance slower than the
+baseline. Baselines are machine-specific; regenerate them on the CI runner.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from adapters.outbound.memory_repository import InMemoryUserRepository  # noqa: E402
+from core.domain.entity import Email, User  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "repository.json")
+OPERATIONS = ("add_user", "get_user_by_email", "update_user", "set_email_history",
+              "get_emails", "get_latest_email_by_date")
+SEED_CHUNK = 10_000
+EPOCH = datetime.date(2020, 1, 1)
+
+
+def make_user(index: int) -> User:
+    email = f"bench{index:07d}@example.com"
+    return User(email=email, access_token="a" * 180, refresh_token="r" * 100,
+                token_uri="https://oauth2.googleapis.com/token", id_token="i" * 400,
+                name=f"Bench {index}", given_name="Bench", family_name=str(index))
+
+
+def make_email_row(index: int, user_count: int) -> dict:
+    receiver = index % user_count
+    return {
+        "user_id": receiver + 1,
+        "sender_email": f"sender{index % 997}@example.org",
+        "sender_name": f"Sender {index % 997}",
+        "receiver_email": f"bench{receiver:07d}@example.com",
+        "history_id": str(1_000_000 + index),
+        "date": EPOCH + datetime.timedelta(days=index // 500),
+        "title": f"Subject number {index}",
+        "summary": "Summary of the email content. " * 8,
+        "priority": ("High", "Medium", "Low")[index % 3],
+        "read": False,
+    }
+
+
+class Backend:
+    name = "base"
+
+    async def setup(self, rows: int, users: int) -> None:
+        raise NotImplementedError
+
+    def repository(self):
+        raise NotImplementedError
+
+    async def call(self, operation: Callable[[object], Awaitable]) -> None:
+        await operation(self.repository())
+
+    async def teardown(self) -> None:
+        pass
+
+
+class MemoryBackend(Backend):
+    name = "memory"
+
+    async def setup(self, rows: int, users: int) -> None:
+        self._repository = InMemoryUserRepository()
+        for index in range(users):
+            await self._repository.add_user(make_user(index))
+        for index in range(rows):
+            await self._repository.set_email_history(Email(**make_email_row(index, users)))
+
+    def repository(self):
+        return self._repository
+
+
+class SQLAlchemyBackend(Backend):
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+
+    async def setup(self, rows: int, users: int) -> None:
+        from sqlalchemy import insert
+        from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
+                                            create_async_engine)
+
+        from adapters.outbound.model import Base, EmailModel, UserModel
+        from adapters.outbound.search import get_search_index
+        from config import SEARCH_BACKEND
+
+        self.engine = create_async_engine(self.url)
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [
+                {**make_user(index).model_dump(exclude={"id"}), "id": index + 1} for index in range(users)])
+            for start in range(0, rows, SEED_CHUNK):
+                await conn.execute(insert(EmailModel), [
+                    make_email_row(index, users) for index in range(start, min(rows, start + SEED_CHUNK))])
+            # The same index the repository writes to and init_db sets up; built over the seeded rows.
+            await get_search_index(self.engine.dialect.name, SEARCH_BACKEND).setup(conn)
+
+    async def call(self, operation: Callable[[object], Awaitable]) -> None:
+        from adapters.outbound.repository import SQLAlchemyUserRepository
+
+        async with self.session_factory() as session:
+            await operation(SQLAlchemyUserRepository(session))
+
+    async def teardown(self) -> None:
+        await self.engine.dispose()
+
+
+def build_operations(users: int, rows: int) -> Dict[str, Callable[[int], Callable[[object], Awaitable]]]:
+    """Maps operation name to a factory producing the i-th call."""
+    def add_user(i):
+        return lambda repo: repo.add_user(make_user(users + 1_000_000 + i))
+
+    def get_user_by_email(i):
+        return lambda repo: repo.get_user_by_email(make_user(i % users).email)
+
+    def update_user(i):
+        return lambda repo: repo.update_user(i % users + 1, User(
+            **{**make_user(i % users).model_dump(exclude={"id"}), "access_token": f"refreshed-{i}"}))
+
+    def set_email_history(i):
+        return lambda repo: repo.set_email_history(Email(**make_email_row(rows + i, users)))
+
+    def get_emails(i):
+        return lambda repo: repo.get_emails(make_user(i % users).email, 0, 10)
+
+    def get_latest_email_by_date(i):
+        return lambda repo: repo.get_latest_email_by_date(make_user(i % users).email)
+
+    return {
+        "add_user": add_user,
+        "get_user_by_email": get_user_by_email,
+        "update_user": update_user,
+        "set_email_history": set_email_history,
+        "get_emails": get_emails,
+        "get_latest_email_by_date": get_latest_email_by_date,
+    }
+
+
+async def measure(backend: Backend, factory, iterations: int, warmup: int) -> Dict[str, float]:
+    for i in range(warmup):
+        await backend.call(factory(i))
+    samples: List[float] = []
+    for i in range(warmup, warmup + iterations):
+        call = factory(i)
+        start = time.perf_counter()
+        await backend.call(call)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": round(statistics.fmean(samples), 1),
+        "p50_us": round(samples[len(samples) // 2], 1),
+        "p95_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+    }
+
+
+async def run(args) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    scratch = tempfile.mkdtemp(prefix="taskpilot-repo-bench-")
+    for rows in args.sizes:
+        backends: List[Backend] = []
+        if "memory" in args.backends:
+            backends.append(MemoryBackend())
+        if "sqlite" in args.backends:
+            backends.append(SQLAlchemyBackend(
+                "sqlite", f"sqlite+aiosqlite:///{os.path.join(scratch, f'bench-{rows}.db')}"))
+        if args.mysql_url:
+            backends.append(SQLAlchemyBackend("mysql", args.mysql_url))
+
+        for backend in backends:
+            seed_start = time.perf_counter()
+            await backend.setup(rows, args.users)
+            print(f"[{backend.name} rows={rows}] seeded in {time.perf_counter() - seed_start:.1f}s",
+                  file=sys.stderr)
+            operations = build_operations(args.users, rows)
+            for name in OPERATIONS:
+                stats = await measure(backend, operations[name], args.iterations, args.warmup)
+                results[f"{backend.name}/{rows}/{name}"] = stats
+                print(f"{backend.name:>7} {rows:>8} {name:<26} "
+                      f"mean={stats['mean_us']:>10.1f}us p50={stats['p50_us']:>10.1f}us "
+                      f"p95={stats['p95_us']:>10.1f}us")
+            await backend.teardown()
+    return results
+
+
+def compare(results, baseline, tolerance: float, floor_us: float) -> List[str]:
+    regressions = []
+    for key, stats in results.items():
+        reference = baseline.get(key)
+        if not reference:
+            continue
+        limit = max(reference["p50_us"] * (1 + tolerance), reference["p50_us"] + floor_us)
+        if stats["p50_us"] > limit:
+            regressions.append(f"{key}: p50 {stats['p50_us']}us > {limit:.1f}us "
+                               f"(baseline {reference['p50_us']}us)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda v: [int(x) for x in v.split(",")],
+                        default=[1_000, 100_000, 1_000_000], help="Comma separated email row counts")
+    parser.add_argument("--backends", type=lambda v: v.split(","), default=["memory", "sqlite"])
+    parser.add_argument("--mysql-url", default=os.getenv("BENCH_MYSQL_URL"))
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="Fail on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.30, help="Allowed relative p50 slowdown")
+    parser.add_argument("--floor-us", type=float, default=50.0,
+                        help="Ignore regressions smaller than this many microseconds")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline at {args.baseline}; run with --save-baseline first")
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance, args.floor_us)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of GET /emails response building at several page sizes.
+
+Seeds a throwaway SQLite database with one user's emails, then calls the
+real /emails route and a copy of the previous implementation (ORM objects,
+to_domain(), response_model validation and JSONResponse) through the ASGI
+app in-process, so both include routing, auth and the database query. Each
+page size is requested --iterations times per path, and the two bodies are
+checked to decode to the same JSON.
+
+    python -m benchmarks.serialization_bench
+    python -m benchmarks.serialization_bench --pages 10,100,500 --iterations 300
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DB_DIR = tempfile.mkdtemp(prefix="serialization_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(DB_DIR, 'bench.db')}"
+os.environ.setdefault("SECRET_KEY", "serialization-bench")
+
+import httpx  # noqa: E402
+from fastapi import APIRouter, Depends, FastAPI, Query  # noqa: E402
+
+from adapters.inbound.api import create_access_token, get_current_user  # noqa: E402
+from adapters.outbound.repository import SQLAlchemyUserRepository  # noqa: E402
+from core.application.ports.inbound import IEmailServicePort  # noqa: E402
+from core.domain.entity import Email, User, UserInfo  # noqa: E402
+from dependencies import (AsyncSessionLocal, engine,  # noqa: E402
+                          get_email_service, get_router, init_db)
+
+USER = User(email="bench@example.com", access_token="a", refresh_token="r",
+            token_uri="https://oauth2.googleapis.com/token", id_token="i")
+
+legacy_router = APIRouter()
+
+
+@legacy_router.get("/legacy/emails", response_model=List[Email])
+async def legacy_emails(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=500),
+                        current_user: UserInfo = Depends(get_current_user),
+                        email_service: IEmailServicePort = Depends(get_email_service)):
+    return await email_service.get_emails(current_user.email, skip, limit)
+
+
+async def seed(count: int) -> None:
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        repository = SQLAlchemyUserRepository(session)
+        user = await repository.add_user(USER)
+        today = datetime.date.today()
+        for index in range(count):
+            await repository.set_email_history(Email(
+                user_id=user.id, sender_email=f"sender{index % 37}@example.org",
+                sender_name=f"Sender {index % 37}", receiver_email=USER.email,
+                history_id=str(10_000 + index), date=today - datetime.timedelta(days=index // 20),
+                title=f"Quarterly planning follow-up #{index}",
+                summary="The sender asks for comments on the draft budget and proposes a call next week. " * 2,
+                priority=("high", "medium", "low")[index % 3], read=index % 4 == 0))
+
+
+async def time_path(client: httpx.AsyncClient, path: str, limit: int, iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = await client.get(path, params={"limit": limit})
+        samples.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return samples
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="10,50,100,250,500")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    pages = [int(page) for page in args.pages.split(",")]
+
+    engine.echo = False
+    await seed(max(pages))
+    app = FastAPI()
+    app.include_router(get_router())
+    app.include_router(legacy_router)
+    headers = {"Authorization": f"Bearer {create_access_token(USER)}"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 headers=headers) as client:
+        print(f"{'page':>5}  {'previous p50':>13}  {'lean p50':>10}  {'speedup':>7}")
+        for limit in pages:
+            lean_body = (await client.get("/emails", params={"limit": limit})).json()
+            legacy_body = (await client.get("/legacy/emails", params={"limit": limit})).json()
+            if lean_body != legacy_body:
+                raise SystemExit(f"/emails and the previous path disagree at limit={limit}")
+            legacy = statistics.median(await time_path(client, "/legacy/emails", limit, args.iterations))
+            lean = statistics.median(await time_path(client, "/emails", limit, args.iterations))
+            print(f"{limit:>5}  {legacy * 1e3:>10.2f} ms  {lean * 1e3:>7.2f} ms  {legacy / lean:>6.2f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,6 +4,7 @@ GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -21,10 +22,189 @@ SCOPES = SCOPES = [
 ]
 PROJECT_ID = "astral-field-448905-v3"
 AUTH_URI = "https://accounts.google.com/o/oauth2/auth"
-TOKEN_URI = "https://oauth2.googleapis.com/token"
+TOKEN_URI = os.getenv("GOOGLE_TOKEN_URI", "https://oauth2.googleapis.com/token")
+USERINFO_URI = os.getenv("GOOGLE_USERINFO_URI", "https://www.googleapis.com/oauth2/v3/userinfo")
 AUTH_PROVIDER_X509_CERT_URL = "https://www.googleapis.com/oauth2/v1/certs"
 TOPIC_NAME = "gmail-notifications"
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+# Event-loop watchdog: measures loop lag every LOOP_WATCHDOG_INTERVAL_MS and
+# logs the stack of any callback that blocks the loop for longer than
+# LOOP_STALL_THRESHOLD_MS, keeping the last LOOP_STALL_BUFFER_SIZE for
+# /admin/loop-stalls and appending them to LOOP_STALL_EXPORT_PATH if set.
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "true").lower() == "true"
+LOOP_WATCHDOG_INTERVAL_MS = float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "20"))
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "50"))
+LOOP_STALL_BUFFER_SIZE = int(os.getenv("LOOP_STALL_BUFFER_SIZE", "100"))
+LOOP_STALL_EXPORT_PATH = os.getenv("LOOP_STALL_EXPORT_PATH")
+
+# Sampling profiler for single requests and jobs. When enabled, a request is
+# profiled if it sends "X-Profile: 1" with a valid X-Admin-Token, or at random
+# with PROFILE_SAMPLE_RATE. Random sampling only applies to request paths or
+# job names starting with one of PROFILE_TARGETS (all when empty), e.g.
+# "/emails,process_emails". Profiles shorter than PROFILE_MIN_DURATION_MS are
+# dropped. The rest are written to PROFILE_DIR as folded stacks, deleting
+# the oldest past PROFILE_MAX_BYTES.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TARGETS = os.getenv("PROFILE_TARGETS", "")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MIN_DURATION_MS = float(os.getenv("PROFILE_MIN_DURATION_MS", "0"))
+PROFILE_MAX_BYTES = int(os.getenv("PROFILE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Overrides used to point the Google clients at local stand-ins (see benchmarks/).
+GMAIL_API_ENDPOINT = os.getenv("GMAIL_API_ENDPOINT")
+CALENDAR_API_ENDPOINT = os.getenv("CALENDAR_API_ENDPOINT")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+# Import the Google client libraries in a background thread once the app has started.
+PREWARM_CLIENTS = os.getenv("PREWARM_CLIENTS", "true").lower() == "true"
+
+# Singleton background work (watch registration and renewal, sweeps) runs only
+# in the worker holding the "scheduler" lease in the database.
+LEADER_ELECTION_ENABLED = os.getenv("LEADER_ELECTION_ENABLED", "true").lower() == "true"
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "30"))
+LEADER_HEARTBEAT_SECONDS = float(os.getenv("LEADER_HEARTBEAT_SECONDS", "10"))
+GMAIL_WATCH_RENEW_HOURS = float(os.getenv("GMAIL_WATCH_RENEW_HOURS", "24"))
+
+# Number of worker processes notifications are sharded across by user email.
+# 0 processes notifications inline in the request handler.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+
+# Meeting scheduling: DEFAULT_TIMEZONE is used when a user's Calendar timezone
+# cannot be read, busy time is cached per user from the Calendar freebusy API, and alternative
+# slots are only proposed on weekdays inside the working hours below.
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Africa/Addis_Ababa")
+FREEBUSY_TTL_SECONDS = float(os.getenv("FREEBUSY_TTL_SECONDS", "300"))
+FREEBUSY_HORIZON_DAYS = int(os.getenv("FREEBUSY_HORIZON_DAYS", "14"))
+MEETING_WORKDAY_START_HOUR = int(os.getenv("MEETING_WORKDAY_START_HOUR", "9"))
+MEETING_WORKDAY_END_HOUR = int(os.getenv("MEETING_WORKDAY_END_HOUR", "17"))
+# Languages the dateparser fallback tries when a meeting time is not in ISO form.
+DATEPARSER_LANGUAGES = tuple(filter(None, os.getenv("DATEPARSER_LANGUAGES", "en").split(",")))
+
+# Replies are written to the outbox table and delivered by the leader's
+# outbox sender. OUTBOX_ENABLED=false sends inline from the processing path.
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "true").lower() == "true"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+# Messages claimed and not yet finished; claiming resumes as sends complete.
+OUTBOX_MAX_IN_FLIGHT = int(os.getenv("OUTBOX_MAX_IN_FLIGHT", "100"))
+OUTBOX_PER_USER_CONCURRENCY = int(os.getenv("OUTBOX_PER_USER_CONCURRENCY", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "30"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+
+# /emails/stream: heartbeat interval, per-client buffer before a slow client
+# is disconnected, and how many missed emails are replayed on reconnect.
+EVENT_STREAM_HEARTBEAT_SECONDS = float(os.getenv("EVENT_STREAM_HEARTBEAT_SECONDS", "15"))
+EVENT_STREAM_MAX_QUEUE = int(os.getenv("EVENT_STREAM_MAX_QUEUE", "100"))
+EVENT_STREAM_BACKLOG_LIMIT = int(os.getenv("EVENT_STREAM_BACKLOG_LIMIT", "100"))
+
+# Email search index: "auto" uses FTS5 on SQLite, FULLTEXT on MySQL and the
+# portable term table elsewhere; "fts5", "mysql" or "portable" force one.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+
+# Retention: emails older than RETENTION_HOT_DAYS move from `emails` into the
+# compressed `email_archive` table, which the history API still pages into
+# and search still covers through its own term index.
+# RETENTION_OVERRIDES sets other windows per user or domain, e.g.
+# "ceo@example.com=365,@example.org=30" (0 keeps email hot forever).
+# ARCHIVE_CODEC is "auto" (zstd when the zstandard package is installed,
+# otherwise zlib), "zstd" or "zlib".
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "false").lower() == "true"
+RETENTION_HOT_DAYS = int(os.getenv("RETENTION_HOT_DAYS", "90"))
+RETENTION_OVERRIDES = os.getenv("RETENTION_OVERRIDES", "")
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "6"))
+RETENTION_COMPACT_MIN_ROWS = int(os.getenv("RETENTION_COMPACT_MIN_ROWS", "10000"))
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "auto")
+
+# Gmail quota accounting: token buckets per user and per project, in quota
+# units per second (Gmail allows 250 per user; the project default is
+# 1,200,000 per minute). Calls that would wait longer than
+# GMAIL_QUOTA_MAX_WAIT_SECONDS are deferred and requeued instead.
+GMAIL_USER_QUOTA_UNITS_PER_SECOND = float(os.getenv("GMAIL_USER_QUOTA_UNITS_PER_SECOND", "250"))
+GMAIL_PROJECT_QUOTA_UNITS_PER_SECOND = float(os.getenv("GMAIL_PROJECT_QUOTA_UNITS_PER_SECOND", "20000"))
+GMAIL_QUOTA_MAX_WAIT_SECONDS = float(os.getenv("GMAIL_QUOTA_MAX_WAIT_SECONDS", "5"))
+
+# Fetched emails wait in a priority scheduler for one of SCHEDULER_CONCURRENCY
+# workers per process. Priority comes from VIP_SENDERS, the Priority header
+# and the sender's history. Users share workers by weighted fair queuing;
+# SCHEDULER_USER_WEIGHTS gives some users more, e.g. "ops@example.com=3".
+# VIP_SENDERS lists senders or "@domain"s, optionally per user as
+# "user@example.com=boss@example.com". The notification is still answered
+# only once its email has been processed. Ignored when SHARD_COUNT > 0: shards
+# process inline to keep each user's emails in order.
+PRIORITY_SCHEDULER_ENABLED = os.getenv("PRIORITY_SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "4"))
+SCHEDULER_MAX_QUEUED = int(os.getenv("SCHEDULER_MAX_QUEUED", "10000"))
+SCHEDULER_AGING_SECONDS = float(os.getenv("SCHEDULER_AGING_SECONDS", "60"))
+SCHEDULER_USER_WEIGHTS = {
+    email.strip(): float(weight)
+    for email, _, weight in (item.partition("=") for item in os.getenv("SCHEDULER_USER_WEIGHTS", "").split(","))
+    if email.strip()
+}
+VIP_SENDERS = os.getenv("VIP_SENDERS", "")
+
+# Onboarding backfill: after sign-in, the leader imports the last BACKFILL_DAYS
+# of the user's inbox, BACKFILL_PAGE_SIZE messages per listing page, in
+# Gmail batches of BACKFILL_BATCH_SIZE with BACKFILL_CONCURRENCY in flight.
+# Backfills leave BACKFILL_QUOTA_RESERVE of each Gmail quota bucket to live
+# calls and pause while live notifications are being processed on any worker
+# or shard: each one renews a "live-work:" lease every
+# BACKFILL_LIVE_SIGNAL_SECONDS while busy, valid for
+# BACKFILL_LIVE_SIGNAL_TTL_SECONDS in case it dies.
+BACKFILL_ENABLED = os.getenv("BACKFILL_ENABLED", "true").lower() == "true"
+BACKFILL_DAYS = int(os.getenv("BACKFILL_DAYS", "14"))
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", "100"))
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "10"))
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "2"))
+BACKFILL_POLL_SECONDS = float(os.getenv("BACKFILL_POLL_SECONDS", "30"))
+BACKFILL_QUOTA_RESERVE = float(os.getenv("BACKFILL_QUOTA_RESERVE", "0.5"))
+BACKFILL_LIVE_SIGNAL_SECONDS = float(os.getenv("BACKFILL_LIVE_SIGNAL_SECONDS", "0.5"))
+BACKFILL_LIVE_SIGNAL_TTL_SECONDS = float(os.getenv("BACKFILL_LIVE_SIGNAL_TTL_SECONDS", "5"))
+
+# Model routing: emails go to GEMINI_FAST_MODEL unless the body is longer
+# than ROUTE_MAX_FAST_CHARS, quotes more than ROUTE_MAX_FAST_THREAD_DEPTH
+# earlier messages or mentions one of ROUTE_ESCALATE_KEYWORDS (meeting
+# intent); those go to GEMINI_MODEL. A fast answer without a usable
+# function call, or one that schedules a meeting, is retried on GEMINI_MODEL.
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+GEMINI_FAST_MODEL = os.getenv("GEMINI_FAST_MODEL", "gemini-2.0-flash-lite")
+ROUTE_MAX_FAST_CHARS = int(os.getenv("ROUTE_MAX_FAST_CHARS", "2000"))
+ROUTE_MAX_FAST_THREAD_DEPTH = int(os.getenv("ROUTE_MAX_FAST_THREAD_DEPTH", "1"))
+ROUTE_ESCALATE_KEYWORDS = os.getenv(
+    "ROUTE_ESCALATE_KEYWORDS",
+    "meeting,meet,call,schedule,reschedule,calendar,availability,available,appointment,invite")
+
+# Notification ingestion: "push" takes Pub/Sub pushes on /email-notification;
+# "pull" also pulls them from PUBSUB_SUBSCRIPTION on PULL_STREAMS concurrent
+# pulls, with at most PULL_MAX_OUTSTANDING_MESSAGES / _BYTES leased at once.
+# Acks are batched (PULL_ACK_BATCH_SIZE, flushed every PULL_ACK_FLUSH_MS).
+# PUBSUB_EMULATOR_HOST points it at the Pub/Sub emulator or benchmarks.fakes.
+INGESTION_MODE = os.getenv("INGESTION_MODE", "push")
+PUBSUB_SUBSCRIPTION = os.getenv("PUBSUB_SUBSCRIPTION", TOPIC_NAME)
+PUBSUB_EMULATOR_HOST = os.getenv("PUBSUB_EMULATOR_HOST")
+PULL_STREAMS = int(os.getenv("PULL_STREAMS", "2"))
+PULL_MAX_MESSAGES = int(os.getenv("PULL_MAX_MESSAGES", "50"))
+PULL_MAX_OUTSTANDING_MESSAGES = int(os.getenv("PULL_MAX_OUTSTANDING_MESSAGES", "100"))
+PULL_MAX_OUTSTANDING_BYTES = int(os.getenv("PULL_MAX_OUTSTANDING_BYTES", str(10 * 1024 * 1024)))
+PULL_ACK_BATCH_SIZE = int(os.getenv("PULL_ACK_BATCH_SIZE", "100"))
+PULL_ACK_FLUSH_MS = float(os.getenv("PULL_ACK_FLUSH_MS", "100"))
+PULL_ACK_DEADLINE_SECONDS = int(os.getenv("PULL_ACK_DEADLINE_SECONDS", "60"))
+PULL_NACK_DELAY_SECONDS = int(os.getenv("PULL_NACK_DELAY_SECONDS", "10"))
+
+# History export: rows are read through a server-side cursor EXPORT_BATCH_SIZE
+# at a time and sent to the client in chunks of about EXPORT_CHUNK_BYTES.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))
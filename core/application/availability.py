@@ -0,0 +1,173 @@
+import asyncio
+import bisect
+import datetime
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+Interval = Tuple[datetime.datetime, datetime.datetime]
+
+
+class IntervalIndex:
+    """
+    Busy time as a sorted list of disjoint intervals. Overlapping or touching
+    inserts are merged, so overlap checks and "next free slot" lookups are a
+    binary search instead of a scan over every event.
+    """
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._starts: List[datetime.datetime] = []
+        self._ends: List[datetime.datetime] = []
+        for start, end in intervals:
+            self.add(start, end)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def intervals(self) -> List[Interval]:
+        return list(zip(self._starts, self._ends))
+
+    def add(self, start: datetime.datetime, end: datetime.datetime) -> None:
+        if end <= start:
+            return
+        # First interval that could touch [start, end) and the one after the last.
+        left = bisect.bisect_left(self._ends, start)
+        right = bisect.bisect_right(self._starts, end)
+        if left < right:
+            start = min(start, self._starts[left])
+            end = max(end, self._ends[right - 1])
+        self._starts[left:right] = [start]
+        self._ends[left:right] = [end]
+
+    def conflict(self, start: datetime.datetime, end: datetime.datetime) -> Optional[Interval]:
+        """Returns the busy interval overlapping [start, end), if any."""
+        index = bisect.bisect_right(self._ends, start)
+        if index < len(self._starts) and self._starts[index] < end:
+            return self._starts[index], self._ends[index]
+        return None
+
+    def next_free(self, start: datetime.datetime, duration: datetime.timedelta,
+                  not_after: datetime.datetime,
+                  allowed: Optional[Callable[[datetime.datetime, datetime.timedelta],
+                                             Optional[datetime.datetime]]] = None,
+                  step: datetime.timedelta = datetime.timedelta(minutes=15)) -> Optional[datetime.datetime]:
+        """
+        Earliest start at or after `start` where `duration` fits without a
+        conflict. `allowed` may push a candidate forward (for example to the
+        next working day) and returns None when nothing later is acceptable.
+        """
+        candidate = _round_up(start, step)
+        while candidate + duration <= not_after:
+            if allowed:
+                adjusted = allowed(candidate, duration)
+                if adjusted is None:
+                    return None
+                if adjusted != candidate:
+                    candidate = _round_up(adjusted, step)
+                    continue
+            busy = self.conflict(candidate, candidate + duration)
+            if not busy:
+                return candidate
+            candidate = _round_up(busy[1], step)
+        return None
+
+
+def _round_up(moment: datetime.datetime, step: datetime.timedelta) -> datetime.datetime:
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=moment.tzinfo)
+    remainder = (moment - epoch) % step
+    return moment if not remainder else moment + (step - remainder)
+
+
+def working_hours(start_hour: int, end_hour: int, tz: datetime.tzinfo):
+    """
+    Builds an `allowed` callback for IntervalIndex.next_free that keeps
+    meetings on weekdays between `start_hour` and `end_hour` in `tz`.
+    """
+    def allowed(candidate: datetime.datetime, duration: datetime.timedelta) -> Optional[datetime.datetime]:
+        local = candidate.astimezone(tz)
+        day_start = local.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+        day_end = local.replace(hour=end_hour, minute=0, second=0, microsecond=0)
+        if local.weekday() >= 5 or local + duration > day_end:
+            next_day = day_start + datetime.timedelta(days=1)
+            while next_day.weekday() >= 5:
+                next_day += datetime.timedelta(days=1)
+            return next_day
+        if local < day_start:
+            return day_start
+        return candidate
+    return allowed
+
+
+class _Entry:
+    def __init__(self, index: IntervalIndex, window: Interval, fetched_at: float):
+        self.index = index
+        self.window = window
+        self.fetched_at = fetched_at
+
+
+BusyFetcher = Callable[[datetime.datetime, datetime.datetime], Awaitable[List[Interval]]]
+
+
+class FreeBusyCache:
+    """
+    Per-user busy intervals filled from the Calendar freebusy API and
+    refreshed after `ttl_seconds`. Concurrent lookups for the same user share
+    one fetch, and a batch of slots is answered from a single query covering
+    all of them.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, horizon: datetime.timedelta = datetime.timedelta(days=14)):
+        self.ttl_seconds = ttl_seconds
+        self.horizon = horizon
+        self._entries: Dict[str, _Entry] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def _fresh(self, entry: Optional[_Entry], start: datetime.datetime, end: datetime.datetime) -> bool:
+        return (entry is not None
+                and time.monotonic() - entry.fetched_at < self.ttl_seconds
+                and entry.window[0] <= start and end <= entry.window[1])
+
+    async def index_for(self, user_key: str, start: datetime.datetime, end: datetime.datetime,
+                        fetch: BusyFetcher) -> IntervalIndex:
+        entry = self._entries.get(user_key)
+        if self._fresh(entry, start, end):
+            return entry.index
+
+        pending = self._pending.get(user_key)
+        if pending:
+            await asyncio.shield(pending)
+            entry = self._entries.get(user_key)
+            if self._fresh(entry, start, end):
+                return entry.index
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        window = (min(now, start), max(end, now + self.horizon))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[user_key] = future
+        try:
+            busy = await fetch(*window)
+            entry = _Entry(IntervalIndex(busy), window, time.monotonic())
+            self._entries[user_key] = entry
+            future.set_result(None)
+            return entry.index
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(user_key, None)
+
+    async def check_slots(self, user_key: str, slots: List[Interval], fetch: BusyFetcher) -> List[Optional[Interval]]:
+        """Returns, for each slot, the busy interval it conflicts with or None."""
+        if not slots:
+            return []
+        index = await self.index_for(user_key, min(s for s, _ in slots), max(e for _, e in slots), fetch)
+        return [index.conflict(start, end) for start, end in slots]
+
+    def record_busy(self, user_key: str, start: datetime.datetime, end: datetime.datetime) -> None:
+        """Adds an event we just created so later checks see it without a refetch."""
+        entry = self._entries.get(user_key)
+        if entry:
+            entry.index.add(start, end)
+
+    def invalidate(self, user_key: str) -> None:
+        self._entries.pop(user_key, None)
@@ -0,0 +1,263 @@
+import asyncio
+import datetime
+from typing import (AsyncContextManager, Awaitable, Callable, List, Optional,
+                    Tuple)
+
+from core.application.leader import default_holder_id
+from core.application.metrics import NOTIFICATIONS_IN_FLIGHT, REGISTRY
+from core.application.ports.inbound import IEmailServicePort
+from core.application.ports.outbound import (IBackfillRepositoryPort,
+                                             ILeaseRepositoryPort)
+from core.application.quota import QuotaDeferred
+from core.application.scheduling import EMAIL_SCHEDULER
+from core.application.services import parse_gmail_message
+from core.domain.entity import BackfillJob, User
+
+BACKFILL_EMAILS_TOTAL = REGISTRY.counter(
+    "taskpilot_backfill_emails_total", "Emails handled by onboarding backfills, by outcome.", ["outcome"])
+
+FINISHED = ("done", "failed")
+
+LIVE_WORK_LEASE_PREFIX = "live-work:"
+
+
+def live_work_pending() -> bool:
+    """Whether this process is handling a Gmail notification or has fetched emails waiting for the model."""
+    return NOTIFICATIONS_IN_FLIGHT.value() > 0 or EMAIL_SCHEDULER.busy
+
+
+async def _never_busy() -> bool:
+    return False
+
+
+class LiveWorkSignal:
+    """
+    Tells the leader's backfill whether any process is working on live mail.
+    Live work runs on every HTTP worker and in shard processes, so each of
+    them runs a signal: while `local_busy()` holds it renews a lease named
+    "live-work:<holder>" every `interval_seconds`, and it releases the lease
+    once idle. busy() is true while any such lease is unexpired, so a worker
+    that dies stops counting after `ttl_seconds`.
+    """
+
+    def __init__(self, lease_repository: ILeaseRepositoryPort, local_busy: Callable[[], bool] = live_work_pending,
+                 holder: Optional[str] = None, interval_seconds: float = 0.5, ttl_seconds: float = 5.0):
+        if interval_seconds >= ttl_seconds:
+            raise ValueError("interval_seconds must be shorter than ttl_seconds")
+        self.lease_repository = lease_repository
+        self.local_busy = local_busy
+        self.holder = holder or default_holder_id()
+        self.name = LIVE_WORK_LEASE_PREFIX + self.holder
+        self.interval_seconds = interval_seconds
+        self.ttl_seconds = ttl_seconds
+        self._held = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._held:
+            await self._publish(False)
+
+    async def _run(self) -> None:
+        while True:
+            busy = self.local_busy()
+            if busy or self._held:
+                await self._publish(busy)
+            await asyncio.sleep(self.interval_seconds)
+
+    async def _publish(self, busy: bool) -> None:
+        try:
+            if busy:
+                await self.lease_repository.try_acquire(self.name, self.holder, self.ttl_seconds)
+            else:
+                await self.lease_repository.release(self.name, self.holder)
+            self._held = busy
+        except Exception as e:
+            print(f"Error publishing live work state: {e}")
+
+    async def busy(self) -> bool:
+        if self.local_busy():
+            return True
+        try:
+            return await self.lease_repository.any_held(LIVE_WORK_LEASE_PREFIX)
+        except Exception as e:
+            # Without the shared state, fall back to what this process sees.
+            print(f"Error reading live work state: {e}")
+            return False
+
+
+class BackfillService:
+    """
+    Imports the last days of a new user's inbox. Listing pages of
+    `page_size` messages are split into chunks of `chunk_size`, each fetched
+    with one Gmail batch request and classified with one model call, with
+    at most `concurrency` chunks in flight. The job is checkpointed after
+    every chunk and every page, so a restart resumes where it stopped.
+    Messages an earlier run already stored are skipped, including those of
+    chunks in flight at a restart, and the listing stops at the time the
+    job was queued, where live ingestion takes over.
+
+    Backfills must never delay live mail: Gmail calls leave `quota_reserve`
+    of the user's and project's quota to live calls, and no chunk starts
+    while `is_busy()` reports live notifications being worked on, usually
+    LiveWorkSignal.busy so that work on any worker or shard counts.
+    """
+
+    def __init__(self, backfill_repository: IBackfillRepositoryPort,
+                 email_service_scope: Callable[[], AsyncContextManager[IEmailServicePort]],
+                 page_size: int = 100, chunk_size: int = 10, concurrency: int = 2, quota_reserve: float = 0.5,
+                 is_busy: Callable[[], Awaitable[bool]] = _never_busy, busy_poll_seconds: float = 0.5,
+                 max_attempts: int = 3, retry_base_seconds: float = 2.0):
+        self.backfill_repository = backfill_repository
+        self.email_service_scope = email_service_scope
+        self.page_size = page_size
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.quota_reserve = quota_reserve
+        self.is_busy = is_busy
+        self.busy_poll_seconds = busy_poll_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self._save_lock = asyncio.Lock()
+
+    async def start(self, user_email: str, days: int) -> BackfillJob:
+        """Queues a backfill; an unfinished one is left as is and a finished one starts over."""
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        job = await self.backfill_repository.create(BackfillJob(user_email=user_email, since=since))
+        if job.status in FINISHED:
+            job = job.model_copy(update={
+                "status": "pending", "since": since, "created_at": datetime.datetime.utcnow(), "page_token": None, "page_done_ids": [], "pages": 0,
+                "imported": 0, "failed": 0, "estimated_total": None, "error": None, "finished_at": None})
+            await self.backfill_repository.save(job)
+        return job
+
+    async def progress(self, user_email: str) -> Optional[BackfillJob]:
+        return await self.backfill_repository.get(user_email)
+
+    async def run_pending(self) -> int:
+        """Runs unfinished jobs, oldest first, until none is left; returns how many ran."""
+        count = 0
+        while (job := await self.backfill_repository.next_unfinished()) is not None:
+            await self.run(job)
+            count += 1
+        return count
+
+    async def run(self, job: BackfillJob) -> BackfillJob:
+        job.status = "running"
+        await self._save(job)
+        try:
+            async with self.email_service_scope() as email_service:
+                user = await email_service.get_user_credentials(job.user_email)
+            if user is None:
+                raise LookupError(f"No stored credentials for {job.user_email}")
+            since = job.since.replace(tzinfo=datetime.timezone.utc)
+            queued = job.created_at.replace(tzinfo=datetime.timezone.utc)
+            query = f"in:inbox after:{int(since.timestamp())} before:{int(queued.timestamp())}"
+            while True:
+                message_ids, next_page_token, estimate = await self._list_page(user, query, job.page_token)
+                if job.estimated_total is None:
+                    job.estimated_total = estimate
+                done = set(job.page_done_ids)
+                remaining = [message_id for message_id in message_ids if message_id not in done]
+                slots = asyncio.Semaphore(self.concurrency)
+                await asyncio.gather(*(
+                    self._import_chunk(user, job, remaining[start:start + self.chunk_size], slots)
+                    for start in range(0, len(remaining), self.chunk_size)
+                ))
+                job.pages += 1
+                job.page_token = next_page_token
+                job.page_done_ids = []
+                await self._save(job)
+                if not next_page_token:
+                    break
+            job.status = "done"
+        except Exception as e:
+            print(f"Backfill for {job.user_email} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = datetime.datetime.utcnow()
+        await self._save(job)
+        print(f"Backfill for {job.user_email} {job.status}: {job.imported} imported, {job.failed} failed")
+        return job
+
+    async def _save(self, job: BackfillJob) -> None:
+        # Chunks share the job object; serialising saves keeps each checkpoint whole.
+        async with self._save_lock:
+            await self.backfill_repository.save(job)
+
+    async def _yield_to_live_work(self) -> None:
+        while await self.is_busy():
+            await asyncio.sleep(self.busy_poll_seconds)
+
+    async def _list_page(self, user: User, query: str,
+                         page_token: Optional[str]) -> Tuple[List[str], Optional[str], Optional[int]]:
+        attempt = 0
+        while True:
+            await self._yield_to_live_work()
+            try:
+                async with self.email_service_scope() as email_service:
+                    return await email_service.list_messages_page(
+                        user, query, page_token, self.page_size, self.quota_reserve)
+            except QuotaDeferred as e:
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                print(f"Retrying backfill listing for {user.email}: {e}")
+                await asyncio.sleep(self.retry_base_seconds * 2 ** attempt)
+
+    async def _import_chunk(self, user: User, job: BackfillJob, message_ids: List[str],
+                            slots: asyncio.Semaphore) -> None:
+        """Imports one chunk, retrying failures; a chunk that keeps failing is counted failed and skipped."""
+        async with slots:
+            attempt = 0
+            while True:
+                await self._yield_to_live_work()
+                try:
+                    imported, duplicates, failed = await self._import(user, message_ids)
+                    break
+                except QuotaDeferred as e:
+                    # Waiting out quota is not a failed attempt.
+                    await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    attempt += 1
+                    print(f"Backfill chunk for {user.email} failed (attempt {attempt}): {e}")
+                    if attempt >= self.max_attempts:
+                        imported, duplicates, failed = 0, 0, len(message_ids)
+                        break
+                    await asyncio.sleep(self.retry_base_seconds * 2 ** attempt)
+            BACKFILL_EMAILS_TOTAL.inc(imported, outcome="imported")
+            BACKFILL_EMAILS_TOTAL.inc(duplicates, outcome="duplicate")
+            BACKFILL_EMAILS_TOTAL.inc(failed, outcome="failed")
+            job.imported += imported
+            job.failed += failed
+            job.page_done_ids.extend(message_ids)
+            await self._save(job)
+
+    async def _import(self, user: User, message_ids: List[str]) -> Tuple[int, int, int]:
+        """Returns how many messages were imported, were already stored, and failed."""
+        async with self.email_service_scope() as email_service:
+            new_ids = await email_service.filter_imported_messages(user, message_ids)
+            duplicates = len(message_ids) - len(new_ids)
+            if not new_ids:
+                return 0, duplicates, 0
+            results = await email_service.get_messages_batch(user, new_ids, self.quota_reserve)
+            messages = [results[message_id] for message_id in new_ids
+                        if isinstance(results.get(message_id), dict)]
+            emails = [parse_gmail_message(message) for message in messages]
+            summaries = await email_service.summarize_emails(emails) if emails else []
+            imported = 0
+            for message, email_data, summary in zip(messages, emails, summaries):
+                if summary:
+                    if await email_service.store_backfilled_email(user, message, email_data, summary):
+                        imported += 1
+                    else:
+                        duplicates += 1
+        return imported, duplicates, len(message_ids) - imported - duplicates
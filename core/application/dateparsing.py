@@ -0,0 +1,88 @@
+import datetime
+import functools
+import threading
+from typing import Optional
+
+from config import DATEPARSER_LANGUAGES
+from core.application.lazy import LazyModule
+from core.application.metrics import REGISTRY
+
+dateparser_date = LazyModule("dateparser.date")
+
+MEETING_DATE_PARSE_TOTAL = REGISTRY.counter(
+    "taskpilot_meeting_date_parse_total", "Meeting date/time parses, by the path that handled them.", ["path"])
+
+# Formats the model is asked for come first; the rest are common variants
+# that are still cheap to try before handing the string to dateparser.
+TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M%p", "%I %p", "%I%p")
+
+# Guards the shared parser's RELATIVE_BASE between setting it and parsing.
+_FALLBACK_LOCK = threading.Lock()
+
+
+def _parse_time(value: str) -> Optional[datetime.time]:
+    value = value.strip().upper()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _fallback_parser() -> "dateparser_date.DateDataParser":
+    """
+    The one dateparser instance, limited to the configured languages.
+    Timezone handling stays out of dateparser, since its TIMEZONE settings
+    roughly double the parse cost, so one instance serves every user.
+    """
+    return dateparser_date.DateDataParser(
+        languages=list(DATEPARSER_LANGUAGES), settings={"PREFER_DATES_FROM": "future"})
+
+
+def _parse_fallback(text: str, relative_base: datetime.datetime) -> Optional[datetime.datetime]:
+    """
+    Parses with the shared instance, resolving relative expressions
+    ("tomorrow 3pm") against `relative_base`. The base is set on the
+    instance's settings per call, as dateparser's own search does. New
+    settings would miss the word and regex caches dateparser keys on them.
+    """
+    parser = _fallback_parser()
+    with _FALLBACK_LOCK:
+        parser._settings.RELATIVE_BASE = relative_base
+        return parser.get_date_data(text).date_obj
+
+
+def parse_fast(date_str: str, time_str: str, tz: datetime.tzinfo) -> Optional[datetime.datetime]:
+    """Strict parse of `YYYY-MM-DD` plus a clock time; None if either does not match."""
+    try:
+        date = datetime.date.fromisoformat(date_str.strip())
+    except ValueError:
+        return None
+    time = _parse_time(time_str)
+    if time is None:
+        return None
+    return datetime.datetime.combine(date, time, tzinfo=tz)
+
+
+def parse_meeting_datetime(date_str: str, time_str: str, tz: datetime.tzinfo) -> Optional[datetime.datetime]:
+    """
+    Parses the date and time the model extracted from an email into an aware
+    datetime in `tz`, trying the strict formats before dateparser.
+    """
+    parsed = parse_fast(str(date_str), str(time_str), tz)
+    if parsed is not None:
+        MEETING_DATE_PARSE_TOTAL.inc(path="fast")
+        return parsed
+
+    # The user's wall-clock time, so "tomorrow" is their tomorrow.
+    now = datetime.datetime.now(tz).replace(tzinfo=None)
+    parsed = _parse_fallback(f"{date_str} {time_str}", now)
+    if parsed is None:
+        MEETING_DATE_PARSE_TOTAL.inc(path="failed")
+        return None
+    MEETING_DATE_PARSE_TOTAL.inc(path="fallback")
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=tz)
+    return parsed.astimezone(tz)
@@ -0,0 +1,87 @@
+import asyncio
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Set
+
+from config import EVENT_STREAM_MAX_QUEUE
+from core.application.metrics import REGISTRY
+from core.domain.entity import Email
+
+EVENT_SUBSCRIBERS = REGISTRY.gauge(
+    "taskpilot_event_subscribers", "Open email event streams in this process.")
+EVENTS_DROPPED_TOTAL = REGISTRY.counter(
+    "taskpilot_event_subscribers_dropped_total", "Event streams closed because the client fell behind.")
+
+
+class Subscription:
+    """
+    One client's bounded queue of new emails. When the client falls behind
+    and the queue fills, the subscription is marked `overflowed` and closed;
+    the client reconnects and catches up from its last seen id.
+    """
+
+    def __init__(self, user_email: str, max_queue: int):
+        self.user_email = user_email
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def offer(self, email: Optional[Email]) -> bool:
+        try:
+            self.queue.put_nowait(email)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+    async def next(self, timeout: float) -> Optional[Email]:
+        """The next email, or None on timeout or once the subscription is closed."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EmailEventHub:
+    """
+    In-process fan-out of newly stored emails to that user's open streams.
+    Publishing never blocks: a full subscriber queue closes that subscriber
+    instead of slowing the pipeline down. `forward`, when set, also receives
+    every email; shard workers use it to pass events to the HTTP process.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self.forward: Optional[Callable[[Email], None]] = None
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, user_email: str) -> Subscription:
+        subscription = Subscription(user_email, self.max_queue)
+        self._subscribers[user_email].add(subscription)
+        EVENT_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.user_email)
+        if subscribers and subscription in subscribers:
+            subscribers.discard(subscription)
+            EVENT_SUBSCRIBERS.dec()
+            if not subscribers:
+                del self._subscribers[subscription.user_email]
+
+    def publish(self, email: Email) -> None:
+        if self.forward:
+            self.forward(email)
+        for subscription in list(self._subscribers.get(email.receiver_email, ())):
+            if not subscription.offer(email):
+                EVENTS_DROPPED_TOTAL.inc()
+                self.unsubscribe(subscription)
+                # Leave room for the close marker so the stream notices promptly.
+                subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+
+    def subscriber_count(self, user_email: Optional[str] = None) -> int:
+        if user_email is not None:
+            return len(self._subscribers.get(user_email, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+EMAIL_EVENTS = EmailEventHub(EVENT_STREAM_MAX_QUEUE)
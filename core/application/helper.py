@@ -19,3 +19,47 @@ def generate_no_rescheduled_email(email_data: EmailData, user: User):
 
     {user.name}
     """
+
+
+def generate_alternative_time_email(email_data: EmailData, user: User, proposed_start: str, duration_minutes: int):
+    """Generates the email message proposing the next open slot after a conflict."""
+    return f"""
+    Subject: Re: Meeting Request - Proposed New Time
+
+    Dear {email_data.senderName or email_data.senderEmail},
+
+    Unfortunately I am not available at the requested time.
+
+    The next open slot in my calendar is {proposed_start} ({duration_minutes} minutes). Please reply to confirm whether this works for you, or suggest another time.
+
+    Sincerely,
+
+    {user.name}
+    """
+
+
+MEETING_LINK_PLACEHOLDER = "[MEETING_LINK]"
+
+
+def render_meeting_confirmation(draft_body: str, meeting_link: str):
+    """Fills the meeting link into a confirmation drafted before the event existed."""
+    if MEETING_LINK_PLACEHOLDER in draft_body:
+        return draft_body.replace(MEETING_LINK_PLACEHOLDER, meeting_link)
+    return f"{draft_body}\n\nMeeting link: {meeting_link}"
+
+
+def generate_meeting_confirmation_email(email_data: EmailData, user: User, meeting_link: str, start: str, duration_minutes: int):
+    """Generates the confirmation for a scheduled meeting when no draft is available."""
+    return f"""
+    Dear {email_data.senderName or email_data.senderEmail},
+
+    Thank you for your message. Our meeting is confirmed for {start} ({duration_minutes} minutes).
+
+    You can join using this link: {meeting_link}
+
+    A calendar invitation has been sent to {email_data.senderEmail}.
+
+    Sincerely,
+
+    {user.name}
+    """
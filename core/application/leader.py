@@ -0,0 +1,137 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from core.application.metrics import REGISTRY
+from core.application.ports.outbound import ILeaseRepositoryPort
+
+IS_LEADER = REGISTRY.gauge(
+    "taskpilot_is_leader", "1 while this process holds the named lease.", ["lease"])
+SINGLETON_JOB_RUNS_TOTAL = REGISTRY.counter(
+    "taskpilot_singleton_job_runs_total", "Singleton job executions, by job and outcome.", ["job", "outcome"])
+
+
+def default_holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class SingletonJob:
+    def __init__(self, name: str, func: Callable[[], Awaitable[None]], interval_seconds: Optional[float]):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+
+
+class LeaderElector:
+    """
+    Keeps a database lease alive with a heartbeat and runs the registered
+    singleton jobs only while this process holds it. Every worker runs an
+    elector; one of them wins, and another takes over once the lease expires.
+    """
+
+    def __init__(self, lease_repository: ILeaseRepositoryPort, name: str = "scheduler",
+                 holder: Optional[str] = None, lease_seconds: float = 30.0,
+                 heartbeat_seconds: float = 10.0, enabled: bool = True):
+        if heartbeat_seconds >= lease_seconds:
+            raise ValueError("heartbeat_seconds must be shorter than lease_seconds")
+        self.lease_repository = lease_repository
+        self.name = name
+        self.holder = holder or default_holder_id()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.enabled = enabled
+        self.is_leader = False
+        self._jobs: List[SingletonJob] = []
+        self._job_tasks: Dict[str, asyncio.Task] = {}
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._lease_valid_until = 0.0
+
+    def add_job(self, name: str, func: Callable[[], Awaitable[None]], interval_seconds: Optional[float] = None) -> None:
+        """
+        Registers a coroutine function to run on the leader. It runs as soon as
+        leadership is gained and then every `interval_seconds`, or just once
+        per term when no interval is given.
+        """
+        self._jobs.append(SingletonJob(name, func, interval_seconds))
+        if self.is_leader:
+            self._start_job(self._jobs[-1])
+
+    async def start(self) -> None:
+        if not self.enabled:
+            self._become_leader()
+            return
+        await self._heartbeat()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+        was_leader = self.is_leader
+        await self._step_down()
+        if was_leader and self.enabled:
+            try:
+                await self.lease_repository.release(self.name, self.holder)
+            except Exception as e:
+                print(f"Error releasing lease {self.name}: {e}")
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            await self._heartbeat()
+
+    async def _heartbeat(self) -> None:
+        started = time.monotonic()
+        try:
+            acquired = await self.lease_repository.try_acquire(self.name, self.holder, self.lease_seconds)
+        except Exception as e:
+            print(f"Error renewing lease {self.name}: {e}")
+            # Keep leading only while the lease we already hold is still valid.
+            if self.is_leader and time.monotonic() >= self._lease_valid_until:
+                await self._step_down()
+            return
+
+        if acquired:
+            self._lease_valid_until = started + self.lease_seconds
+            if not self.is_leader:
+                self._become_leader()
+        elif self.is_leader:
+            await self._step_down()
+
+    def _become_leader(self) -> None:
+        print(f"------ {self.holder} is now leader for '{self.name}' ------")
+        self.is_leader = True
+        IS_LEADER.set(1, lease=self.name)
+        for job in self._jobs:
+            self._start_job(job)
+
+    async def _step_down(self) -> None:
+        if self.is_leader:
+            print(f"------ {self.holder} lost leadership for '{self.name}' ------")
+        self.is_leader = False
+        IS_LEADER.set(0, lease=self.name)
+        tasks = list(self._job_tasks.values())
+        self._job_tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start_job(self, job: SingletonJob) -> None:
+        self._job_tasks[job.name] = asyncio.create_task(self._run_job(job))
+
+    async def _run_job(self, job: SingletonJob) -> None:
+        while True:
+            try:
+                await job.func()
+                SINGLETON_JOB_RUNS_TOTAL.inc(job=job.name, outcome="ok")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                SINGLETON_JOB_RUNS_TOTAL.inc(job=job.name, outcome="error")
+                print(f"Error running singleton job {job.name}: {e}")
+            if job.interval_seconds is None:
+                return
+            await asyncio.sleep(job.interval_seconds)
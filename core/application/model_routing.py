@@ -0,0 +1,100 @@
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from config import (GEMINI_FAST_MODEL, GEMINI_MODEL, MODEL_ROUTING_ENABLED,
+                    ROUTE_ESCALATE_KEYWORDS, ROUTE_MAX_FAST_CHARS,
+                    ROUTE_MAX_FAST_THREAD_DEPTH)
+from core.application.metrics import REGISTRY
+from core.application.schema import EmailData
+
+MODEL_ROUTE_SECONDS = REGISTRY.histogram(
+    "taskpilot_model_route_seconds", "Latency of email classification calls, by route and model.",
+    ["route", "model"])
+MODEL_ROUTES_TOTAL = REGISTRY.counter(
+    "taskpilot_model_routes_total", "Emails sent to each model route, by the rule that chose it.", ["route", "reason"])
+MODEL_ESCALATIONS_TOTAL = REGISTRY.counter(
+    "taskpilot_model_escalations_total", "Fast-model answers retried on the strong model, by what was wrong.",
+    ["reason"])
+
+FAST = "fast"
+STRONG = "strong"
+ESCALATED = "escalated"
+
+# Arguments each action needs to be carried out; an answer without them is escalated.
+# schedule_meeting lists the ones _handle_schedule_meeting checks before booking.
+REQUIRED_ARGS = {
+    "generate_reply": ("title", "reply_body"),
+    "schedule_meeting": ("date", "time", "duration_minutes", "attendees"),
+    "no_action_required": ("title",),
+}
+
+# Actions the fast model never carries out: they book Calendar events, so the
+# strong model always makes the call.
+STRONG_ONLY_ACTIONS = {"schedule_meeting"}
+
+# Lines that open a quoted earlier message in a reply chain.
+_QUOTE_HEADER = re.compile(r"^(On .+ wrote:|-+ ?Original Message ?-+|From: .+)$", re.MULTILINE | re.IGNORECASE)
+
+
+class ModelRouter:
+    """
+    Sends short, simple emails to `fast_model`. An email goes straight to
+    `strong_model` when any of these hold:
+    - the body is longer than `max_fast_chars`
+    - the body quotes more than `max_fast_thread_depth` earlier messages
+    - the body mentions one of `escalate_keywords`, which signal meeting
+      intent and so a Calendar booking
+    A fast answer that check_answer() rejects, including every
+    schedule_meeting, is retried on the strong model.
+    """
+
+    def __init__(self, fast_model: str, strong_model: str, enabled: bool = True, max_fast_chars: int = 2000,
+                 max_fast_thread_depth: int = 1, escalate_keywords: str = ""):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.enabled = enabled and fast_model != strong_model
+        self.max_fast_chars = max_fast_chars
+        self.max_fast_thread_depth = max_fast_thread_depth
+        keywords = [keyword.strip() for keyword in escalate_keywords.split(",") if keyword.strip()]
+        self._keywords = re.compile(r"\b(" + "|".join(map(re.escape, keywords)) + r")\b",
+                                    re.IGNORECASE) if keywords else None
+
+    def route(self, email_data: EmailData) -> Tuple[str, str]:
+        """The (route, model) for an email, counted under the rule that decided it."""
+        route, reason = self._decide(email_data.body or "")
+        MODEL_ROUTES_TOTAL.inc(route=route, reason=reason)
+        return route, self.strong_model if route == STRONG else self.fast_model
+
+    def _decide(self, body: str) -> Tuple[str, str]:
+        if not self.enabled:
+            return STRONG, "routing_disabled"
+        if len(body) > self.max_fast_chars:
+            return STRONG, "long_body"
+        if len(_QUOTE_HEADER.findall(body)) > self.max_fast_thread_depth:
+            return STRONG, "long_thread"
+        if self._keywords and self._keywords.search(body):
+            return STRONG, "meeting_intent"
+        return FAST, "simple"
+
+    def check_answer(self, function_call: Optional[Any]) -> Optional[str]:
+        """Why a fast-model answer must be retried on the strong model, or None when it can be acted on."""
+        if function_call is None:
+            return "no_function_call"
+        required = REQUIRED_ARGS.get(function_call.name)
+        if required is None:
+            return "unknown_function"
+        args: Dict[str, Any] = function_call.args or {}
+        if any(not args.get(name) for name in required):
+            return "missing_arguments"
+        if function_call.name in STRONG_ONLY_ACTIONS:
+            return "strong_only_action"
+        return None
+
+    def escalate(self, reason: str) -> str:
+        """Counts an escalation and returns the model to retry on."""
+        MODEL_ESCALATIONS_TOTAL.inc(reason=reason)
+        return self.strong_model
+
+
+MODEL_ROUTER = ModelRouter(GEMINI_FAST_MODEL, GEMINI_MODEL, MODEL_ROUTING_ENABLED, ROUTE_MAX_FAST_CHARS,
+                           ROUTE_MAX_FAST_THREAD_DEPTH, ROUTE_ESCALATE_KEYWORDS)
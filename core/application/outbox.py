@@ -0,0 +1,153 @@
+import asyncio
+import datetime
+import random
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from core.application.metrics import QUEUE_DEPTH, REGISTRY
+from core.application.ports.outbound import IOutboxRepositoryPort
+from core.domain.entity import OutboxMessage
+
+OUTBOX_SENDS_TOTAL = REGISTRY.counter(
+    "taskpilot_outbox_sends_total", "Outbox delivery attempts, by outcome.", ["outcome"])
+OUTBOX_MESSAGES = REGISTRY.gauge(
+    "taskpilot_outbox_messages", "Outbox messages, by status.", ["status"])
+
+
+class DeliveryError(Exception):
+    """
+    Raised by an outbox delivery function. `retryable` False gives up on the
+    message at once; `quota` True pauses every message of that user until
+    `retry_after` seconds have passed, without counting the attempt.
+    """
+
+    def __init__(self, message: str, retryable: bool = True, quota: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.quota = quota
+        self.retry_after = retry_after
+
+
+Deliver = Callable[[OutboxMessage], Awaitable[str]]
+
+
+class OutboxSender:
+    """
+    Drains the outbox: claims due messages in batches of up to `batch_size`
+    and delivers them with at most `max_in_flight` messages claimed and
+    unfinished, and `per_user_concurrency` sends in flight per user. Slots
+    are refilled as sends finish, so one slow send never holds back the
+    rest of its batch. Failures are retried with exponential backoff and
+    jitter up to `max_attempts`, and a quota error pauses only the affected
+    user.
+    """
+
+    def __init__(self, outbox_repository: IOutboxRepositoryPort, deliver: Deliver,
+                 batch_size: int = 50, max_in_flight: int = 100, per_user_concurrency: int = 2, max_attempts: int = 8,
+                 backoff_base_seconds: float = 30.0, backoff_max_seconds: float = 3600.0,
+                 quota_pause_seconds: float = 60.0, poll_interval: float = 1.0,
+                 lease_seconds: float = 300.0, metrics_interval: float = 15.0):
+        self.outbox_repository = outbox_repository
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.max_in_flight = max(1, max_in_flight)
+        self.per_user_concurrency = per_user_concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.quota_pause_seconds = quota_pause_seconds
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.metrics_interval = metrics_interval
+        self._metrics_published_at = 0.0
+        self._user_slots: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.per_user_concurrency))
+        self._paused_until: Dict[str, float] = {}
+
+    async def run(self) -> None:
+        """Sends until cancelled; sends still in flight then are cancelled and their leases run out."""
+        in_flight: Set[asyncio.Task] = set()
+        next_claim_at = 0.0
+        try:
+            while True:
+                wanted = min(self.batch_size, self.max_in_flight - len(in_flight))
+                if wanted > 0 and time.monotonic() >= next_claim_at:
+                    batch = await self.outbox_repository.claim_due(wanted, self.lease_seconds)
+                    in_flight.update(asyncio.create_task(self._send(message)) for message in batch)
+                    # A short batch means nothing else is due; look again after the poll interval.
+                    next_claim_at = 0.0 if len(batch) == wanted else time.monotonic() + self.poll_interval
+                if time.monotonic() - self._metrics_published_at >= self.metrics_interval:
+                    await self.publish_metrics()
+                full = len(in_flight) >= self.max_in_flight
+                if not next_claim_at and not full:
+                    continue
+                delay = self.poll_interval if full or not next_claim_at else max(0.0, next_claim_at - time.monotonic())
+                if not in_flight:
+                    await asyncio.sleep(delay)
+                    continue
+                done, in_flight = await asyncio.wait(in_flight, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        print(f"Error sending outbox message: {task.exception()!r}")
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def publish_metrics(self) -> None:
+        self._metrics_published_at = time.monotonic()
+        counts = await self.outbox_repository.count_by_status()
+        for status in ("pending", "sent", "failed"):
+            OUTBOX_MESSAGES.set(counts.get(status, 0), status=status)
+        QUEUE_DEPTH.set(counts.get("pending", 0), queue="outbox")
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _send(self, message: OutboxMessage) -> None:
+        paused_until = self._paused_until.get(message.user_email, 0.0)
+        if paused_until > time.monotonic():
+            await self._defer(message, paused_until - time.monotonic(), message.last_error)
+            return
+
+        async with self._user_slots[message.user_email]:
+            try:
+                gmail_message_id = await self.deliver(message)
+            except DeliveryError as e:
+                await self._handle_failure(message, e)
+                return
+            except Exception as e:
+                await self._handle_failure(message, DeliveryError(str(e)))
+                return
+
+        await self.outbox_repository.mark_sent(message.id, gmail_message_id)
+        OUTBOX_SENDS_TOTAL.inc(outcome="sent")
+
+    async def _handle_failure(self, message: OutboxMessage, error: DeliveryError) -> None:
+        if error.quota:
+            pause = error.retry_after or self.quota_pause_seconds
+            self._paused_until[message.user_email] = time.monotonic() + pause
+            print(f"Gmail quota hit for {message.user_email}, pausing sends for {pause:.0f}s: {error}")
+            await self._defer(message, pause, str(error))
+            return
+
+        if not error.retryable or message.attempts >= self.max_attempts:
+            await self.outbox_repository.mark_failed(message.id, str(error))
+            OUTBOX_SENDS_TOTAL.inc(outcome="failed")
+            print(f"Giving up on outbox message {message.id} to {message.to} "
+                  f"after {message.attempts} attempts: {error}")
+            return
+
+        delay = error.retry_after or self._backoff(message.attempts)
+        await self.outbox_repository.reschedule(
+            message.id, datetime.datetime.utcnow() + datetime.timedelta(seconds=delay), str(error))
+        OUTBOX_SENDS_TOTAL.inc(outcome="retry")
+
+    async def _defer(self, message: OutboxMessage, delay: float, error: Optional[str]) -> None:
+        await self.outbox_repository.reschedule(
+            message.id, datetime.datetime.utcnow() + datetime.timedelta(seconds=delay), error,
+            count_attempt=False)
+        OUTBOX_SENDS_TOTAL.inc(outcome="quota_deferred")
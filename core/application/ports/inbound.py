@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+from core.application.schema import EmailData
 from core.domain.entity import Email, User
 
 
@@ -48,7 +50,55 @@ class IEmailServicePort(ABC):
     @abstractmethod
     async def get_emails(self, receiver_email: str, skip: int, limit: int) -> List[Email]:
         pass
+
+    @abstractmethod
+    async def get_email_rows(self, receiver_email: str, skip: int, limit: int) -> List[dict]:
+        pass
     
+    @abstractmethod
+    def export_email_rows(self, receiver_email: str, since: Optional[datetime.datetime] = None,
+                          until: Optional[datetime.datetime] = None, batch_size: int = 1000) -> AsyncIterator[dict]:
+        pass
+
+    @abstractmethod
+    async def get_emails_after(self, receiver_email: str, after_id: int, limit: int) -> List[Email]:
+        pass
+
+    @abstractmethod
+    async def search_emails(self, receiver_email: str, query: str, limit: int, offset: int) -> List[Email]:
+        pass
+
+    @abstractmethod
+    async def get_unread_count(self, receiver_email: str) -> int:
+        pass
+
+    @abstractmethod
+    async def set_read_state(self, receiver_email: str, read: bool, ids: Optional[List[int]] = None,
+                             up_to_id: Optional[int] = None) -> int:
+        pass
+
     @abstractmethod
     async def get_latest_email_by_date(self, receiver_email: str) -> Optional[Email]:
         pass
+
+    @abstractmethod
+    async def list_messages_page(self, user: User, query: str, page_token: Optional[str], page_size: int,
+                                 reserve: float = 0.0) -> Tuple[List[str], Optional[str], Optional[int]]:
+        pass
+
+    @abstractmethod
+    async def get_messages_batch(self, user: User, message_ids: List[str], reserve: float = 0.0) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def summarize_emails(self, emails: List[EmailData]) -> List[Optional[Dict[str, str]]]:
+        pass
+
+    @abstractmethod
+    async def filter_imported_messages(self, user: User, message_ids: List[str]) -> List[str]:
+        pass
+
+    @abstractmethod
+    async def store_backfilled_email(self, user: User, message: dict, email_data: EmailData,
+                                     summary: Dict[str, str]) -> bool:
+        pass
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+import datetime
+from typing import AsyncIterator, Dict, List, Optional
 
-from core.domain.entity import Email, User
+from core.domain.entity import BackfillJob, Email, OutboxMessage, User
 
 
 class IUserRepositoryPort(ABC):
@@ -26,13 +27,147 @@ class IUserRepositoryPort(ABC):
         pass
 
     @abstractmethod
-    async def set_email_history(self, email: Email) -> None:
+    async def set_email_history(self, email: Email, gmail_message_id: Optional[str] = None) -> Optional[Email]:
+        """
+        Stores the email. With `gmail_message_id`, it is stored only if that
+        message was not stored for the receiver before; None means it was.
+        """
+        pass
+
+    @abstractmethod
+    async def filter_imported(self, receiver_email: str, gmail_message_ids: List[str]) -> List[str]:
+        """The given Gmail message ids that were not stored for the receiver yet, in order."""
         pass
 
     @abstractmethod
     async def get_emails(self, receiver_email: str, skip: int, limit: int) -> List[Email]:
         pass
 
+    @abstractmethod
+    async def get_email_rows(self, receiver_email: str, skip: int, limit: int) -> List[dict]:
+        """The same page as `get_emails`, as plain dicts of Email fields ready for JSON encoding."""
+        pass
+
+    @abstractmethod
+    def stream_email_rows(self, receiver_email: str, since: Optional[datetime.datetime] = None,
+                          until: Optional[datetime.datetime] = None, batch_size: int = 1000) -> AsyncIterator[dict]:
+        """
+        Every email of the receiver dated from `since` up to, not including,
+        `until`, hot then archived, newest first, as dicts like get_email_rows.
+        Read `batch_size` rows at a time; an email the retention job archives
+        during the export is still returned once.
+        """
+        pass
+
     @abstractmethod
     async def get_latest_email_by_date(self, receiver_email: str) -> Optional[Email]:
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    async def get_emails_after(self, receiver_email: str, after_id: int, limit: int) -> List[Email]:
+        """Emails with an id greater than `after_id`, oldest first."""
+        pass
+
+    @abstractmethod
+    async def search_emails(self, receiver_email: str, query: str, limit: int, offset: int) -> List[Email]:
+        """
+        Emails whose title or summary match every term of `query`, best match
+        first; archived matches come after all hot ones.
+        """
+        pass
+
+    @abstractmethod
+    async def get_unread_count(self, receiver_email: str) -> int:
+        pass
+
+    @abstractmethod
+    async def set_read_state(self, receiver_email: str, read: bool, ids: Optional[List[int]] = None,
+                             up_to_id: Optional[int] = None) -> int:
+        """
+        Marks the given ids, or every email with an id up to `up_to_id`, as
+        read or unread and returns how many rows changed.
+        """
+        pass
+
+    @abstractmethod
+    async def archive_emails_before(self, receiver_email: str, cutoff: datetime.datetime, limit: int) -> int:
+        """
+        Moves up to `limit` of the receiver's emails dated before `cutoff` into
+        the archive and returns how many moved. Archived emails are still
+        returned by `get_emails` and by search, but no longer counted as unread.
+        """
+        pass
+
+    @abstractmethod
+    async def compact_storage(self) -> None:
+        """Reclaims the space left behind by archived emails."""
+        pass
+
+
+class ILeaseRepositoryPort(ABC):
+    @abstractmethod
+    async def try_acquire(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """Takes or renews the named lease; returns whether `holder` now owns it."""
+        pass
+
+    @abstractmethod
+    async def release(self, name: str, holder: str) -> None:
+        pass
+
+    @abstractmethod
+    async def any_held(self, prefix: str) -> bool:
+        """Whether any unexpired lease has a name starting with `prefix`."""
+        pass
+
+
+class IOutboxRepositoryPort(ABC):
+    @abstractmethod
+    async def enqueue(self, message: OutboxMessage) -> OutboxMessage:
+        pass
+
+    @abstractmethod
+    async def claim_due(self, limit: int, lease_seconds: float) -> List[OutboxMessage]:
+        """
+        Claims up to `limit` pending messages whose next attempt is due and
+        counts the attempt. A claimed message becomes due again after
+        `lease_seconds` unless it is marked sent, rescheduled or failed.
+        """
+        pass
+
+    @abstractmethod
+    async def mark_sent(self, message_id: int, gmail_message_id: str) -> None:
+        pass
+
+    @abstractmethod
+    async def reschedule(self, message_id: int, next_attempt_at: datetime.datetime,
+                         error: Optional[str] = None, count_attempt: bool = True) -> None:
+        pass
+
+    @abstractmethod
+    async def mark_failed(self, message_id: int, error: str) -> None:
+        pass
+
+    @abstractmethod
+    async def count_by_status(self) -> Dict[str, int]:
+        pass
+
+
+class IBackfillRepositoryPort(ABC):
+    @abstractmethod
+    async def create(self, job: BackfillJob) -> BackfillJob:
+        """Stores a new job, or returns the user's existing one unchanged."""
+        pass
+
+    @abstractmethod
+    async def get(self, user_email: str) -> Optional[BackfillJob]:
+        pass
+
+    @abstractmethod
+    async def next_unfinished(self) -> Optional[BackfillJob]:
+        """The oldest pending or interrupted job."""
+        pass
+
+    @abstractmethod
+    async def save(self, job: BackfillJob) -> None:
+        """Writes the job's progress as its new checkpoint."""
+        pass
@@ -0,0 +1,231 @@
+import asyncio
+import functools
+import inspect
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from config import (PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_BYTES,
+                    PROFILE_MAX_SECONDS, PROFILE_MIN_DURATION_MS,
+                    PROFILE_SAMPLE_RATE, PROFILE_TARGETS, PROFILING_ENABLED)
+from core.application.metrics import REGISTRY
+
+PROFILES_TOTAL = REGISTRY.counter(
+    "taskpilot_profiles_total", "Profiles recorded, by kind and whether they were kept.", ["kind", "outcome"])
+
+PROFILE_SUFFIX = ".folded"
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Longest first, so site-packages wins over the interpreter prefix it sits in.
+_PATH_PREFIXES = sorted({os.path.abspath(path) + os.sep for path in [_ROOT, *sys.path] if path},
+                        key=len, reverse=True)
+
+
+@functools.lru_cache(maxsize=4096)
+def _frame_name(code: Any) -> str:
+    filename = code.co_filename
+    prefix = next((prefix for prefix in _PATH_PREFIXES if filename.startswith(prefix)), "")
+    # ";" separates frames in the folded format.
+    return f"{code.co_name} ({filename[len(prefix):]}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _running_stack(frame: Any, task_frame: Any) -> List[str]:
+    """Frames from the task's coroutine down to `frame`, dropping the event loop frames above it."""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame.f_code))
+        if frame is task_frame:
+            break
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _awaiting_stack(coro: Any) -> List[str]:
+    """The chain of coroutines a suspended task is awaiting, outermost first, ending at what it waits on."""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            stack.append(f"[{type(coro).__name__}]")
+            break
+        stack.append(_frame_name(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+class Profile:
+    def __init__(self, kind: str, target: str, task: asyncio.Task, max_seconds: float):
+        self.kind = kind
+        self.target = target
+        self.task = task
+        self.started = time.monotonic()
+        self.created_at = time.time()
+        self.deadline = self.started + max_seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """
+    Statistical profiler for single requests and jobs on the event loop.
+    While a profile is open, a sampler thread looks at the loop thread every
+    `interval_ms`. When the profiled task is running, the sample is its
+    Python stack, under a "running" root. When it is suspended, the sample
+    is the coroutine chain it awaits, under "waiting", so slow I/O shows up
+    as well as CPU. Work the task hands to other tasks or threads is not
+    attributed to it.
+
+    Profiles are written in the folded-stack format read by flamegraph.pl,
+    speedscope and inferno. The oldest files are deleted once the directory
+    holds more than `max_bytes`.
+    """
+
+    def __init__(self, enabled: bool, directory: str, sample_rate: float = 0.0, targets: str = "",
+                 interval_ms: float = 5.0, max_seconds: float = 60.0, min_duration_ms: float = 0.0,
+                 max_bytes: int = 50 * 1024 * 1024):
+        self.enabled = enabled
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.targets = [target.strip() for target in targets.split(",") if target.strip()]
+        self.interval = interval_ms / 1000
+        self.max_seconds = max_seconds
+        self.min_duration_ms = min_duration_ms
+        self.max_bytes = max_bytes
+        self._active: Dict[asyncio.Task, Profile] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._write_lock = threading.Lock()
+
+    def selects(self, target: str, forced: bool = False) -> bool:
+        """Whether to profile `target` (a request path or job name): always when forced, else by sampling."""
+        if not self.enabled:
+            return False
+        if forced:
+            return True
+        if self.targets and not any(target.startswith(prefix) for prefix in self.targets):
+            return False
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, kind: str, target: str) -> Optional[Profile]:
+        """Opens a profile for the current task; None when it already has one."""
+        task = asyncio.current_task()
+        if task is None or task in self._active:
+            return None
+        profile = Profile(kind, target, task, self.max_seconds)
+        with self._lock:
+            self._active[task] = profile
+            if self._sampler is None:
+                self._loop = asyncio.get_running_loop()
+                self._loop_thread_id = threading.get_ident()
+                self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._sampler.start()
+        return profile
+
+    async def finish(self, profile: Profile, **labels: Any) -> Optional[str]:
+        """Closes the profile and writes it unless it was faster than min_duration_ms; returns the file name."""
+        with self._lock:
+            self._active.pop(profile.task, None)
+        duration_ms = (time.monotonic() - profile.started) * 1000
+        if duration_ms < self.min_duration_ms or not profile.samples:
+            PROFILES_TOTAL.inc(kind=profile.kind, outcome="discarded")
+            return None
+        suffix = "".join(f"-{value}" for value in labels.values())
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{int(profile.created_at * 1000)}-{profile.kind}-"
+                      f"{profile.target.strip('/')}{suffix}-{duration_ms:.0f}ms")[:180] + PROFILE_SUFFIX
+        try:
+            await asyncio.to_thread(self._write, name, profile.folded())
+        except OSError as e:
+            print(f"Error writing profile {name}: {e}")
+            return None
+        PROFILES_TOTAL.inc(kind=profile.kind, outcome="kept")
+        return name
+
+    def profiled(self, name: str):
+        """Decorator profiling a coroutine function when `name` is selected."""
+        def decorator(func):
+            if not inspect.iscoroutinefunction(func):
+                raise TypeError("profiled() only wraps coroutine functions")
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                profile = self.start("job", name) if self.selects(name) else None
+                if profile is None:
+                    return await func(*args, **kwargs)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    await self.finish(profile)
+            return wrapper
+        return decorator
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Stored profiles, newest first."""
+        files = []
+        for entry in self._entries()[-limit:]:
+            files.append({"name": entry.name, "bytes": entry.stat().st_size,
+                          "created": entry.stat().st_mtime})
+        return list(reversed(files))
+
+    def path_of(self, name: str) -> Optional[str]:
+        """Path of a stored profile, or None for anything that is not one."""
+        if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def _entries(self) -> List[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as entries:
+                files = [entry for entry in entries if entry.is_file() and entry.name.endswith(PROFILE_SUFFIX)]
+        except FileNotFoundError:
+            return []
+        return sorted(files, key=lambda entry: entry.name)
+
+    def _write(self, name: str, folded: str) -> None:
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, name), "w", encoding="utf-8") as profile_file:
+                profile_file.write(folded)
+            entries = self._entries()
+            total = sum(entry.stat().st_size for entry in entries)
+            for entry in entries[:-1]:
+                if total <= self.max_bytes:
+                    break
+                total -= entry.stat().st_size
+                os.remove(entry.path)
+
+    def _sample_loop(self) -> None:
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", {})
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                running = current_tasks.get(self._loop)
+                frame = sys._current_frames().get(self._loop_thread_id)
+                now = time.monotonic()
+                for task, profile in self._active.items():
+                    if now > profile.deadline:
+                        continue
+                    coro = task.get_coro()
+                    if task is running and frame is not None:
+                        stack = ["running"] + _running_stack(frame, getattr(coro, "cr_frame", None))
+                    else:
+                        stack = ["waiting"] + _awaiting_stack(coro)
+                    profile.stacks[";".join(stack)] += 1
+                    profile.samples += 1
+
+
+PROFILER = Profiler(PROFILING_ENABLED, PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_TARGETS, PROFILE_INTERVAL_MS,
+                    PROFILE_MAX_SECONDS, PROFILE_MIN_DURATION_MS, PROFILE_MAX_BYTES)
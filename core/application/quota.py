@@ -0,0 +1,140 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from core.application.metrics import REGISTRY
+
+# Gmail API quota units per call, from the Gmail usage limits table.
+GMAIL_METHOD_UNITS = {
+    "list": 5,
+    "get": 5,
+    "modify": 5,
+    "send": 100,
+    "watch": 100,
+    "history": 2,
+}
+DEFAULT_METHOD_UNITS = 5
+
+GMAIL_QUOTA_UNITS_TOTAL = REGISTRY.counter(
+    "taskpilot_gmail_quota_units_total", "Gmail quota units spent, by method.", ["method"])
+GMAIL_QUOTA_THROTTLED_TOTAL = REGISTRY.counter(
+    "taskpilot_gmail_quota_throttled_total", "Gmail rate-limit responses, by quota scope.", ["scope"])
+GMAIL_QUOTA_DEFERRED_TOTAL = REGISTRY.counter(
+    "taskpilot_gmail_quota_deferred_total", "Gmail calls deferred instead of waiting for quota, by method.", ["method"])
+
+
+class QuotaDeferred(Exception):
+    """Raised instead of waiting when quota frees up too late; retry the work after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Refills at `rate` units per second up to `capacity`. Taking more than
+    is available leaves a debt that later callers wait out. The rate is
+    halved on every rate-limit response and grows back a step per success,
+    never past the configured rate.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 min_rate_fraction: float = 0.1, recovery_fraction: float = 0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.min_rate = rate * min_rate_fraction
+        self.recovery = rate * recovery_fraction
+        self.paused_until = 0.0
+        self.throttles = 0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, units: float, now: float, reserve: float = 0.0) -> float:
+        """Seconds until `units` can be taken while leaving `reserve` of the capacity untouched."""
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        needed = units + reserve * self.capacity
+        if needed > self.tokens:
+            wait = max(wait, (needed - self.tokens) / self.rate)
+        return wait
+
+    def take(self, units: float) -> None:
+        self.tokens -= units
+
+    def throttle(self, pause: float, now: float) -> None:
+        self.throttles += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+        self.paused_until = max(self.paused_until, now + pause)
+
+    def recover(self) -> None:
+        self.throttles = 0
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.recovery)
+
+
+class QuotaAccountant:
+    """
+    Charges every Gmail call its unit cost against a token bucket for the
+    user and one for the project. A call waits for quota when it will be
+    available within `max_wait` seconds and raises QuotaDeferred otherwise,
+    so callers can requeue the work instead of holding a worker or dropping
+    it. Buckets live in this process: with several processes, set the
+    project rate to each process's share.
+    """
+
+    def __init__(self, user_units_per_second: float = 250.0, project_units_per_second: float = 20000.0,
+                 max_wait: float = 5.0, backoff_base_seconds: float = 2.0, backoff_max_seconds: float = 300.0):
+        self.user_units_per_second = user_units_per_second
+        self.max_wait = max_wait
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.project = TokenBucket(project_units_per_second)
+        self._users: Dict[str, TokenBucket] = {}
+
+    def _user(self, user_email: str) -> TokenBucket:
+        bucket = self._users.get(user_email)
+        if bucket is None:
+            bucket = self._users[user_email] = TokenBucket(self.user_units_per_second)
+        return bucket
+
+    async def acquire(self, user_email: str, method: str, reserve: float = 0.0,
+                      max_wait: Optional[float] = None) -> None:
+        """
+        `reserve` is the fraction of each bucket background work must leave
+        for live calls; `max_wait` overrides the accountant's default.
+        """
+        units = GMAIL_METHOD_UNITS.get(method, DEFAULT_METHOD_UNITS)
+        user = self._user(user_email)
+        now = time.monotonic()
+        wait = max(user.wait_time(units, now, reserve), self.project.wait_time(units, now, reserve))
+        if wait > (self.max_wait if max_wait is None else max_wait):
+            GMAIL_QUOTA_DEFERRED_TOTAL.inc(method=method)
+            raise QuotaDeferred(f"Gmail quota for {user_email} frees up in {wait:.1f}s", wait)
+        user.take(units)
+        self.project.take(units)
+        GMAIL_QUOTA_UNITS_TOTAL.inc(units, method=method)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def succeeded(self, user_email: str) -> None:
+        self._user(user_email).recover()
+        self.project.recover()
+
+    def throttled(self, user_email: str, retry_after: Optional[float] = None, project: bool = False) -> float:
+        """
+        Records a 429/rateLimitExceeded response and returns how long the
+        affected bucket is paused: `retry_after` when Gmail sent one, else an
+        exponential backoff over consecutive throttles.
+        """
+        bucket = self.project if project else self._user(user_email)
+        pause = retry_after or min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** bucket.throttles)
+        bucket.throttle(pause, time.monotonic())
+        GMAIL_QUOTA_THROTTLED_TOTAL.inc(scope="project" if project else "user")
+        return pause
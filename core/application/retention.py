@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+from typing import Dict, Optional
+
+from core.application.metrics import REGISTRY
+from core.application.ports.outbound import IUserRepositoryPort
+
+ARCHIVED_EMAILS_TOTAL = REGISTRY.counter(
+    "taskpilot_archived_emails_total", "Emails moved from the hot table into the archive.")
+
+
+class RetentionPolicy:
+    """
+    How many days of email stay in the hot table. Overrides are keyed by a
+    user's email address or by "@domain" for every user of that domain;
+    0 days keeps a user's email hot forever.
+    """
+
+    def __init__(self, hot_days: int, overrides: Optional[Dict[str, int]] = None):
+        self.hot_days = hot_days
+        self.overrides = overrides or {}
+
+    @classmethod
+    def parse(cls, hot_days: int, overrides: str) -> "RetentionPolicy":
+        """Reads overrides written as "alice@example.com=365,@example.org=30"."""
+        parsed = {}
+        for item in filter(None, (part.strip() for part in overrides.split(","))):
+            key, _, days = item.partition("=")
+            parsed[key.strip().lower()] = int(days)
+        return cls(hot_days, parsed)
+
+    def hot_days_for(self, user_email: str) -> int:
+        user_email = user_email.lower()
+        if user_email in self.overrides:
+            return self.overrides[user_email]
+        return self.overrides.get("@" + user_email.rpartition("@")[2], self.hot_days)
+
+    def cutoff_for(self, user_email: str, now: datetime.datetime) -> Optional[datetime.datetime]:
+        days = self.hot_days_for(user_email)
+        return now - datetime.timedelta(days=days) if days > 0 else None
+
+
+class RetentionJob:
+    """
+    Archives each user's email older than their hot window in batches of
+    `batch_size`, one transaction per batch so locks stay short, then
+    compacts storage once at least `compact_min_rows` rows have moved.
+    """
+
+    def __init__(self, user_repository: IUserRepositoryPort, policy: RetentionPolicy,
+                 batch_size: int = 500, compact_min_rows: int = 10000):
+        self.user_repository = user_repository
+        self.policy = policy
+        self.batch_size = batch_size
+        self.compact_min_rows = compact_min_rows
+
+    async def run_once(self, now: Optional[datetime.datetime] = None) -> int:
+        """Archives everything currently due; returns how many emails moved."""
+        now = now or datetime.datetime.utcnow()
+        total = 0
+        for user in await self.user_repository.get_users():
+            cutoff = self.policy.cutoff_for(user.email, now)
+            if cutoff is None:
+                continue
+            while True:
+                moved = await self.user_repository.archive_emails_before(user.email, cutoff, self.batch_size)
+                total += moved
+                ARCHIVED_EMAILS_TOTAL.inc(moved)
+                if moved < self.batch_size:
+                    break
+                # Let request handlers in; a backlog can take many batches.
+                await asyncio.sleep(0)
+
+        if total:
+            print(f"Archived {total} emails")
+        if total and total >= self.compact_min_rows:
+            await self.user_repository.compact_storage()
+            print("Compacted email storage")
+        return total
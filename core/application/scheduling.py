@@ -0,0 +1,269 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict, defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import (SCHEDULER_AGING_SECONDS, SCHEDULER_CONCURRENCY,
+                    SCHEDULER_MAX_QUEUED, SCHEDULER_USER_WEIGHTS, VIP_SENDERS)
+from core.application.metrics import QUEUE_DEPTH, REGISTRY
+from core.application.schema import EmailData, EmailPriority
+from core.domain.entity import User
+
+# Dispatch order: every class is drained before the next, apart from aging.
+PRIORITY_ORDER = (EmailPriority.HIGH, EmailPriority.MEDIUM, EmailPriority.LOW)
+PRIORITY_LEVELS = {EmailPriority.LOW: 0, EmailPriority.MEDIUM: 1, EmailPriority.HIGH: 2}
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+EMAIL_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "taskpilot_email_queue_wait_seconds", "Time fetched emails waited for a scheduler worker, by priority.",
+    ["priority"], LATENCY_BUCKETS)
+EMAIL_SCHEDULED_SECONDS = REGISTRY.histogram(
+    "taskpilot_email_scheduled_seconds", "Time from fetch until processing finished, by priority.",
+    ["priority"], LATENCY_BUCKETS)
+EMAIL_SCHEDULER_AGED_TOTAL = REGISTRY.counter(
+    "taskpilot_email_scheduler_aged_total", "Emails dispatched ahead of higher priorities after waiting too long.",
+    ["priority"])
+
+
+def _parse_level(priority: Optional[str]) -> Optional[int]:
+    try:
+        return PRIORITY_LEVELS[EmailPriority((priority or "").lower())]
+    except ValueError:
+        return None
+
+
+class SenderHistory:
+    """
+    Moving average of the priority the model gave each sender's past email,
+    per receiver, for the `max_entries` most recently seen pairs.
+    """
+
+    def __init__(self, max_entries: int = 10000, smoothing: float = 0.3):
+        self.max_entries = max_entries
+        self.smoothing = smoothing
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+    def record(self, receiver_email: str, sender_email: str, priority: Optional[str]) -> None:
+        level = _parse_level(priority)
+        if level is None:
+            return
+        key = (receiver_email, sender_email.lower())
+        previous = self._scores.pop(key, None)
+        self._scores[key] = level if previous is None else previous + self.smoothing * (level - previous)
+        if len(self._scores) > self.max_entries:
+            self._scores.popitem(last=False)
+
+    def score(self, receiver_email: str, sender_email: str) -> Optional[float]:
+        return self._scores.get((receiver_email, sender_email.lower()))
+
+
+class VipList:
+    """
+    Senders whose email is always high priority. Entries are a sender
+    address or "@domain", optionally scoped to one user as "user=sender".
+    """
+
+    def __init__(self, entries: str = ""):
+        self._global = set()
+        self._per_user: Dict[str, set] = defaultdict(set)
+        for entry in filter(None, (part.strip().lower() for part in entries.split(","))):
+            user, _, sender = entry.rpartition("=")
+            (self._per_user[user] if user else self._global).add(sender)
+
+    def matches(self, user_email: str, sender_email: str) -> bool:
+        sender = sender_email.lower()
+        domain = "@" + sender.rpartition("@")[2]
+        scoped = self._per_user.get(user_email.lower(), ())
+        return any(key in self._global or key in scoped for key in (sender, domain))
+
+
+def classify_priority(user_email: str, email_data: EmailData, vips: VipList,
+                      history: SenderHistory) -> EmailPriority:
+    """
+    VIP senders are high. Otherwise the Priority header, raised to how the
+    model has rated this sender's mail so far.
+    """
+    if vips.matches(user_email, email_data.senderEmail):
+        return EmailPriority.HIGH
+    level = PRIORITY_LEVELS[email_data.priority]
+    past = history.score(user_email, email_data.senderEmail)
+    if past is not None:
+        level = max(level, round(past))
+    return next(priority for priority, value in PRIORITY_LEVELS.items() if value == level)
+
+
+class SchedulerStopped(Exception):
+    """The scheduler stopped before processing a queued email; have its notification redelivered."""
+
+
+class ScheduledEmail:
+    """
+    A fetched email waiting for a worker. `done` resolves once it has been
+    processed, with the handler's error if it failed, so the notification
+    is acknowledged only after the work.
+    """
+
+    def __init__(self, user: User, email_data: EmailData, history_id: str, priority: EmailPriority):
+        self.user = user
+        self.email_data = email_data
+        self.history_id = history_id
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def resolve(self, error: Optional[BaseException] = None) -> None:
+        if self.done.done():
+            # The waiting caller went away; nothing to report to.
+            return
+        if error is None:
+            self.done.set_result(None)
+        else:
+            self.done.set_exception(error)
+
+
+Handler = Callable[[ScheduledEmail], Awaitable[None]]
+
+
+class PriorityScheduler:
+    """
+    Holds fetched emails until one of `concurrency` workers processes them.
+    Higher priorities go first. An email that has waited `aging_seconds`
+    goes ahead anyway, so low priority mail is delayed but never starved.
+    Within a priority, users share workers by weighted fair queuing: each
+    email gets a virtual finish tag of max(class clock, user's last tag) +
+    1/weight. A user with a thousand queued emails then takes turns with
+    everyone else instead of going first.
+    """
+
+    def __init__(self, concurrency: int = 4, max_queued: int = 10000, aging_seconds: float = 60.0,
+                 user_weights: Optional[Dict[str, float]] = None):
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.aging_seconds = aging_seconds
+        self.user_weights = user_weights or {}
+        self._queues: Dict[EmailPriority, List[Tuple[float, int, ScheduledEmail]]] = {p: [] for p in PRIORITY_ORDER}
+        self._clock: Dict[EmailPriority, float] = {p: 0.0 for p in PRIORITY_ORDER}
+        self._last_tag: Dict[Tuple[EmailPriority, str], float] = {}
+        self._queued_per_user: Dict[Tuple[EmailPriority, str], int] = defaultdict(int)
+        self._sequence = itertools.count()
+        self._available: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._in_flight = 0
+        self.handler: Optional[Handler] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def busy(self) -> bool:
+        """Whether any email is queued or being processed."""
+        return bool(self._in_flight or len(self))
+
+    def start(self, handler: Handler) -> None:
+        self.handler = handler
+        self._available = asyncio.Semaphore(0)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """
+        Waits up to `timeout` for queued emails to finish, then stops the
+        workers. Emails left over fail with SchedulerStopped.
+        """
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Priority scheduler stopping with {len(self)} emails still queued")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for priority in PRIORITY_ORDER:
+            queue, self._queues[priority] = self._queues[priority], []
+            for _, _, item in queue:
+                item.resolve(SchedulerStopped("The email scheduler stopped before processing the email"))
+            self._publish_depth(priority)
+        self._queued_per_user.clear()
+        self._last_tag.clear()
+
+    def submit(self, item: ScheduledEmail) -> bool:
+        """
+        Queues an email; False when the scheduler is stopped or full and the
+        caller should process it itself. Await `item.done` for the outcome.
+        """
+        if not self._workers or len(self) >= self.max_queued:
+            return False
+        priority, user_email = item.priority, item.user.email
+        weight = self.user_weights.get(user_email, 1.0)
+        tag = max(self._clock[priority], self._last_tag.get((priority, user_email), 0.0)) + 1.0 / weight
+        self._last_tag[(priority, user_email)] = tag
+        self._queued_per_user[(priority, user_email)] += 1
+        heapq.heappush(self._queues[priority], (tag, next(self._sequence), item))
+        self._publish_depth(priority)
+        self._idle.clear()
+        self._available.release()
+        return True
+
+    def _pop(self) -> ScheduledEmail:
+        now = time.monotonic()
+        chosen = None
+        for priority in PRIORITY_ORDER[1:]:
+            queue = self._queues[priority]
+            if queue and now - queue[0][2].enqueued_at >= self.aging_seconds:
+                chosen = priority
+                EMAIL_SCHEDULER_AGED_TOTAL.inc(priority=priority.value)
+                break
+        if chosen is None:
+            chosen = next(priority for priority in PRIORITY_ORDER if self._queues[priority])
+
+        tag, _, item = heapq.heappop(self._queues[chosen])
+        self._clock[chosen] = max(self._clock[chosen], tag)
+        key = (chosen, item.user.email)
+        self._queued_per_user[key] -= 1
+        if not self._queued_per_user[key]:
+            # Nothing of this user's left in the class: its tag is now at or below the clock.
+            del self._queued_per_user[key]
+            self._last_tag.pop(key, None)
+        self._publish_depth(chosen)
+        return item
+
+    def _publish_depth(self, priority: EmailPriority) -> None:
+        QUEUE_DEPTH.set(len(self._queues[priority]), queue=f"priority-{priority.value}")
+
+    async def _work(self) -> None:
+        while True:
+            await self._available.acquire()
+            item = self._pop()
+            self._in_flight += 1
+            EMAIL_QUEUE_WAIT_SECONDS.observe(time.monotonic() - item.enqueued_at, priority=item.priority.value)
+            try:
+                await self.handler(item)
+            except asyncio.CancelledError:
+                item.resolve(SchedulerStopped("The email scheduler stopped while processing the email"))
+                raise
+            except Exception as e:
+                print(f"Error processing scheduled email {item.email_data.id} for {item.user.email}: {e}")
+                item.resolve(e)
+            else:
+                item.resolve()
+            finally:
+                self._in_flight -= 1
+                EMAIL_SCHEDULED_SECONDS.observe(time.monotonic() - item.enqueued_at, priority=item.priority.value)
+                if not self._in_flight and not len(self):
+                    self._idle.set()
+
+
+SENDER_HISTORY = SenderHistory()
+VIP_LIST = VipList(VIP_SENDERS)
+EMAIL_SCHEDULER = PriorityScheduler(SCHEDULER_CONCURRENCY, SCHEDULER_MAX_QUEUED,
+                                    SCHEDULER_AGING_SECONDS, SCHEDULER_USER_WEIGHTS)
@@ -1,7 +1,8 @@
+import datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class EmailPriority(str, Enum):
@@ -22,3 +23,32 @@ class EmailData(BaseModel):
 class EmailHistoryRequest(BaseModel):
     email: str
     history_id: str
+
+
+class ReadStateRequest(BaseModel):
+    """Either explicit email ids or every email up to and including `up_to_id`."""
+    ids: Optional[List[int]] = Field(None, max_length=1000)
+    up_to_id: Optional[int] = None
+    read: bool = True
+
+    @model_validator(mode="after")
+    def check_selector(self):
+        if (self.ids is None) == (self.up_to_id is None):
+            raise ValueError("Provide exactly one of ids or up_to_id")
+        return self
+
+
+class BackfillProgress(BaseModel):
+    """Progress of a user's onboarding import; `estimated_total` is Gmail's estimate and may be off."""
+    status: str
+    since: datetime.datetime
+    pages: int
+    imported: int
+    failed: int
+    estimated_total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
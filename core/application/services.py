@@ -1,24 +1,128 @@
+import asyncio
 import base64
 import datetime
+import functools
+import json
 import uuid
-from typing import Any, Dict, List, Optional
+import zoneinfo
+from typing import (Any, AsyncIterator, Callable, Dict, List, Optional,
+                    Tuple)
 
-import dateparser
-import googleapiclient
 from fastapi import HTTPException
-from google import genai
-from google.auth.transport.requests import Request
-from google.genai import types
-from google.oauth2 import credentials
-from googleapiclient.discovery import build
 
-from config import (GEMINI_API_KEY, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET,
+from config import (CALENDAR_API_ENDPOINT, DEFAULT_TIMEZONE,
+                    FREEBUSY_HORIZON_DAYS, FREEBUSY_TTL_SECONDS,
+                    GEMINI_API_KEY, GEMINI_BASE_URL, GEMINI_MODEL,
+                    GMAIL_API_ENDPOINT,
+                    GMAIL_PROJECT_QUOTA_UNITS_PER_SECOND,
+                    GMAIL_QUOTA_MAX_WAIT_SECONDS,
+                    GMAIL_USER_QUOTA_UNITS_PER_SECOND, GOOGLE_CLIENT_ID,
+                    GOOGLE_CLIENT_SECRET,
+                    MEETING_WORKDAY_END_HOUR, MEETING_WORKDAY_START_HOUR,
                     PROJECT_ID, TOPIC_NAME)
-from core.application.helper import generate_no_rescheduled_email
+from core.application.availability import (FreeBusyCache, Interval,
+                                           working_hours)
+from core.application.dateparsing import (dateparser_date,
+                                          parse_meeting_datetime)
+from core.application.events import EMAIL_EVENTS
+from core.application.helper import (MEETING_LINK_PLACEHOLDER,
+                                     generate_alternative_time_email,
+                                     generate_meeting_confirmation_email,
+                                     generate_no_rescheduled_email,
+                                     render_meeting_confirmation)
+from core.application.lazy import LazyModule, preload
+from core.application.metrics import (CALENDAR_REQUEST_SECONDS,
+                                      EMAIL_ACTIONS_TOTAL,
+                                      GEMINI_REQUEST_SECONDS,
+                                      GMAIL_REQUEST_SECONDS,
+                                      NOTIFICATION_SECONDS,
+                                      NOTIFICATIONS_IN_FLIGHT,
+                                      PROCESSING_ERRORS_TOTAL)
 from core.application.ports.inbound import IEmailServicePort, IUserServicePort
-from core.application.ports.outbound import IUserRepositoryPort
+from core.application.outbox import DeliveryError
+from core.application.ports.outbound import (IOutboxRepositoryPort,
+                                             IUserRepositoryPort)
+from core.application.model_routing import (ESCALATED, FAST, MODEL_ROUTE_SECONDS,
+                                            MODEL_ROUTER)
+from core.application.profiling import PROFILER
+from core.application.quota import QuotaAccountant, QuotaDeferred
+from core.application.scheduling import (EMAIL_SCHEDULER, SENDER_HISTORY,
+                                         VIP_LIST, ScheduledEmail,
+                                         classify_priority)
 from core.application.schema import EmailData, EmailPriority
-from core.domain.entity import Email, User
+from core.application.tracing import TRACER
+from core.domain.entity import Email, OutboxMessage, User
+
+# The Google client libraries account for most of the process import time,
+# so they are only loaded once a code path needs them.
+discovery = LazyModule("googleapiclient.discovery")
+googleapiclient_errors = LazyModule("googleapiclient.errors")
+googleapiclient_http = LazyModule("googleapiclient.http")
+genai = LazyModule("google.genai")
+types = LazyModule("google.genai.types")
+credentials = LazyModule("google.oauth2.credentials")
+google_auth_requests = LazyModule("google.auth.transport.requests")
+
+API_ENDPOINTS = {"gmail": GMAIL_API_ENDPOINT, "calendar": CALENDAR_API_ENDPOINT}
+
+
+def build_google_service(api: str, version: str, creds: "credentials.Credentials") -> Any:
+    """Builds a Google API client, honouring any configured endpoint override."""
+    endpoint = API_ENDPOINTS.get(api)
+    client_options = {"api_endpoint": endpoint} if endpoint else None
+    return discovery.build(api, version, credentials=creds, client_options=client_options)
+
+
+def new_gmail_batch(service: Any, callback: Callable[[str, Any, Optional[Exception]], None]) -> Any:
+    """A Gmail batch request; the endpoint override is applied here too, as discovery takes the batch URI from rootUrl."""
+    if GMAIL_API_ENDPOINT:
+        return googleapiclient_http.BatchHttpRequest(
+            callback=callback, batch_uri=GMAIL_API_ENDPOINT.rstrip("/") + "/batch/gmail/v1")
+    return service.new_batch_http_request(callback=callback)
+
+
+@functools.lru_cache(maxsize=None)
+def get_genai_client() -> "genai.Client":
+    """Returns the process-wide Gemini client, creating it on first use."""
+    return genai.Client(
+        api_key=GEMINI_API_KEY,
+        http_options=types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None)
+
+
+# Busy intervals per user, shared by every EmailService in the process.
+FREEBUSY_CACHE = FreeBusyCache(ttl_seconds=FREEBUSY_TTL_SECONDS,
+                               horizon=datetime.timedelta(days=FREEBUSY_HORIZON_DAYS))
+# Calendar timezone names by user email.
+USER_TIMEZONES: Dict[str, str] = {}
+# Backfill classification: per-email body limit and the model's JSON response shape.
+SUMMARY_BODY_CHARS = 4000
+SUMMARY_BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "index": {"type": "INTEGER"},
+            "title": {"type": "STRING"},
+            "summary": {"type": "STRING"},
+            "priority": {"type": "STRING", "enum": ["High", "Medium", "Low"]},
+        },
+        "required": ["index", "title", "summary", "priority"],
+    },
+}
+# Gmail quota spent per user and for the project by this process.
+GMAIL_QUOTA = QuotaAccountant(user_units_per_second=GMAIL_USER_QUOTA_UNITS_PER_SECOND,
+                              project_units_per_second=GMAIL_PROJECT_QUOTA_UNITS_PER_SECOND,
+                              max_wait=GMAIL_QUOTA_MAX_WAIT_SECONDS)
+
+
+def warm_up_clients() -> None:
+    """
+    Loads the lazily imported client libraries and the Gemini client. Meant to
+    run in a worker thread after startup so the first notification does not
+    pay the import cost.
+    """
+    preload(dateparser_date, discovery, googleapiclient_errors, credentials, google_auth_requests)
+    get_genai_client()
 
 
 class UserService(IUserServicePort):
@@ -41,12 +145,130 @@ class UserService(IUserServicePort):
         return await self.user_repository.update_user(user)
 
 
+GMAIL_QUOTA_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded", "dailyLimitExceeded"}
+# Reasons Gmail gives when the project, rather than one user, is over quota.
+GMAIL_PROJECT_QUOTA_REASONS = {"rateLimitExceeded", "quotaExceeded", "dailyLimitExceeded"}
+
+
+def _gmail_error_reasons(error: "googleapiclient_errors.HttpError") -> set:
+    return {detail.get("reason") for detail in (error.error_details or []) if isinstance(detail, dict)}
+
+
+def _classify_gmail_error(error: "googleapiclient_errors.HttpError") -> DeliveryError:
+    status = error.resp.status
+    reasons = _gmail_error_reasons(error)
+    retry_after = error.resp.get("retry-after")
+    retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+    if status == 429 or (status == 403 and reasons & GMAIL_QUOTA_REASONS):
+        if "dailyLimitExceeded" in reasons:
+            retry_after = retry_after or 3600.0
+        return DeliveryError(str(error), quota=True, retry_after=retry_after)
+    # Bad requests will fail the same way every time; everything else may recover.
+    return DeliveryError(str(error), retryable=status not in (400, 404), retry_after=retry_after)
+
+
+def _record_gmail_throttle(user_email: str, error: "googleapiclient_errors.HttpError",
+                           retry_after: Optional[float]) -> float:
+    """Slows the user's or the project's Gmail bucket after a rate-limit response."""
+    project = bool(_gmail_error_reasons(error) & GMAIL_PROJECT_QUOTA_REASONS)
+    return GMAIL_QUOTA.throttled(user_email, retry_after, project=project)
+
+
+async def execute_gmail(user_email: str, method: str, request: Any, reserve: float = 0.0,
+                        in_thread: bool = False) -> dict:
+    """
+    Runs one Gmail API request once the user's and the project's quota allow
+    it. A rate-limit response slows the matching bucket and is raised as
+    QuotaDeferred, like quota that is too far off, so the caller can requeue.
+    Background callers pass a quota `reserve` and run the call `in_thread`.
+    """
+    await GMAIL_QUOTA.acquire(user_email, method, reserve=reserve)
+    try:
+        with GMAIL_REQUEST_SECONDS.time(method=method):
+            response = await asyncio.to_thread(request.execute) if in_thread else request.execute()
+    except googleapiclient_errors.HttpError as e:
+        error = _classify_gmail_error(e)
+        if not error.quota:
+            raise
+        pause = _record_gmail_throttle(user_email, e, error.retry_after)
+        raise QuotaDeferred(f"Gmail rate limit for {user_email}: {e}", pause) from e
+    GMAIL_QUOTA.succeeded(user_email)
+    return response
+
+
+def parse_gmail_message(message: dict) -> EmailData:
+    """Builds EmailData from a `format=full` Gmail message, preferring the text/plain body."""
+    headers = {header["name"]: header["value"]
+               for header in message["payload"]["headers"]}
+
+    sender = headers.get("From", "")
+    sender_name = None
+    sender_email = ""
+
+    if "<" in sender and ">" in sender:
+        sender_name = sender.split("<")[0].strip()
+        sender_email = sender.split(
+            "<")[1].split(">")[0].strip()
+    else:
+        sender_email = sender.strip()
+
+    priority = headers.get("Priority", "").lower()
+    priority_enum = (
+        EmailPriority.HIGH if priority == "high" else
+        EmailPriority.MEDIUM if priority == "medium" else
+        EmailPriority.LOW
+    )
+
+    email_data = EmailData(
+        id=message["id"],
+        threadId=message["threadId"],
+        senderName=sender_name,
+        senderEmail=sender_email,
+        priority=priority_enum
+    )
+
+    # Extract email body
+    payload = message["payload"]
+    body_data = ""
+
+    if "parts" in payload:
+        for part in payload["parts"]:
+            if part["mimeType"] == "text/plain":
+                body_data = part["body"].get("data", "")
+                break
+            elif part["mimeType"] == "text/html" and not body_data:
+                body_data = part["body"].get("data", "")
+
+    elif "body" in payload and "data" in payload["body"]:
+        body_data = payload["body"]["data"]
+
+    if body_data:
+        try:
+            email_data.body = base64.urlsafe_b64decode(
+                body_data).decode("utf-8").strip()
+        except Exception as body_decode_error:
+            print(
+                f"Error decoding body for message {message['id']}: {body_decode_error}")
+    return email_data
+
+
+def _function_call(response: Any) -> Optional[Any]:
+    """The function call in the first part of the model's first candidate, if there is one."""
+    if response.candidates and response.candidates[0].content.parts:
+        return getattr(response.candidates[0].content.parts[0], "function_call", None)
+    return None
+
+
 class EmailService(IEmailServicePort):
-    def __init__(self, user_repository: IUserRepositoryPort):
+    def __init__(self, user_repository: IUserRepositoryPort,
+                 outbox_repository: Optional[IOutboxRepositoryPort] = None):
         self.user_repository = user_repository
-        self.client = genai.Client(
-            api_key=GEMINI_API_KEY)
-        self.MODEL_ID = "gemini-2.0-flash"
+        self.outbox_repository = outbox_repository
+        self.MODEL_ID = GEMINI_MODEL
+
+    @property
+    def client(self) -> "genai.Client":
+        return get_genai_client()
 
     async def watch_user(self, user: User) -> dict:
         """
@@ -62,22 +284,49 @@ class EmailService(IEmailServicePort):
 
         if not creds.valid:
             if creds.expired and creds.refresh_token:
-                creds.refresh(Request())
+                creds.refresh(google_auth_requests.Request())
                 user.access_token = creds.token
                 await self.store_user_tokens(user)
 
-        service = build("gmail", "v1", credentials=creds)
+        service = build_google_service("gmail", "v1", creds)
 
         request = {
             "labelIds": ["INBOX"],
             "topicName": f"projects/{PROJECT_ID}/topics/{TOPIC_NAME}"
         }
-        response = service.users().watch(userId="me", body=request).execute()
-        return response
+        return await execute_gmail(user.email, "watch", service.users().watch(userId="me", body=request))
 
     async def get_emails(self, receiver_email: str, skip: int, limit: int) -> List[Email]:
         return await self.user_repository.get_emails(receiver_email, skip, limit)
 
+    async def get_email_rows(self, receiver_email: str, skip: int, limit: int) -> List[dict]:
+        return await self.user_repository.get_email_rows(receiver_email, skip, limit)
+
+    def export_email_rows(self, receiver_email: str, since: Optional[datetime.datetime] = None,
+                          until: Optional[datetime.datetime] = None, batch_size: int = 1000) -> AsyncIterator[dict]:
+        return self.user_repository.stream_email_rows(receiver_email, since, until, batch_size)
+
+    async def get_emails_after(self, receiver_email: str, after_id: int, limit: int) -> List[Email]:
+        return await self.user_repository.get_emails_after(receiver_email, after_id, limit)
+
+    async def search_emails(self, receiver_email: str, query: str, limit: int, offset: int) -> List[Email]:
+        return await self.user_repository.search_emails(receiver_email, query, limit, offset)
+
+    async def get_unread_count(self, receiver_email: str) -> int:
+        return await self.user_repository.get_unread_count(receiver_email)
+
+    async def set_read_state(self, receiver_email: str, read: bool, ids: Optional[List[int]] = None,
+                             up_to_id: Optional[int] = None) -> int:
+        return await self.user_repository.set_read_state(receiver_email, read, ids, up_to_id)
+
+    async def _store_email(self, email: Email) -> Email:
+        """Records a processed email and pushes it to the user's open streams."""
+        stored = await self.user_repository.set_email_history(email)
+        SENDER_HISTORY.record(email.receiver_email, email.sender_email, email.priority)
+        if stored is not None:
+            EMAIL_EVENTS.publish(stored)
+        return stored
+
     async def get_latest_email_by_date(self, receiver_email: str) -> Optional[Email]:
         return await self.user_repository.get_latest_email_by_date(receiver_email)
 
@@ -85,11 +334,17 @@ class EmailService(IEmailServicePort):
         users = await self.user_repository.get_users()
 
         for user in users:
-            await self.watch_user(user)
+            try:
+                await self.watch_user(user)
+            except QuotaDeferred as e:
+                # Watches last a week; the next renewal run picks this user up.
+                print(f"Skipping Gmail watch for {user.email}: {e}")
 
         print("------ Finished watching Gmail for all users ------")
 
+    @TRACER.traced("fetch_latest_unread_email")
     async def fetch_latest_unread_email(self, user: User) -> Optional[EmailData]:
+        span = TRACER.current_span()
         creds = credentials.Credentials(
             token=user.access_token,
             refresh_token=user.refresh_token,
@@ -98,112 +353,202 @@ class EmailService(IEmailServicePort):
             client_secret=GOOGLE_CLIENT_SECRET
         )
         try:
-            service = build('gmail', 'v1', credentials=creds)
+            service = build_google_service('gmail', 'v1', creds)
 
             # Fetch unread messages (max 5)
-            messages_response = service.users().messages().list(
+            messages_response = await execute_gmail(user.email, "list", service.users().messages().list(
                 userId='me', q='is:unread', maxResults=5
-            ).execute()
+            ))
 
             messages = messages_response.get('messages', [])
+            span.set_attribute("messages_listed", len(messages))
             # Sort messages by internal date (newest first)
             sorted_messages = sorted(messages, key=lambda msg: msg.get(
                 'internalDate', 0), reverse=True)
 
             for message_data in sorted_messages:
                 message_id = message_data['id']
-                message = service.users().messages().get(
+                message = await execute_gmail(user.email, "get", service.users().messages().get(
                     userId='me', id=message_id, format='full'
-                ).execute()
+                ))
 
                 if 'UNREAD' in message.get('labelIds', []):
-                    headers = {header["name"]: header["value"]
-                               for header in message["payload"]["headers"]}
-
-                    sender = headers.get("From", "")
-                    sender_name = None
-                    sender_email = ""
-
-                    if "<" in sender and ">" in sender:
-                        sender_name = sender.split("<")[0].strip()
-                        sender_email = sender.split(
-                            "<")[1].split(">")[0].strip()
-                    else:
-                        sender_email = sender.strip()
-
-                    priority = headers.get("Priority", "").lower()
-                    priority_enum = (
-                        EmailPriority.HIGH if priority == "high" else
-                        EmailPriority.MEDIUM if priority == "medium" else
-                        EmailPriority.LOW
-                    )
-
-                    email_data = EmailData(
-                        id=message["id"],
-                        threadId=message["threadId"],
-                        senderName=sender_name,
-                        senderEmail=sender_email,
-                        priority=priority_enum
-                    )
-
-                    # Extract email body
-                    payload = message["payload"]
-                    body_data = ""
-
-                    if "parts" in payload:
-                        for part in payload["parts"]:
-                            if part["mimeType"] == "text/plain":
-                                body_data = part["body"].get("data", "")
-                                break
-                            elif part["mimeType"] == "text/html" and not body_data:
-                                body_data = part["body"].get("data", "")
-
-                    elif "body" in payload and "data" in payload["body"]:
-                        body_data = payload["body"]["data"]
-
-                    if body_data:
-                        try:
-                            body_data = base64.urlsafe_b64decode(
-                                body_data).decode("utf-8").strip()
-                            email_data.body = body_data
-                        except Exception as body_decode_error:
-                            print(
-                                f"Error decoding body for message {message_id}: {body_decode_error}")
+                    email_data = parse_gmail_message(message)
+                    if email_data.body:
+                        span.set_attribute("body_bytes", len(email_data.body.encode("utf-8")))
 
                     # Mark message as read
-                    service.users().messages().modify(
+                    await execute_gmail(user.email, "modify", service.users().messages().modify(
                         userId='me', id=message_id, body={'removeLabelIds': ['UNREAD']}
-                    ).execute()
+                    ))
 
+                    span.set_attributes(message_id=message_id, outcome="fetched")
                     return email_data
 
+            span.set_attribute("outcome", "no_unread_email")
             return None
 
+        except QuotaDeferred as e:
+            # The message is still unread, so a retry of this notification finds it again.
+            span.set_attributes(outcome="quota_deferred", retry_after=e.retry_after)
+            raise
         except Exception as e:
+            PROCESSING_ERRORS_TOTAL.inc(path="fetch_failed")
+            span.set_attributes(outcome="error", error=str(e))
             print(f"Error fetching emails: {e}")
             return None
 
+    def _gmail_credentials(self, user: User) -> "credentials.Credentials":
+        return credentials.Credentials(
+            token=user.access_token,
+            refresh_token=user.refresh_token,
+            token_uri=user.token_uri,
+            client_id=GOOGLE_CLIENT_ID,
+            client_secret=GOOGLE_CLIENT_SECRET
+        )
+
+    async def list_messages_page(self, user: User, query: str, page_token: Optional[str], page_size: int,
+                                 reserve: float = 0.0) -> Tuple[List[str], Optional[str], Optional[int]]:
+        """One page of message ids matching `query`, the next page token and Gmail's total estimate."""
+        service = await asyncio.to_thread(build_google_service, 'gmail', 'v1', self._gmail_credentials(user))
+        response = await execute_gmail(user.email, "list", service.users().messages().list(
+            userId='me', q=query, maxResults=page_size, pageToken=page_token
+        ), reserve=reserve, in_thread=True)
+        message_ids = [message["id"] for message in response.get("messages", [])]
+        return message_ids, response.get("nextPageToken"), response.get("resultSizeEstimate")
+
+    async def get_messages_batch(self, user: User, message_ids: List[str], reserve: float = 0.0) -> Dict[str, Any]:
+        """
+        Fetches full messages in one Gmail batch request. Each value is the
+        message or the error it failed with. A rate-limited item raises
+        QuotaDeferred and a transient failure raises its error, for the whole
+        batch, so the caller retries it before storing anything.
+        """
+        for _ in message_ids:
+            await GMAIL_QUOTA.acquire(user.email, "get", reserve=reserve)
+        service = await asyncio.to_thread(build_google_service, 'gmail', 'v1', self._gmail_credentials(user))
+        results: Dict[str, Any] = {}
+
+        def collect(request_id: str, response: Any, exception: Optional[Exception]) -> None:
+            results[request_id] = exception or response
+
+        batch = new_gmail_batch(service, collect)
+        for message_id in message_ids:
+            batch.add(service.users().messages().get(userId='me', id=message_id, format='full'),
+                      request_id=message_id)
+        with GMAIL_REQUEST_SECONDS.time(method="batch_get"):
+            await asyncio.to_thread(batch.execute)
+
+        retryable = None
+        for result in results.values():
+            if isinstance(result, googleapiclient_errors.HttpError):
+                error = _classify_gmail_error(result)
+                if error.quota:
+                    pause = _record_gmail_throttle(user.email, result, error.retry_after)
+                    raise QuotaDeferred(f"Gmail rate limit for {user.email}: {result}", pause) from result
+                if error.retryable:
+                    retryable = result
+        if retryable is not None:
+            raise retryable
+        GMAIL_QUOTA.succeeded(user.email)
+        return results
+
+    async def summarize_emails(self, emails: List[EmailData]) -> List[Optional[Dict[str, str]]]:
+        """
+        Title, summary and priority for several emails from one model call,
+        in input order; None where the model skipped an email. Unlike
+        process_single_email this takes no action on the emails.
+        """
+        sections = [f"### Email {index}\nFrom: {email.senderName or ''} <{email.senderEmail}>\n\n"
+                    f"{(email.body or '')[:SUMMARY_BODY_CHARS]}" for index, email in enumerate(emails)]
+        prompt = (
+            "For each email below, return an object with its index, a short descriptive title, "
+            "a summary of its key message in a few sentences, and a priority: High for urgent matters "
+            "that need immediate action, Medium for important but not urgent ones, Low for "
+            "informational emails, notifications and general updates.\n\n" + "\n\n".join(sections))
+        with GEMINI_REQUEST_SECONDS.time(call="summarize_batch"):
+            response = await self.client.aio.models.generate_content(
+                model=self.MODEL_ID,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=0,
+                    response_mime_type="application/json",
+                    response_schema=SUMMARY_BATCH_SCHEMA,
+                ),
+            )
+        by_index = {item.get("index"): item for item in json.loads(response.text or "[]") if isinstance(item, dict)}
+        return [by_index.get(index) for index in range(len(emails))]
+
+    async def filter_imported_messages(self, user: User, message_ids: List[str]) -> List[str]:
+        """The message ids no earlier backfill stored for the user."""
+        return await self.user_repository.filter_imported(user.email, message_ids)
+
+    async def store_backfilled_email(self, user: User, message: dict, email_data: EmailData,
+                                     summary: Dict[str, str]) -> bool:
+        """
+        Stores an imported email without notifying open streams; False when
+        the message was already imported.
+        """
+        email = Email(
+            user_id=user.id,
+            sender_email=email_data.senderEmail,
+            sender_name=email_data.senderName or "",
+            receiver_email=user.email,
+            history_id=str(message.get("historyId", "")),
+            date=datetime.datetime.utcfromtimestamp(int(message.get("internalDate", 0)) / 1000).date(),
+            title=summary.get("title") or "(no title)",
+            summary=summary.get("summary") or "",
+            priority=summary.get("priority", "low"),
+            read="UNREAD" not in message.get("labelIds", [])
+        )
+        if await self.user_repository.set_email_history(email, gmail_message_id=message["id"]) is None:
+            return False
+        SENDER_HISTORY.record(email.receiver_email, email.sender_email, email.priority)
+        return True
+
     async def store_user_tokens(self, user: User) -> None:
         await self.user_repository.update_user(user.id, user)
 
     async def get_user_credentials(self, email: str) -> Optional[User]:
         return await self.user_repository.get_user_by_email(email)
 
+    @TRACER.traced("process_emails")
+    @PROFILER.profiled("process_emails")
     async def process_emails(self, user: User, history_id: str, current_history_id: str):
         """
         Processes new emails, handling various scenarios with AI-driven decisions.
 
         This function retrieves new emails, iterates through them, and calls the
         process_single_email function for each email to determine the appropriate action.
+        With the priority scheduler running, the email waits for a scheduler worker;
+        either way this returns only once it has been processed, because the caller
+        acknowledges the notification then and Gmail has already marked it read.
         """
-        new_email = await self.fetch_latest_unread_email(user)
-        if new_email:
-            await self.process_single_email(user, new_email, current_history_id)
-            return [new_email]
-        return []
-
+        span = TRACER.current_span()
+        span.set_attributes(user=user.email, history_id=current_history_id)
+        with NOTIFICATIONS_IN_FLIGHT.track_inprogress(), NOTIFICATION_SECONDS.time():
+            new_email = await self.fetch_latest_unread_email(user)
+            if new_email:
+                priority = classify_priority(user.email, new_email, VIP_LIST, SENDER_HISTORY)
+                span.set_attribute("priority", priority.value)
+                scheduled = ScheduledEmail(user, new_email, current_history_id, priority)
+                if EMAIL_SCHEDULER.submit(scheduled):
+                    await scheduled.done
+                    span.set_attributes(outcome="scheduled", message_id=new_email.id)
+                    return [new_email]
+                await self.process_single_email(user, new_email, current_history_id)
+                span.set_attributes(outcome="processed", message_id=new_email.id)
+                return [new_email]
+            span.set_attribute("outcome", "no_new_email")
+            return []
+
+    @TRACER.traced("process_single_email")
+    @PROFILER.profiled("process_single_email")
     async def process_single_email(self, user: 'User', email_data: 'EmailData', history_id: str):
         """Processes a single email using AI, generates notification title, summary, urgency, and executes actions."""
+        span = TRACER.current_span()
+        span.set_attributes(message_id=email_data.id,
+                            body_bytes=len((email_data.body or "").encode("utf-8")))
 
         generate_reply_func = types.FunctionDeclaration(
             name="generate_reply",
@@ -236,6 +581,8 @@ class EmailService(IEmailServicePort):
                         "items": {"type": "string"},
                         "description": "List of attendee email addresses.",
                     },
+                    "confirmation_title": {"type": "string", "description": "A short title for the reply confirming the meeting."},
+                    "confirmation_body": {"type": "string", "description": f"The reply confirming the meeting, with {MEETING_LINK_PLACEHOLDER} where the meeting link goes."},
                 },
             },
         )
@@ -289,7 +636,7 @@ class EmailService(IEmailServicePort):
         - **`no_action_required`** → For simple acknowledgments, notifications, or spam.
 
         # **3. Generate the Response Message**
-        - If scheduling a meeting, provide the ** meeting link dynamically ** in the reply.
+        - If scheduling a meeting, draft the confirmation in ** confirmation_title ** and ** confirmation_body **: acknowledge the email, state the date, time and duration, and write {MEETING_LINK_PLACEHOLDER} exactly where the meeting link goes.
         - Ensure the response is **professional and polite**.
         - If details are missing, request clarification.
 
@@ -303,31 +650,34 @@ class EmailService(IEmailServicePort):
         )
 
         try:
-            response = self.client.models.generate_content(
-                model=self.MODEL_ID,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    tools=[story_tools],
-                    temperature=0
-                ),
-            )
+            route, model = MODEL_ROUTER.route(email_data)
+            span.set_attribute("model_route", route)
+            response = await self._generate_action(route, model, prompt, story_tools)
+            failure = MODEL_ROUTER.check_answer(_function_call(response))
+            if failure and route == FAST:
+                # The fast model's answer cannot be acted on; the strong model gets the same prompt.
+                span.set_attribute("escalation", failure)
+                response = await self._generate_action(
+                    ESCALATED, MODEL_ROUTER.escalate(failure), prompt, story_tools)
 
             if response.candidates and response.candidates[0].content.parts:
-                content_part = response.candidates[0].content.parts[0]
-                print(content_part)
-                function_call = getattr(
-                    content_part, "function_call", None)
+                print(response.candidates[0].content.parts[0])
+                function_call = _function_call(response)
                 if function_call:
                     function_name = function_call.name
                     function_args = function_call.args
 
+                    if function_name in ("generate_reply", "schedule_meeting", "no_action_required"):
+                        EMAIL_ACTIONS_TOTAL.inc(action=function_name)
+                        span.set_attributes(action=function_name, outcome="ok")
+
                     if function_name == "generate_reply":
                         title = function_args.get("title")
                         reply_body = function_args.get("reply_body")
                         if reply_body and title:
-                            self.send_email(
+                            await self.send_email(
                                 email_data.senderEmail, "Re: " + title, reply_body, email_data.threadId, user)
-                            await self.user_repository.set_email_history(Email(
+                            await self._store_email(Email(
                                 user_id=user.id,
                                 sender_email=email_data.senderEmail,
                                 sender_name=email_data.senderName,
@@ -341,12 +691,12 @@ class EmailService(IEmailServicePort):
                             ))
                         else:
                             self._handle_processing_error(
-                                user, email_data, "Reply title or body missing.")
+                                user, email_data, "Reply title or body missing.", path="reply_incomplete")
 
                     elif function_name == "schedule_meeting":
                         await self._handle_schedule_meeting(
                             user, email_data, function_args)
-                        await self.user_repository.set_email_history(Email(
+                        await self._store_email(Email(
                             user_id=user.id,
                             sender_email=email_data.senderEmail,
                             sender_name=email_data.senderName,
@@ -359,7 +709,7 @@ class EmailService(IEmailServicePort):
                             read=False
                         ))
                     elif function_name == "no_action_required":
-                        await self.user_repository.set_email_history(Email(
+                        await self._store_email(Email(
                             user_id=user.id,
                             sender_email=email_data.senderEmail,
                             sender_name=email_data.senderName,
@@ -373,19 +723,38 @@ class EmailService(IEmailServicePort):
                         ))
                     else:
                         self._handle_processing_error(
-                            user, email_data, f"Unknown function: {function_name}")
+                            user, email_data, f"Unknown function: {function_name}", path="unknown_function")
 
                 else:
                     self._handle_processing_error(
-                        user, email_data, "No function response or incomplete response found.")
+                        user, email_data, "No function response or incomplete response found.", path="no_function_call")
 
             else:
                 self._handle_processing_error(
-                    user, email_data, "No response candidates found.")
+                    user, email_data, "No response candidates found.", path="no_candidates")
 
         except Exception as e:
-            self._handle_processing_error(user, email_data, f"Exception: {e}")
+            self._handle_processing_error(
+                user, email_data, f"Exception: {e}", path="exception")
+
+    async def _generate_action(self, route: str, model: str, prompt: str, tools: "types.Tool") -> Any:
+        with GEMINI_REQUEST_SECONDS.time(call="classify"), MODEL_ROUTE_SECONDS.time(route=route, model=model), \
+                TRACER.span("gemini.generate_content", model=model, route=route, prompt_chars=len(prompt)) as llm_span:
+            response = await self.client.aio.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    tools=[tools],
+                    temperature=0
+                ),
+            )
+            usage = getattr(response, "usage_metadata", None)
+            if usage:
+                llm_span.set_attributes(prompt_tokens=usage.prompt_token_count or 0,
+                                        output_tokens=usage.candidates_token_count or 0)
+        return response
 
+    @TRACER.traced("schedule_meeting")
     async def _handle_schedule_meeting(self, user: 'User', email_data: 'EmailData', function_args: Dict[str, Any]):
         try:
 
@@ -393,10 +762,10 @@ class EmailService(IEmailServicePort):
                 await self.schedule_meeting_from_details(user, email_data, function_args)
             else:
                 self._handle_processing_error(
-                    user, email_data, "Meeting details incomplete.")
+                    user, email_data, "Meeting details incomplete.", path="meeting_incomplete")
         except Exception as e:
             self._handle_processing_error(
-                user, email_data, f"Error handling meeting: {e}")
+                user, email_data, f"Error handling meeting: {e}", path="meeting_exception")
 
     async def schedule_meeting_from_details(self, user: 'User', email_data: 'EmailData', meeting_details: Dict[str, Any]):
         """
@@ -408,19 +777,49 @@ class EmailService(IEmailServicePort):
             duration_minutes = meeting_details["duration_minutes"]
             attendees = meeting_details["attendees"]
 
-            parsed_datetime = dateparser.parse(
-                f"{meeting_date} {meeting_time}")
-
-            if parsed_datetime:
-                start_time = parsed_datetime.isoformat()
-                end_time = (
-                    parsed_datetime + datetime.timedelta(minutes=duration_minutes)).isoformat()
+            tz = await self._user_timezone(user)
+            slot_start = parse_meeting_datetime(meeting_date, meeting_time, tz)
+            if slot_start is None:
+                self._handle_processing_error(
+                    user, email_data, f"Could not parse meeting time {meeting_date!r} {meeting_time!r}.", path="meeting_unparseable")
+                return
+
+            duration = datetime.timedelta(minutes=duration_minutes)
+            slot_end = slot_start + duration
+            start_time = slot_start.isoformat()
+            end_time = slot_end.isoformat()
+
+            try:
+                busy_index = await FREEBUSY_CACHE.index_for(
+                    user.email, slot_start, slot_end, functools.partial(self._fetch_busy, user))
+            except Exception as e:
+                # Without availability data fall back to inserting and letting Calendar object.
+                print(f"Error fetching free/busy for {user.email}: {e}")
+                busy_index = None
+
+            if busy_index is not None and busy_index.conflict(slot_start, slot_end):
+                PROCESSING_ERRORS_TOTAL.inc(path="calendar_conflict")
+                TRACER.current_span().set_attribute("outcome", "conflict")
+                proposed = busy_index.next_free(
+                    slot_end, duration, slot_start + FREEBUSY_CACHE.horizon,
+                    allowed=working_hours(MEETING_WORKDAY_START_HOUR, MEETING_WORKDAY_END_HOUR, tz))
+                if proposed:
+                    reply = generate_alternative_time_email(
+                        email_data, user, proposed.astimezone(tz).strftime("%A %d %B %Y at %H:%M %Z"),
+                        duration_minutes)
+                    await self.send_email(
+                        email_data.senderEmail, "Re: Meeting Request - Proposed New Time", reply, email_data.threadId, user)
+                else:
+                    reply = generate_no_rescheduled_email(email_data, user)
+                    await self.send_email(
+                        email_data.senderEmail, "Re: Meeting Rescheduled", reply, email_data.threadId, user)
+                return
 
             event = {
                 'summary': 'Meeting with ' + ", ".join(attendees),
                 'location': 'Virtual Meeting',
-                'start': {'dateTime': start_time, 'timeZone': 'Africa/Addis_Ababa'},
-                'end': {'dateTime': end_time, 'timeZone': 'Africa/Addis_Ababa'},
+                'start': {'dateTime': start_time, 'timeZone': str(tz)},
+                'end': {'dateTime': end_time, 'timeZone': str(tz)},
                 'attendees': [
                     {'email': email_data.senderEmail,
                         'responseStatus': 'needsAction'},
@@ -442,26 +841,85 @@ class EmailService(IEmailServicePort):
             }
 
             service = self.create_calendar_service(user)
-            event = service.events().insert(calendarId='primary', body=event,
-                                            conferenceDataVersion=1).execute()
+            with CALENDAR_REQUEST_SECONDS.time(method="insert"), TRACER.span("calendar.events.insert"):
+                event = service.events().insert(calendarId='primary', body=event,
+                                                conferenceDataVersion=1).execute()
+            FREEBUSY_CACHE.record_busy(user.email, slot_start, slot_end)
             meeting_link = event.get(
                 'hangoutLink', 'No meeting link available')
-            self.generate_reply_after_event(
-                user, email_data, meeting_link, meeting_date, meeting_time, duration_minutes)
 
-        except googleapiclient.errors.HttpError as e:
+            # The classification call already drafted the confirmation; only the link was missing.
+            draft_title = meeting_details.get("confirmation_title")
+            draft_body = meeting_details.get("confirmation_body")
+            if draft_title and draft_body:
+                title, reply = draft_title, render_meeting_confirmation(draft_body, meeting_link)
+                TRACER.current_span().set_attribute("confirmation", "draft")
+            else:
+                title = "Re: Meeting Confirmed"
+                reply = generate_meeting_confirmation_email(
+                    email_data, user, meeting_link, slot_start.strftime("%A %d %B %Y at %H:%M %Z"), duration_minutes)
+                TRACER.current_span().set_attribute("confirmation", "template")
+            await self.send_email(
+                email_data.senderEmail, title, reply, email_data.threadId, user)
+
+        except googleapiclient_errors.HttpError as e:
             if e.resp.status == 409:
+                PROCESSING_ERRORS_TOTAL.inc(path="calendar_conflict")
+                FREEBUSY_CACHE.invalidate(user.email)
                 reply = generate_no_rescheduled_email(email_data, user)
-                self.send_email(
+                await self.send_email(
                     email_data.senderEmail, "Re: Meeting Rescheduled", reply, email_data.threadId, user)
             else:
                 self._handle_processing_error(
-                    user, email_data, f"I encountered an error while scheduling the meeting: {e}. Please try again later.")
+                    user, email_data, f"I encountered an error while scheduling the meeting: {e}. Please try again later.", path="calendar_http_error")
         except Exception as e:
             self._handle_processing_error(
-                user, email_data, f"I encountered an error while scheduling the meeting: {e}. Please try again later.")
+                user, email_data, f"I encountered an error while scheduling the meeting: {e}. Please try again later.", path="calendar_exception")
 
-    def _handle_processing_error(self, user: 'User', email_data: 'EmailData', error_message: str):
+    async def _user_timezone(self, user: 'User') -> zoneinfo.ZoneInfo:
+        """
+        The user's Calendar timezone, looked up once per process. Falls back to
+        DEFAULT_TIMEZONE when the setting cannot be read.
+        """
+        name = USER_TIMEZONES.get(user.email)
+        if name is None:
+            try:
+                service = await asyncio.to_thread(self.create_calendar_service, user)
+                with CALENDAR_REQUEST_SECONDS.time(method="settings"), TRACER.span("calendar.settings.get"):
+                    setting = await asyncio.to_thread(service.settings().get(setting="timezone").execute)
+                name = setting["value"]
+                zoneinfo.ZoneInfo(name)
+                USER_TIMEZONES[user.email] = name
+            except Exception as e:
+                print(f"Error reading calendar timezone for {user.email}: {e}")
+                name = DEFAULT_TIMEZONE
+        return zoneinfo.ZoneInfo(name)
+
+    async def _fetch_busy(self, user: 'User', time_min: datetime.datetime, time_max: datetime.datetime) -> List[Interval]:
+        """Queries the Calendar freebusy API for the user's primary calendar."""
+        service = await asyncio.to_thread(self.create_calendar_service, user)
+        with CALENDAR_REQUEST_SECONDS.time(method="freebusy"), TRACER.span("calendar.freebusy.query"):
+            response = await asyncio.to_thread(service.freebusy().query(body={
+                "timeMin": time_min.isoformat(),
+                "timeMax": time_max.isoformat(),
+                "items": [{"id": "primary"}],
+            }).execute)
+        busy = response.get("calendars", {}).get("primary", {}).get("busy", [])
+        return [(datetime.datetime.fromisoformat(b["start"]), datetime.datetime.fromisoformat(b["end"]))
+                for b in busy]
+
+    async def check_availability(self, user: 'User', slots: List[Interval]) -> List[bool]:
+        """
+        Batch availability check: answers every (start, end) slot from one
+        cached free/busy lookup. True means the slot is free.
+        """
+        conflicts = await FREEBUSY_CACHE.check_slots(
+            user.email, slots, functools.partial(self._fetch_busy, user))
+        return [conflict is None for conflict in conflicts]
+
+    def _handle_processing_error(self, user: 'User', email_data: 'EmailData', error_message: str, path: str = "unknown"):
+        PROCESSING_ERRORS_TOTAL.inc(path=path)
+        TRACER.current_span().set_attributes(outcome="error", error_path=path)
         print(f"Error processing email {email_data.id}: {error_message}")
 
     def create_calendar_service(self, user: 'User') -> Any:
@@ -478,116 +936,94 @@ class EmailService(IEmailServicePort):
             client_id=GOOGLE_CLIENT_ID,
             client_secret=GOOGLE_CLIENT_SECRET
         )
-        return build('calendar', 'v3', credentials=creds)
+        return build_google_service('calendar', 'v3', creds)
 
-    def send_email(self, to: str, subject: str, body: str, thread_id: str, user: User):
+    @TRACER.traced("send_email")
+    async def send_email(self, to: str, subject: str, body: str, thread_id: str, user: User):
         """
         Sends an email reply.
 
-        This function constructs an email message with a subject and body,
-        encodes it, and sends it using the Gmail API.
-
-        It handles potential errors during email sending.
+        With an outbox configured the reply is stored and delivered later by
+        the outbox sender, so processing does not wait on Gmail and a failed
+        send is retried instead of lost. Without one it is sent right away.
         """
+        span = TRACER.current_span()
+        span.set_attribute("body_bytes", len(body.encode("utf-8")))
+        if self.outbox_repository is not None:
+            try:
+                queued = await self.outbox_repository.enqueue(OutboxMessage(
+                    user_email=user.email, to=to, subject=subject, body=body, thread_id=thread_id))
+                span.set_attributes(outcome="queued", outbox_id=queued.id)
+            except Exception as error:
+                PROCESSING_ERRORS_TOTAL.inc(path="enqueue_failed")
+                span.set_attributes(outcome="error", error=str(error))
+                print(f'An error occurred while queueing email: {error}')
+            return
+
         try:
-            creds = credentials.Credentials(
-                token=user.access_token,
-                refresh_token=user.refresh_token,
-                token_uri=user.token_uri,
-                client_id=GOOGLE_CLIENT_ID,
-                client_secret=GOOGLE_CLIENT_SECRET
-            )
-            gmail = build('gmail', 'v1', credentials=creds)
-            message_body = f"To: {to}\r\nSubject: {subject}\r\n\r\n{body}"
-            message = (gmail.users().messages().send(
-                userId='me',
-                body={'raw': base64.urlsafe_b64encode(message_body.encode(
-                    'utf-8')).decode('utf-8'), 'threadId': thread_id}
-            ).execute())
-            print(f'sent message to {to} Message Id: {message["id"]}')
+            await GMAIL_QUOTA.acquire(user.email, "send")
+            message_id = self._deliver_gmail(to, subject, body, thread_id, user)
+            GMAIL_QUOTA.succeeded(user.email)
+            print(f'sent message to {to} Message Id: {message_id}')
+            span.set_attribute("outcome", "sent")
         except Exception as error:
+            if isinstance(error, googleapiclient_errors.HttpError):
+                classified = _classify_gmail_error(error)
+                if classified.quota:
+                    _record_gmail_throttle(user.email, error, classified.retry_after)
+            PROCESSING_ERRORS_TOTAL.inc(path="send_failed")
+            span.set_attributes(outcome="error", error=str(error))
             print(f'An error occurred while sending email: {error}')
 
-    def generate_reply_after_event(self, user: User, email_data: EmailData, meeting_link: str, meeting_date: str, meeting_time: str, meeting_duration: int):
-        """Generates a reply message after a calendar event is created."""
-
-        generate_reply_func = types.FunctionDeclaration(
-            name="generate_reply",
-            description="Generates a reply message with meeting details after event creation.",
-            parameters={
-                "type": "OBJECT",
-                "properties": {
-                    "reply_title": {"type": "string", "description": "A short title for the reply message."},
-                    "reply_body": {"type": "string", "description": "The reply message body, including meeting details and link."},
-                },
-            },
-        )
+    def _deliver_gmail(self, to: str, subject: str, body: str, thread_id: Optional[str], user: User) -> str:
+        """
+        Sends one message through the Gmail API and returns its id.
 
-        story_tools = types.Tool(
-            function_declarations=[generate_reply_func]
+        This function constructs an email message with a subject and body,
+        encodes it, and sends it. Errors are left to the caller.
+        """
+        creds = credentials.Credentials(
+            token=user.access_token,
+            refresh_token=user.refresh_token,
+            token_uri=user.token_uri,
+            client_id=GOOGLE_CLIENT_ID,
+            client_secret=GOOGLE_CLIENT_SECRET
         )
+        gmail = build_google_service('gmail', 'v1', creds)
+        message_body = f"To: {to}\r\nSubject: {subject}\r\n\r\n{body}"
+        with GMAIL_REQUEST_SECONDS.time(method="send"):
+            message = (gmail.users().messages().send(
+                userId='me',
+                body={'raw': base64.urlsafe_b64encode(message_body.encode(
+                    'utf-8')).decode('utf-8'), 'threadId': thread_id}
+            ).execute())
+        return message["id"]
 
-        prompt = f"""
-        Generate a reply message to the user after a meeting has been scheduled.
-
-        **Meeting Link: ** {meeting_link}
-        **Start Time: ** {meeting_date} {meeting_time}
-        **End Time: ** {meeting_date} {meeting_time} + {meeting_duration} minutes
-        **Received Email Content: ** {email_data.body}
-        **Received Email Sender: ** {email_data.senderEmail}
-        **Received Email Owner: ** {email_data.senderName}
-
-            # **Instructions:**
-            # **1. Compose a Reply Message**
-            - **Reply Title: ** Create a concise title for the reply, confirming the meeting schedule and reflecting the content of the received message.
-            - **Reply Body: ** Write a polite and informative message.
-            - Acknowledge the user's original message and address any points they raised.
-            - Include the meeting link, start time, and end time in the reply body.
-            - Confirm that the meeting has been successfully scheduled.
-            - Tailor the response to the context and tone of the received message.
-
-            # **2. Ensure Accuracy**
-            - The reply should accurately reflect the meeting details and the content of the received message.
-            - Always generate a function call.
-            - If there are any issues or missing details, include a message addressing them.
+    async def deliver_outbox_message(self, message: OutboxMessage) -> str:
         """
-        try:
-            response = self.client.models.generate_content(
-                model=self.MODEL_ID,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    tools=[story_tools],
-                    temperature=0
-                ),
-            )
-
-            if response.candidates and response.candidates[0].content.parts:
-                content_part = response.candidates[0].content.parts[0]
-
-                function_call = getattr(
-                    content_part, "function_call", None)
-                if function_call:
-                    function_name = function_call.name
-                    function_args = function_call.args
-
-                    if function_name == "generate_reply":
-                        reply_title = function_args.get("reply_title")
-                        reply_body = function_args.get("reply_body")
-                        if reply_title and reply_body:
-                            self.send_email(
-                                email_data.senderEmail, reply_title, reply_body, email_data.threadId, user)
-                        else:
-                            self._handle_processing_error(
-                                user, email_data, "Reply title or body missing.")
-                    else:
-                        self._handle_processing_error(
-                            user, email_data, f"Unknown function: {function_name}")
-                else:
-                    self._handle_processing_error(
-                        user, email_data, "No function response or incomplete response found.")
-            else:
-                self._handle_processing_error(
-                    user, email_data, "No response candidates found.")
-        except Exception as e:
-            self._handle_processing_error(
-                user, email_data, f"Exception: {e}")
+        Delivers a queued reply for the outbox sender, translating Gmail errors
+        into DeliveryError so the sender knows whether to retry or back off.
+        """
+        user = await self.get_user_credentials(message.user_email)
+        if not user:
+            raise DeliveryError(f"Unknown user {message.user_email}", retryable=False)
+
+        with TRACER.span("outbox.deliver", outbox_id=message.id, attempt=message.attempts) as span:
+            try:
+                await GMAIL_QUOTA.acquire(user.email, "send")
+            except QuotaDeferred as e:
+                span.set_attributes(outcome="quota_deferred", retry_after=e.retry_after)
+                raise DeliveryError(str(e), quota=True, retry_after=e.retry_after) from e
+            try:
+                gmail_message_id = await asyncio.to_thread(
+                    self._deliver_gmail, message.to, message.subject, message.body, message.thread_id, user)
+            except googleapiclient_errors.HttpError as e:
+                span.set_attributes(outcome="error", status=e.resp.status)
+                error = _classify_gmail_error(e)
+                if error.quota:
+                    error.retry_after = _record_gmail_throttle(user.email, e, error.retry_after)
+                raise error from e
+            GMAIL_QUOTA.succeeded(user.email)
+            span.set_attribute("outcome", "sent")
+            print(f'sent message to {message.to} Message Id: {gmail_message_id}')
+            return gmail_message_id
@@ -0,0 +1,31 @@
+import bisect
+import hashlib
+from typing import List, Tuple
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class ConsistentHashRing:
+    """
+    Maps keys to shards with consistent hashing. Each shard owns `vnodes`
+    points on the ring, so going from N to N+1 shards moves only about 1/(N+1)
+    of the keys.
+    """
+
+    def __init__(self, shard_count: int, vnodes: int = 128):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        self.shard_count = shard_count
+        points: List[Tuple[int, int]] = sorted(
+            (_hash(f"shard-{shard}#{replica}"), shard)
+            for shard in range(shard_count)
+            for replica in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key: str) -> int:
+        index = bisect.bisect(self._hashes, _hash(key.strip().lower()))
+        return self._shards[index % len(self._shards)]
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from config import (LOOP_STALL_BUFFER_SIZE, LOOP_STALL_EXPORT_PATH,
+                    LOOP_STALL_THRESHOLD_MS, LOOP_WATCHDOG_INTERVAL_MS)
+from core.application.metrics import REGISTRY
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "taskpilot_event_loop_lag_seconds", "How late the event loop ran the watchdog's timer.", buckets=LAG_BUCKETS)
+LOOP_STALL_SECONDS = REGISTRY.histogram(
+    "taskpilot_event_loop_stall_seconds", "How long single callbacks held the event loop past the stall threshold.",
+    buckets=LAG_BUCKETS)
+LOOP_STALLS_TOTAL = REGISTRY.counter(
+    "taskpilot_event_loop_stalls_total", "Callbacks that held the event loop longer than the stall threshold.")
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) + os.sep
+
+
+def _blocking_site(stack: traceback.StackSummary) -> str:
+    """The innermost frame in this repository's code, else the innermost frame."""
+    own = [frame for frame in stack if frame.filename.startswith(_ROOT) and "site-packages" not in frame.filename]
+    frame = (own or list(stack) or [None])[-1]
+    if frame is None:
+        return "unknown"
+    return f"{frame.filename.removeprefix(_ROOT)}:{frame.lineno} in {frame.name}"
+
+
+class LoopWatchdog:
+    """
+    Measures event-loop lag with a timer that should fire every
+    `interval_ms`, and catches callbacks that block the loop. A thread
+    checks when the timer last fired. Once it is `threshold_ms` overdue, the
+    thread captures the loop thread's stack while the blocking call is still
+    on it. The stall is logged and kept, together with its duration, when
+    the loop comes back.
+    """
+
+    def __init__(self, threshold_ms: float = 50.0, interval_ms: float = 20.0, buffer_size: int = 100,
+                 export_path: Optional[str] = None):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.export_path = export_path
+        self._stalls: deque = deque(maxlen=buffer_size)
+        self._beat = time.monotonic()
+        self._ticker: Optional[asyncio.Task] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._ticker is not None
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._ticker = asyncio.create_task(self._tick())
+        self._monitor = threading.Thread(target=self._watch, args=(loop, threading.get_ident()),
+                                         name="loop-watchdog", daemon=True)
+        self._monitor.start()
+
+    async def stop(self) -> None:
+        if self._ticker is None:
+            return
+        self._stopped.set()
+        self._ticker.cancel()
+        await asyncio.gather(self._ticker, return_exceptions=True)
+        self._ticker = None
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return list(reversed(list(self._stalls)[-limit:]))
+
+    async def _tick(self) -> None:
+        while True:
+            due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            LOOP_LAG_SECONDS.observe(max(0.0, now - due))
+            self._beat = now
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int) -> None:
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", {})
+        check_every = max(0.005, self.threshold / 4)
+        stall: Optional[Dict[str, Any]] = None
+        stalled_beat = 0.0
+        while not self._stopped.wait(check_every):
+            beat = self._beat
+            overdue = time.monotonic() - (beat + self.interval)
+            if stall is None and overdue > self.threshold:
+                frame = sys._current_frames().get(loop_thread_id)
+                stack = traceback.extract_stack(frame) if frame is not None else traceback.StackSummary()
+                task = current_tasks.get(loop)
+                stall = {
+                    "started": time.time() - overdue,
+                    "task": task.get_name() if task is not None else None,
+                    "site": _blocking_site(stack),
+                    "stack": stack.format(),
+                }
+                stalled_beat = beat
+            elif stall is not None and beat != stalled_beat:
+                # The loop is back; it was blocked from when the timer was due until it fired.
+                self._record(stall, max(0.0, beat - stalled_beat - self.interval))
+                stall = None
+
+    def _record(self, stall: Dict[str, Any], duration: float) -> None:
+        stall["duration_ms"] = round(duration * 1000, 1)
+        LOOP_STALLS_TOTAL.inc()
+        LOOP_STALL_SECONDS.observe(duration)
+        self._stalls.append(stall)
+        print(f"Event loop blocked for {stall['duration_ms']} ms at {stall['site']} "
+              f"(task {stall['task']}):\n{''.join(stall['stack'])}")
+        if self.export_path:
+            try:
+                with open(self.export_path, "a", encoding="utf-8") as export_file:
+                    export_file.write(json.dumps(stall) + "\n")
+            except OSError as e:
+                print(f"Error exporting loop stall: {e}")
+
+
+LOOP_WATCHDOG = LoopWatchdog(LOOP_STALL_THRESHOLD_MS, LOOP_WATCHDOG_INTERVAL_MS,
+                             LOOP_STALL_BUFFER_SIZE, LOOP_STALL_EXPORT_PATH)
@@ -1,5 +1,5 @@
 import datetime
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -54,3 +54,46 @@ class Email(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class OutboxMessage(BaseModel):
+    id: Optional[int] = None
+    user_email: str
+    to: str
+    subject: str
+    body: str
+    thread_id: Optional[str] = None
+    status: str = "pending"
+    attempts: int = 0
+    next_attempt_at: Optional[datetime.datetime] = None
+    last_error: Optional[str] = None
+    gmail_message_id: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+    sent_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class BackfillJob(BaseModel):
+    """
+    Import of a newly onboarded user's recent inbox. `page_token` is the
+    token of the listing page being imported (None for the first page) and
+    `page_done_ids` the messages of that page already stored.
+    """
+    user_email: str
+    status: str = "pending"
+    since: datetime.datetime
+    page_token: Optional[str] = None
+    page_done_ids: List[str] = []
+    pages: int = 0
+    imported: int = 0
+    failed: int = 0
+    estimated_total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+    updated_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
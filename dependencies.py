@@ -1,19 +1,62 @@
-from typing import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator
 
 from fastapi import Depends
+from sqlalchemy import (MetaData, String, delete, func, insert, inspect,
+                        select, text)
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
 
-from adapters.outbound.model import Base
-from adapters.outbound.repository import SQLAlchemyUserRepository
+from adapters.inbound.pull_ingestion import NotificationHandler, PullIngestor
+from adapters.outbound.google_oauth import GoogleOAuthClient
+from adapters.outbound.model import (Base, EmailModel, MailboxCounterModel,
+                                    UserModel)
+from adapters.outbound.pubsub import PubSubSubscriberClient
+from adapters.outbound.repository import (SQLAlchemyBackfillRepository,
+                                          SQLAlchemyLeaseRepository,
+                                          SQLAlchemyOutboxRepository,
+                                          SQLAlchemyUserRepository)
+from adapters.outbound.search import ARCHIVE_SEARCH_INDEX, get_search_index
+from config import (AUTH_URI, BACKFILL_BATCH_SIZE, BACKFILL_CONCURRENCY,
+                    BACKFILL_LIVE_SIGNAL_SECONDS,
+                    BACKFILL_LIVE_SIGNAL_TTL_SECONDS, BACKFILL_PAGE_SIZE,
+                    BACKFILL_QUOTA_RESERVE, DATABASE_URL,
+                    GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET,
+                    LEADER_ELECTION_ENABLED,
+                    LEADER_HEARTBEAT_SECONDS, LEADER_LEASE_SECONDS,
+                    OUTBOX_BACKOFF_BASE_SECONDS, OUTBOX_BATCH_SIZE,
+                    OUTBOX_ENABLED, OUTBOX_MAX_ATTEMPTS, OUTBOX_MAX_IN_FLIGHT,
+                    OUTBOX_PER_USER_CONCURRENCY, OUTBOX_POLL_SECONDS,
+                    PROJECT_ID, PUBSUB_EMULATOR_HOST, PUBSUB_SUBSCRIPTION,
+                    PULL_ACK_BATCH_SIZE, PULL_ACK_DEADLINE_SECONDS,
+                    PULL_ACK_FLUSH_MS, PULL_MAX_MESSAGES,
+                    PULL_MAX_OUTSTANDING_BYTES, PULL_MAX_OUTSTANDING_MESSAGES,
+                    PULL_NACK_DELAY_SECONDS, PULL_STREAMS,
+                    RETENTION_BATCH_SIZE, RETENTION_COMPACT_MIN_ROWS,
+                    REDIRECT_URI, RETENTION_HOT_DAYS, RETENTION_OVERRIDES,
+                    SCOPES, SEARCH_BACKEND, TOKEN_URI, USERINFO_URI)
+from core.application.backfill import BackfillService, LiveWorkSignal
+from core.application.leader import LeaderElector
+from core.application.outbox import Deliver, OutboxSender
+from core.application.retention import RetentionJob, RetentionPolicy
 from core.application.services import EmailService, UserService
-from config import DATABASE_URL
 
 engine = create_async_engine(DATABASE_URL, echo=True)
 AsyncSessionLocal = sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession)
 
 
+outbox_repository = SQLAlchemyOutboxRepository(AsyncSessionLocal) if OUTBOX_ENABLED else None
+backfill_repository = SQLAlchemyBackfillRepository(AsyncSessionLocal)
+# Started in every process that handles live mail; the backfill waits on it.
+live_work_signal = LiveWorkSignal(SQLAlchemyLeaseRepository(AsyncSessionLocal),
+                                  interval_seconds=BACKFILL_LIVE_SIGNAL_SECONDS,
+                                  ttl_seconds=BACKFILL_LIVE_SIGNAL_TTL_SECONDS)
+google_oauth = GoogleOAuthClient(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, REDIRECT_URI[0], SCOPES,
+                                 AUTH_URI, TOKEN_URI, USERINFO_URI)
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
@@ -24,12 +67,131 @@ async def get_user_service(db: AsyncSession = Depends(get_db)) -> UserService:
 
 
 async def get_email_service(db: AsyncSession = Depends(get_db)) -> EmailService:
-    return EmailService(SQLAlchemyUserRepository(db))
+    return EmailService(SQLAlchemyUserRepository(db), outbox_repository)
+
+
+@asynccontextmanager
+async def email_service_scope() -> AsyncIterator[EmailService]:
+    """Provides an EmailService with its own session for background work."""
+    async with AsyncSessionLocal() as session:
+        yield EmailService(SQLAlchemyUserRepository(session), outbox_repository)
+
+
+@asynccontextmanager
+async def retention_job_scope() -> AsyncIterator[RetentionJob]:
+    async with AsyncSessionLocal() as session:
+        yield RetentionJob(
+            SQLAlchemyUserRepository(session),
+            RetentionPolicy.parse(RETENTION_HOT_DAYS, RETENTION_OVERRIDES),
+            batch_size=RETENTION_BATCH_SIZE,
+            compact_min_rows=RETENTION_COMPACT_MIN_ROWS,
+        )
+
+
+def create_backfill_service() -> BackfillService:
+    return BackfillService(
+        backfill_repository,
+        email_service_scope,
+        page_size=BACKFILL_PAGE_SIZE,
+        chunk_size=BACKFILL_BATCH_SIZE,
+        concurrency=BACKFILL_CONCURRENCY,
+        quota_reserve=BACKFILL_QUOTA_RESERVE,
+        is_busy=live_work_signal.busy,
+    )
+
+
+def create_pull_ingestor(handler: NotificationHandler) -> PullIngestor:
+    return PullIngestor(
+        PubSubSubscriberClient(PROJECT_ID, PUBSUB_SUBSCRIPTION, PUBSUB_EMULATOR_HOST),
+        handler,
+        max_outstanding_messages=PULL_MAX_OUTSTANDING_MESSAGES,
+        max_outstanding_bytes=PULL_MAX_OUTSTANDING_BYTES,
+        streams=PULL_STREAMS,
+        max_messages_per_pull=PULL_MAX_MESSAGES,
+        ack_batch_size=PULL_ACK_BATCH_SIZE,
+        ack_flush_seconds=PULL_ACK_FLUSH_MS / 1000,
+        ack_deadline_seconds=PULL_ACK_DEADLINE_SECONDS,
+        nack_delay_seconds=PULL_NACK_DELAY_SECONDS,
+    )
+
+
+def create_leader_elector() -> LeaderElector:
+    return LeaderElector(
+        SQLAlchemyLeaseRepository(AsyncSessionLocal),
+        lease_seconds=LEADER_LEASE_SECONDS,
+        heartbeat_seconds=LEADER_HEARTBEAT_SECONDS,
+        enabled=LEADER_ELECTION_ENABLED,
+    )
+
+
+def create_outbox_sender(deliver: Deliver) -> OutboxSender:
+    return OutboxSender(
+        outbox_repository,
+        deliver,
+        batch_size=OUTBOX_BATCH_SIZE,
+        max_in_flight=OUTBOX_MAX_IN_FLIGHT,
+        per_user_concurrency=OUTBOX_PER_USER_CONCURRENCY,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        backoff_base_seconds=OUTBOX_BACKOFF_BASE_SECONDS,
+        poll_interval=OUTBOX_POLL_SECONDS,
+    )
 
 
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate_read_column)
+        # create_all skips tables that already exist; add indexes introduced since.
+        await conn.run_sync(_create_missing_indexes)
+        await get_search_index(engine.dialect.name, SEARCH_BACKEND).setup(conn)
+        await ARCHIVE_SEARCH_INDEX.setup(conn)
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+def _migrate_read_column(sync_conn) -> None:
+    """
+    Turns the VARCHAR(10) `emails.read` of older databases into a boolean
+    column, then recomputes the unread counters from the rows once. MySQL
+    alters the column in place; SQLite cannot, so the table is rebuilt with
+    the same ids, which keeps the FTS index pointing at the right rows.
+    """
+    columns = {column["name"]: column for column in inspect(sync_conn).get_columns("emails")}
+    if not isinstance(columns["read"]["type"], String):
+        return
+    quote = sync_conn.dialect.identifier_preparer.quote
+    as_bool = f"CASE WHEN LOWER(TRIM({quote('read')})) IN ('1', 'true', 't', 'yes') THEN 1 ELSE 0 END"
+    dialect = sync_conn.dialect.name
+    print(f"------ Migrating emails.read to BOOLEAN on {dialect} ------")
+    if dialect in ("mysql", "mariadb"):
+        sync_conn.execute(text(f"UPDATE emails SET {quote('read')} = {as_bool}"))
+        sync_conn.execute(text(f"ALTER TABLE emails MODIFY {quote('read')} BOOLEAN NOT NULL DEFAULT FALSE"))
+    elif dialect == "sqlite":
+        # The users copy only lets the foreign key compile; the indexes come back via _create_missing_indexes.
+        metadata = MetaData()
+        UserModel.__table__.to_metadata(metadata)
+        rebuilt = EmailModel.__table__.to_metadata(metadata, name="emails_rebuild")
+        copied = [name for name in rebuilt.c.keys() if name in columns]
+        values = ", ".join(as_bool if name == "read" else quote(name) for name in copied)
+        sync_conn.execute(CreateTable(rebuilt))
+        sync_conn.execute(text(
+            f"INSERT INTO emails_rebuild ({', '.join(map(quote, copied))}) SELECT {values} FROM emails"))
+        sync_conn.execute(text("DROP TABLE emails"))
+        sync_conn.execute(text("ALTER TABLE emails_rebuild RENAME TO emails"))
+    else:
+        print(f"emails.read is still text on {dialect}; convert it to BOOLEAN by hand")
+        return
+    emails, counters = EmailModel.__table__, MailboxCounterModel.__table__
+    sync_conn.execute(delete(counters))
+    sync_conn.execute(insert(counters).from_select(
+        ["receiver_email", "unread_count"],
+        select(emails.c.receiver_email, func.count())
+        .where(emails.c.read == False)  # noqa: E712
+        .group_by(emails.c.receiver_email)))
 
 
 def get_router():
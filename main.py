@@ -1,22 +1,79 @@
+import asyncio
+import functools
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from adapters.outbound.repository import SQLAlchemyUserRepository
-from core.application.services import EmailService
-from dependencies import AsyncSessionLocal, get_router, init_db
+from adapters.inbound.jobs import (ingest_notification,
+                                   process_scheduled_email,
+                                   renew_gmail_watches, run_backfills,
+                                   run_outbox_sender, run_retention)
+from adapters.inbound.profiling import ProfilingMiddleware
+from adapters.inbound.shard_pool import ShardedNotificationPool
+from config import (BACKFILL_ENABLED, BACKFILL_POLL_SECONDS,
+                    GMAIL_WATCH_RENEW_HOURS, INGESTION_MODE,
+                    LOOP_WATCHDOG_ENABLED,
+                    OUTBOX_ENABLED,
+                    OUTBOX_POLL_SECONDS, PREWARM_CLIENTS,
+                    PRIORITY_SCHEDULER_ENABLED, RETENTION_ENABLED,
+                    RETENTION_INTERVAL_HOURS, SHARD_COUNT)
+from core.application.scheduling import EMAIL_SCHEDULER
+from core.application.services import warm_up_clients
+from core.application.watchdog import LOOP_WATCHDOG
+from dependencies import (create_leader_elector, create_pull_ingestor,
+                          get_router, google_oauth, init_db, live_work_signal)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if LOOP_WATCHDOG_ENABLED:
+        LOOP_WATCHDOG.start()
     await init_db()
 
-    async with AsyncSessionLocal() as db:
-        app.state.email_service = EmailService(SQLAlchemyUserRepository(db))
-        await app.state.email_service.watch_gmail()
+    # Every worker serves HTTP, but only the lease holder runs singleton jobs.
+    leader_elector = create_leader_elector()
+    leader_elector.add_job("watch_gmail", renew_gmail_watches,
+                           interval_seconds=GMAIL_WATCH_RENEW_HOURS * 3600)
+    if OUTBOX_ENABLED:
+        # Runs until cancelled; the interval only restarts it after a crash.
+        leader_elector.add_job("outbox_sender", run_outbox_sender, interval_seconds=OUTBOX_POLL_SECONDS)
+    if RETENTION_ENABLED:
+        leader_elector.add_job("retention", run_retention, interval_seconds=RETENTION_INTERVAL_HOURS * 3600)
+    if BACKFILL_ENABLED:
+        leader_elector.add_job("backfill", run_backfills, interval_seconds=BACKFILL_POLL_SECONDS)
+    await leader_elector.start()
+    app.state.leader_elector = leader_elector
+
+    app.state.shard_pool = None
+    if SHARD_COUNT > 0:
+        app.state.shard_pool = ShardedNotificationPool(SHARD_COUNT)
+        app.state.shard_pool.start()
+    elif PRIORITY_SCHEDULER_ENABLED:
+        EMAIL_SCHEDULER.start(process_scheduled_email)
+    if BACKFILL_ENABLED:
+        # Whichever worker leads, its backfill yields to live mail handled here.
+        live_work_signal.start()
+
+    app.state.pull_ingestor = None
+    if INGESTION_MODE == "pull":
+        app.state.pull_ingestor = create_pull_ingestor(
+            functools.partial(ingest_notification, shard_pool=app.state.shard_pool))
+        app.state.pull_ingestor.start()
+
+    if PREWARM_CLIENTS:
+        asyncio.get_running_loop().run_in_executor(None, warm_up_clients)
 
     yield
+    if app.state.pull_ingestor:
+        await app.state.pull_ingestor.stop()
+    if app.state.shard_pool:
+        await app.state.shard_pool.stop()
+    await EMAIL_SCHEDULER.stop()
+    await live_work_signal.stop()
+    await leader_elector.stop()
+    await google_oauth.aclose()
+    await LOOP_WATCHDOG.stop()
     print("Shutting down...")
 
 
@@ -25,6 +82,7 @@ app = FastAPI(lifespan=lifespan)
 app.include_router(get_router(), tags=["Email Service"])
 
 
+app.add_middleware(ProfilingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],